@@ -290,7 +290,10 @@ class AIAssistant:
             }
         except ValueError as e:
             # Time slot not available, find next available
-            next_slot = self.booking_manager.get_next_available_slot(employee_id=employee.id)
+            next_slot = self.booking_manager.get_next_available_slot(
+                employee_id=employee.id,
+                duration_minutes=service.duration_minutes if service else 30
+            )
             if next_slot:
                 return {
                     'success': False,
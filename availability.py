@@ -0,0 +1,144 @@
+"""
+Availability Engine
+Turns an employee's working day and appointments into free time slots
+"""
+
+from datetime import time
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# A time range expressed in minutes since midnight: (start, end)
+Interval = Tuple[int, int]
+
+DEFAULT_SLOT_MINUTES = 30
+
+
+def to_minutes(t: time) -> int:
+    """Convert a time of day to minutes since midnight"""
+    return t.hour * 60 + t.minute
+
+
+@lru_cache(maxsize=None)
+def from_minutes(minutes: int) -> time:
+    """Convert minutes since midnight back to a time of day"""
+    return time(minutes // 60, minutes % 60)
+
+
+def appointment_intervals(appointments: Iterable) -> List[Interval]:
+    """Convert appointments to (start, end) intervals in minutes"""
+    return [(to_minutes(a.start_time), to_minutes(a.end_time)) for a in appointments]
+
+
+def merge_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+    """Sort and merge overlapping busy intervals"""
+    merged: List[Interval] = []
+    for start, end in sorted(intervals):
+        # Appointments that wrap past midnight never overlap a slot of the day
+        if end < start:
+            continue
+        if merged and start < merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def free_gaps(day_start: int, day_end: int, busy: List[Interval]) -> List[Interval]:
+    """Compute the free gaps of a working day in one pass over the busy intervals"""
+    gaps: List[Interval] = []
+    cursor = day_start
+    for start, end in busy:
+        if end <= cursor:
+            continue
+        if start >= day_end:
+            break
+        if start > cursor:
+            gaps.append((cursor, start))
+        cursor = max(cursor, end)
+    if cursor < day_end:
+        gaps.append((cursor, day_end))
+    return gaps
+
+
+def free_slot_starts(gaps: List[Interval], day_start: int,
+                     slot_minutes: int = DEFAULT_SLOT_MINUTES,
+                     duration: Optional[int] = None) -> List[int]:
+    """List every grid start whose slot (or given duration) fits inside a free gap"""
+    length = duration or slot_minutes
+    starts = []
+    for gap_start, gap_end in gaps:
+        # First grid point at or after the start of the gap
+        offset = (gap_start - day_start) % slot_minutes
+        current = gap_start if offset == 0 else gap_start + slot_minutes - offset
+
+        while current + length <= gap_end:
+            starts.append(current)
+            current += slot_minutes
+    return starts
+
+
+def earliest_fit(gaps: List[Interval], day_start: int, duration: int,
+                 slot_minutes: int = DEFAULT_SLOT_MINUTES) -> Optional[int]:
+    """Find the first grid start where the given duration fits, if any"""
+    for gap_start, gap_end in gaps:
+        offset = (gap_start - day_start) % slot_minutes
+        start = gap_start if offset == 0 else gap_start + slot_minutes - offset
+        if start + duration <= gap_end:
+            return start
+    return None
+
+
+def slot_grid(day_start: int, day_end: int,
+              slot_minutes: int = DEFAULT_SLOT_MINUTES) -> List[int]:
+    """List the start of every slot of a working day, free or not"""
+    return list(range(day_start, day_end - slot_minutes + 1, slot_minutes))
+
+
+class DayAvailability:
+    """Free gaps of one employee-day, computed once and reused for every service length"""
+
+    def __init__(self, start_time: time, end_time: time, busy: Iterable[Interval],
+                 slot_minutes: int = DEFAULT_SLOT_MINUTES):
+        self.day_start = to_minutes(start_time)
+        self.day_end = to_minutes(end_time)
+        self.slot_minutes = slot_minutes
+        self.gaps = free_gaps(self.day_start, self.day_end, merge_intervals(busy))
+        self._fits: Dict[int, List[int]] = {}
+
+    def starts(self, duration: Optional[int] = None) -> List[int]:
+        """Grid starts where the duration fits, tabulated once per duration"""
+        duration = duration or self.slot_minutes
+        if duration not in self._fits:
+            self._fits[duration] = free_slot_starts(
+                self.gaps, self.day_start, self.slot_minutes, duration
+            )
+        return self._fits[duration]
+
+    def slots(self, duration: Optional[int] = None) -> List[Dict]:
+        """Free slots of the day, each as long as the requested duration"""
+        duration = duration or self.slot_minutes
+        return [{
+            'start_time': from_minutes(start),
+            'end_time': from_minutes(start + duration),
+            'available': True
+        } for start in self.starts(duration)]
+
+    def earliest(self, duration: Optional[int] = None) -> Optional[int]:
+        """First grid start where the duration fits, if any"""
+        duration = duration or self.slot_minutes
+        if duration in self._fits:
+            fits = self._fits[duration]
+            return fits[0] if fits else None
+        return earliest_fit(self.gaps, self.day_start, duration, self.slot_minutes)
+
+    def grid(self) -> List[int]:
+        """Start of every slot of the working day, free or not"""
+        return slot_grid(self.day_start, self.day_end, self.slot_minutes)
+
+
+def available_slots(start_time: time, end_time: time, appointments: Iterable,
+                    slot_minutes: int = DEFAULT_SLOT_MINUTES) -> List[Dict]:
+    """Get the free slots of a working day given that day's appointments"""
+    return DayAvailability(start_time, end_time, appointment_intervals(appointments),
+                           slot_minutes).slots()
@@ -0,0 +1,808 @@
+"""
+Benchmarks - Performance checks for the scheduling hot paths
+Run: python benchmarks.py [name ...]
+"""
+
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time as timer
+from datetime import datetime, date, time, timedelta
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Tuple
+
+from availability import available_slots
+
+
+def _timeit(func, repeat: int) -> float:
+    """Return the average wall time of func() in milliseconds"""
+    start = timer.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (timer.perf_counter() - start) * 1000 / repeat
+
+
+# ==== AVAILABILITY ====
+
+def legacy_available_slots(day: date, start_time: time, end_time: time,
+                           appointments: List) -> List[Dict]:
+    """The original slot-by-slot scan, kept as the reference implementation"""
+    time_slots = []
+    current_time = datetime.combine(day, start_time)
+    end_datetime = datetime.combine(day, end_time)
+    slot_duration = timedelta(minutes=30)
+
+    while current_time + slot_duration <= end_datetime:
+        slot_end = current_time + slot_duration
+
+        is_available = True
+        for appointment in appointments:
+            appt_start = datetime.combine(day, appointment.start_time)
+            appt_end = datetime.combine(day, appointment.end_time)
+            if not (slot_end <= appt_start or current_time >= appt_end):
+                is_available = False
+                break
+
+        if is_available:
+            time_slots.append({
+                'start_time': current_time.time(),
+                'end_time': slot_end.time(),
+                'available': True
+            })
+
+        current_time = slot_end
+
+    return time_slots
+
+
+def _busy_day(appointment_count: int, seed: int) -> List:
+    """Build a day of 15-90 minute appointments separated by short random gaps"""
+    rng = random.Random(seed)
+    appointments = []
+    start = 8 * 60
+    for _ in range(appointment_count):
+        start += rng.choice([0, 0, 15, 30])
+        end = start + rng.choice([15, 20, 30, 45, 60, 90])
+        if end > 22 * 60:
+            start = 8 * 60 + rng.randrange(0, 12 * 60, 15)  # double-booked overflow
+            end = start + 30
+        appointments.append(SimpleNamespace(
+            start_time=time(start // 60, start % 60),
+            end_time=time(end // 60, end % 60)
+        ))
+        start = end
+    rng.shuffle(appointments)
+    return appointments
+
+
+def bench_availability():
+    """Compare the interval engine with the legacy nested loop"""
+    print("Availability: legacy nested loop vs interval engine (08:00-22:00 day)")
+    day = date(2024, 1, 15)
+    start_time, end_time = time(8, 0), time(22, 0)
+
+    for count in (0, 4, 12, 24, 48, 96):
+        appointments = _busy_day(count, seed=count)
+        legacy = legacy_available_slots(day, start_time, end_time, appointments)
+        engine = available_slots(start_time, end_time, appointments)
+        assert legacy == engine, f"Output mismatch with {count} appointments"
+
+        legacy_ms = _timeit(lambda: legacy_available_slots(day, start_time, end_time, appointments), 500)
+        engine_ms = _timeit(lambda: available_slots(start_time, end_time, appointments), 500)
+        print(f"  {count:3d} appointments, {len(engine):2d} free slots: legacy {legacy_ms:7.3f} ms | "
+              f"engine {engine_ms:7.3f} ms | speedup {legacy_ms / engine_ms:5.1f}x")
+
+
+# ==== CONCURRENT BOOKING ====
+
+def _booking_worker(args: Tuple[str, int, List[int], int, List[date], int]) -> Dict:
+    """Fire random bookings at a few barbers from one process with its own engine"""
+    from models import init_db, get_session
+    from booking_manager import BookingManager
+
+    database_url, worker, employee_ids, service_id, days, attempts = args
+    rng = random.Random(worker)
+    engine = init_db(database_url)
+    engine.echo = False
+    session = get_session(engine)
+    booking_manager = BookingManager(session)
+    counts = {'booked': 0, 'conflicts': 0, 'errors': 0}
+    try:
+        for i in range(attempts):
+            minute = 9 * 60 + rng.randrange(0, 9 * 60, 15)
+            try:
+                booking_manager.book_appointment(
+                    employee_id=rng.choice(employee_ids),
+                    customer_phone=f"555-{worker:03d}-{i:04d}",
+                    customer_name=f"Stress {worker}-{i}",
+                    appointment_date=rng.choice(days),
+                    start_time=f"{minute // 60:02d}:{minute % 60:02d}",
+                    service_id=service_id
+                )
+                counts['booked'] += 1
+            except ValueError:
+                counts['conflicts'] += 1
+            except Exception:
+                session.rollback()
+                counts['errors'] += 1
+    finally:
+        session.close()
+        engine.dispose()
+    return counts
+
+
+def _overlaps(session) -> int:
+    """Count scheduled appointments that start before the barber's previous one ends"""
+    from models import Appointment
+
+    appointments = session.query(Appointment).filter(
+        Appointment.status != 'cancelled'
+    ).order_by(Appointment.employee_id, Appointment.appointment_date,
+               Appointment.start_time).all()
+    overlaps = 0
+    for previous, current in zip(appointments, appointments[1:]):
+        same_day = (previous.employee_id, previous.appointment_date) == \
+                   (current.employee_id, current.appointment_date)
+        if same_day and current.start_time < previous.end_time:
+            overlaps += 1
+    return overlaps
+
+
+def bench_concurrent_booking(workers: int = 8, attempts: int = 150):
+    """Book the same few barbers from several processes and verify nothing double-books"""
+    from models import init_db, get_session
+    from booking_manager import BookingManager
+    from shop_stats import count_scheduled, scheduled_appointments
+
+    print(f"Concurrent booking: {workers} processes x {attempts} attempts on 3 barbers x 5 days (SQLite file)")
+    database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='barber_bench_'), 'bench.db')}"
+    engine = init_db(database_url)
+    engine.echo = False
+    session = get_session(engine)
+    booking_manager = BookingManager(session)
+    shop = booking_manager.create_shop("Stress Cuts", "Owner", "09:00", "18:00")
+    employee_ids = [
+        booking_manager.add_employee(shop.id, f"Barber {i}", f"555-90{i:02d}",
+                                     "Mon,Tue,Wed,Thu,Fri,Sat,Sun", "09:00", "18:00").id
+        for i in range(3)
+    ]
+    service_id = booking_manager.add_service(shop.id, "Haircut", 45, 25.0).id
+    days = [date.today() + timedelta(days=offset) for offset in range(1, 6)]
+
+    jobs = [(database_url, worker, employee_ids, service_id, days, attempts)
+            for worker in range(workers)]
+    start = timer.perf_counter()
+    with multiprocessing.get_context("spawn").Pool(workers) as pool:
+        results = pool.map(_booking_worker, jobs)
+    elapsed = timer.perf_counter() - start
+
+    totals = {key: sum(result[key] for result in results) for key in results[0]}
+    overlaps = _overlaps(session)
+    counted = scheduled_appointments(session, shop.id), count_scheduled(session, shop.id)
+    session.close()
+    engine.dispose()
+
+    print(f"  {workers * attempts} attempts in {elapsed:.2f} s ({workers * attempts / elapsed:.0f}/s): "
+          f"{totals['booked']} booked | {totals['conflicts']} slot taken | {totals['errors']} errors")
+    print(f"  overlapping bookings: {overlaps} | shop counter {counted[0]}, appointments {counted[1]}")
+    assert overlaps == 0, "Concurrent bookings double-booked a barber"
+    assert counted[0] == counted[1], "Concurrent bookings lost shop counter updates"
+
+
+# ==== BULK BOOKING ====
+
+def _bulk_shop(database_url: str, barbers: int, profile: Optional[str] = None):
+    """Create a scratch database with one shop, its barbers and a 45 minute service"""
+    from models import init_db, get_session
+    from booking_manager import BookingManager
+    from cache import availability_cache, customer_cache, read_cache, reference_cache
+
+    # The process-wide caches must not leak ids between scratch databases
+    availability_cache.clear()
+    customer_cache.clear()
+    reference_cache.clear()
+    read_cache.clear()
+    engine = init_db(database_url, profile)
+    engine.echo = False
+    session = get_session(engine)
+    booking_manager = BookingManager(session)
+    shop = booking_manager.create_shop("Bulk Cuts", "Owner", "09:00", "18:00")
+    employee_ids = [
+        booking_manager.add_employee(shop.id, f"Barber {i}", f"555-80{i:02d}",
+                                     "Mon,Tue,Wed,Thu,Fri,Sat,Sun", "09:00", "18:00").id
+        for i in range(barbers)
+    ]
+    service_id = booking_manager.add_service(shop.id, "Haircut", 45, 25.0).id
+    return engine, session, booking_manager, employee_ids, service_id
+
+
+def _bulk_requests(count: int, employee_ids: List[int], service_id: int) -> List[Dict]:
+    """Random bookings over a month, a tenth of them by returning customers"""
+    rng = random.Random(count)
+    today = date.today()
+    bookings = []
+    for i in range(count):
+        minute = 9 * 60 + rng.randrange(0, 8 * 60, 15)
+        bookings.append({
+            'employee_id': rng.choice(employee_ids),
+            'customer_phone': f"555-7{rng.randrange(count // 10) if i % 10 == 0 else i:06d}",
+            'customer_name': f"Bulk {i}",
+            'appointment_date': today + timedelta(days=rng.randrange(1, 31)),
+            'start_time': f"{minute // 60:02d}:{minute % 60:02d}",
+            'service_id': service_id
+        })
+    return bookings
+
+
+def bench_bulk_booking(count: int = 2000, barbers: int = 10):
+    """Compare booking one request at a time with book_many on the same batch"""
+    print(f"Bulk booking: {count} bookings on {barbers} barbers over a month (SQLite file)")
+    outcomes = {}
+    for mode in ('one by one', 'book_many'):
+        database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='barber_bench_'), 'bench.db')}"
+        engine, session, booking_manager, employee_ids, service_id = _bulk_shop(database_url, barbers)
+        bookings = _bulk_requests(count, employee_ids, service_id)
+
+        start = timer.perf_counter()
+        if mode == 'book_many':
+            statuses = [result['status'] for result in booking_manager.book_many(bookings)]
+        else:
+            statuses = []
+            for booking in bookings:
+                try:
+                    booking_manager.book_appointment(**booking)
+                    statuses.append('booked')
+                except ValueError:
+                    statuses.append('conflict')
+        elapsed = timer.perf_counter() - start
+
+        overlaps = _overlaps(session)
+        session.close()
+        engine.dispose()
+        outcomes[mode] = statuses
+        print(f"  {mode:10s}: {elapsed:7.2f} s ({count / elapsed:6.0f}/s) | "
+              f"{statuses.count('booked')} booked | overlaps {overlaps}")
+        assert overlaps == 0, f"{mode} double-booked a barber"
+
+    assert outcomes['one by one'] == outcomes['book_many'], "book_many accepted different bookings"
+
+
+# ==== SQLITE PROFILES ====
+
+def _profile_worker(args: Tuple[str, str, int, str, List[int], int, List[date], float]) -> Dict:
+    """Read day schedules or book appointments for a fixed time on one SQLite profile"""
+    from models import init_db, get_session
+    from booking_manager import BookingManager
+
+    database_url, profile, worker, role, employee_ids, service_id, days, seconds = args
+    rng = random.Random(worker)
+    engine = init_db(database_url, profile)
+    engine.echo = False
+    session = get_session(engine)
+    booking_manager = BookingManager(session)
+    counts = {'reads': 0, 'writes': 0, 'errors': 0}
+    deadline = timer.perf_counter() + seconds
+    i = 0
+    try:
+        while timer.perf_counter() < deadline:
+            i += 1
+            try:
+                if role == 'reader':
+                    booking_manager.get_employee_appointments(rng.choice(employee_ids), rng.choice(days))
+                    session.rollback()
+                    counts['reads'] += 1
+                    continue
+                minute = 9 * 60 + rng.randrange(0, 9 * 60, 15)
+                booking_manager.book_appointment(
+                    employee_id=rng.choice(employee_ids),
+                    customer_phone=f"555-{worker:03d}-{i:05d}",
+                    customer_name=f"Profile {worker}-{i}",
+                    appointment_date=rng.choice(days),
+                    start_time=f"{minute // 60:02d}:{minute % 60:02d}",
+                    service_id=service_id
+                )
+                counts['writes'] += 1
+            except ValueError:
+                # Slot taken: the write transaction still ran
+                counts['writes'] += 1
+            except Exception:
+                session.rollback()
+                counts['errors'] += 1
+    finally:
+        session.close()
+        engine.dispose()
+    return counts
+
+
+def bench_sqlite_profiles(readers: int = 4, writers: int = 4, seconds: float = 5.0):
+    """Compare read and write throughput of the default and tuned SQLite profiles"""
+    from models import SQLITE_PROFILES
+
+    print(f"SQLite profiles: {readers} reader + {writers} writer processes for {seconds:.0f} s each")
+    for profile in SQLITE_PROFILES:
+        database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='barber_bench_'), 'bench.db')}"
+        engine, session, booking_manager, employee_ids, service_id = _bulk_shop(database_url, 10, profile)
+        booking_manager.book_many(_bulk_requests(5000, employee_ids, service_id))
+        session.close()
+        engine.dispose()
+
+        days = [date.today() + timedelta(days=offset) for offset in range(1, 31)]
+        jobs = [(database_url, profile, worker, 'reader' if worker < readers else 'writer',
+                 employee_ids, service_id, days, seconds)
+                for worker in range(readers + writers)]
+        with multiprocessing.get_context("spawn").Pool(readers + writers) as pool:
+            results = pool.map(_profile_worker, jobs)
+
+        totals = {key: sum(result[key] for result in results) for key in results[0]}
+        print(f"  {profile:8s}: {totals['reads'] / seconds:7.0f} reads/s | "
+              f"{totals['writes'] / seconds:5.0f} writes/s | {totals['errors']} errors")
+
+
+# ==== SHOP DETAILS ====
+
+def _legacy_shop_details(session, shop_id: int) -> Tuple[int, int]:
+    """The original GET /api/shops/{id} counts: load both collections and count in Python"""
+    from sqlalchemy.orm import selectinload
+    from models import Shop
+
+    shop = session.query(Shop).options(selectinload(Shop.employees),
+                                       selectinload(Shop.appointments)).filter(Shop.id == shop_id).first()
+    return len(shop.employees), len([a for a in shop.appointments if a.status == 'scheduled'])
+
+
+def _summary_shop_details(session, shop_id: int) -> Tuple[int, int]:
+    """The same counts from BookingManager.get_shop_summary"""
+    from booking_manager import BookingManager
+
+    summary = BookingManager(session).get_shop_summary(shop_id)
+    return summary['employees'], summary['scheduled_appointments']
+
+
+def _add_history(session, shop_id: int, employee_ids: List[int], customer_id: int,
+                 count: int, seed: int):
+    """Bulk insert past appointments, a tenth of them cancelled"""
+    from models import Appointment
+
+    rng = random.Random(seed)
+    today = date.today()
+    rows = []
+    for i in range(count):
+        minute = 9 * 60 + rng.randrange(0, 8 * 60, 30)
+        rows.append({
+            'shop_id': shop_id,
+            'employee_id': rng.choice(employee_ids),
+            'customer_id': customer_id,
+            'appointment_date': today - timedelta(days=rng.randrange(1, 3 * 365)),
+            'start_time': time(minute // 60, minute % 60),
+            'end_time': time((minute + 30) // 60, (minute + 30) % 60),
+            'status': 'cancelled' if i % 10 == 0 else 'scheduled'
+        })
+        if len(rows) == 10000:
+            session.bulk_insert_mappings(Appointment, rows)
+            rows = []
+    session.bulk_insert_mappings(Appointment, rows)
+    session.commit()
+
+
+def bench_shop_details(history: Tuple[int, ...] = (10000, 100000, 300000), repeat: int = 5):
+    """Time the shop details counts as appointment history grows: loaded collections vs counters"""
+    from models import get_session
+    from maintenance import rebuild_shop_stats
+
+    print(f"Shop details: employee and scheduled appointment counts, average of {repeat} (SQLite file)")
+    database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='barber_bench_'), 'bench.db')}"
+    engine, session, booking_manager, employee_ids, service_id = _bulk_shop(database_url, 10)
+    shop_id = booking_manager.get_employee(employee_ids[0]).shop_id
+    customer_id = booking_manager.customer_id_for_phone("555-6000", "History")
+
+    added = 0
+    for size in history:
+        _add_history(session, shop_id, employee_ids, customer_id, size - added, size)
+        added = size
+        rebuild_shop_stats(session)
+
+        def run(details):
+            fresh = get_session(engine)
+            try:
+                return details(fresh)
+            finally:
+                fresh.close()
+
+        legacy = run(lambda fresh: _legacy_shop_details(fresh, shop_id))
+        summary = run(lambda fresh: _summary_shop_details(fresh, shop_id))
+        assert legacy == summary, f"Counts differ: {legacy} vs {summary}"
+        legacy_ms = _timeit(lambda: run(lambda fresh: _legacy_shop_details(fresh, shop_id)), repeat)
+        summary_ms = _timeit(lambda: run(lambda fresh: _summary_shop_details(fresh, shop_id)), repeat)
+        print(f"  {size:7d} appointments: collections {legacy_ms:9.2f} ms | counters {summary_ms:6.2f} ms "
+              f"| {legacy[1]} scheduled")
+
+    session.close()
+    engine.dispose()
+
+
+# ==== DASHBOARD ====
+
+def _legacy_dashboard(session, shop_id: int) -> Tuple[int, int, int, int]:
+    """The original dashboard counts: four COUNT queries over appointments and employees"""
+    from models import Appointment, Customer, Employee
+
+    today = date.today()
+    week_start = today - timedelta(days=today.weekday())
+    scheduled = session.query(Appointment).filter(Appointment.shop_id == shop_id,
+                                                  Appointment.status == 'scheduled')
+    return (
+        scheduled.filter(Appointment.appointment_date == today).count(),
+        scheduled.filter(Appointment.appointment_date >= week_start,
+                         Appointment.appointment_date <= week_start + timedelta(days=6)).count(),
+        session.query(Employee).filter(Employee.shop_id == shop_id, Employee.is_active == True).count(),
+        session.query(Customer).join(Appointment).filter(Appointment.shop_id == shop_id).distinct().count()
+    )
+
+
+def _rollup_dashboard(session, shop_id: int) -> Tuple[int, int, int, int]:
+    """The same counts from BookingManager.get_dashboard"""
+    from booking_manager import BookingManager
+
+    dashboard = BookingManager(session).get_dashboard(shop_id)
+    return (dashboard['todays_appointments'], dashboard['week_appointments'],
+            dashboard['active_employees'], dashboard['total_customers'])
+
+
+def bench_dashboard(history: Tuple[int, ...] = (10000, 100000, 300000), repeat: int = 5):
+    """Time the owner dashboard as appointment history grows: COUNT queries vs rollups"""
+    from models import get_session
+    from maintenance import rebuild_shop_stats
+
+    print(f"Dashboard: today, week, staff and customer counts, average of {repeat} (SQLite file)")
+    database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='barber_bench_'), 'bench.db')}"
+    engine, session, booking_manager, employee_ids, service_id = _bulk_shop(database_url, 10)
+    shop_id = booking_manager.get_employee(employee_ids[0]).shop_id
+    booking_manager.book_many(_bulk_requests(200, employee_ids, service_id))
+
+    added = 0
+    for size in history:
+        customer_id = booking_manager.customer_id_for_phone(f"555-6{size:06d}", "History")
+        _add_history(session, shop_id, employee_ids, customer_id, size - added, size)
+        added = size
+        rebuild_shop_stats(session)
+
+        def run(dashboard):
+            fresh = get_session(engine)
+            try:
+                return dashboard(fresh, shop_id)
+            finally:
+                fresh.close()
+
+        legacy = run(_legacy_dashboard)
+        rollups = run(_rollup_dashboard)
+        assert legacy == rollups, f"Counts differ: {legacy} vs {rollups}"
+        legacy_ms = _timeit(lambda: run(_legacy_dashboard), repeat)
+        rollup_ms = _timeit(lambda: run(_rollup_dashboard), repeat)
+        print(f"  {size:7d} appointments: COUNT queries {legacy_ms:8.2f} ms | rollups {rollup_ms:6.2f} ms "
+              f"| {legacy[1]} this week, {legacy[3]} customers")
+
+    session.close()
+    engine.dispose()
+
+
+# ==== READ CACHE ====
+
+def bench_read_cache(shops: int = 200, staff: int = 30, repeat: int = 200):
+    """Time the reference reads behind the shop endpoints: straight from the database vs cached"""
+    from booking_manager import BookingManager
+    from cache import LocalBackend, MemoryStore, ReadThroughCache, SharedBackend
+    from models import ShopStats, get_session
+
+    print(f"Read cache: {shops} shops, {staff} employees and services each, "
+          f"average of {repeat} (SQLite file)")
+    database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='barber_bench_'), 'bench.db')}"
+    engine, session, booking_manager, employee_ids, service_id = _bulk_shop(database_url, staff)
+    shop_id = booking_manager.get_employee(employee_ids[0]).shop_id
+    for i in range(staff - 1):
+        booking_manager.add_service(shop_id, f"Service {i}", 30, 20.0)
+    for i in range(shops - 1):
+        booking_manager.create_shop(f"Shop {i}", "Owner", "09:00", "18:00")
+    version = session.query(ShopStats.version).filter(ShopStats.shop_id == shop_id).scalar()
+    session.close()
+
+    def reads(manager: BookingManager):
+        manager.list_shops()
+        manager.get_shop_summary(shop_id, version)
+        manager.list_employees(shop_id, version=version)
+        manager.list_services(shop_id, version=version)
+
+    # A zero TTL turns every read into a miss, i.e. no cache
+    for name, backend, ttl in (("no cache", LocalBackend(), 0),
+                               ("local", LocalBackend(), 300),
+                               ("shared store", SharedBackend(MemoryStore()), 300)):
+        read_cache = ReadThroughCache(backend, ttl)
+
+        def run():
+            fresh = get_session(engine)
+            try:
+                manager = BookingManager(fresh)
+                manager.read_cache = read_cache
+                reads(manager)
+            finally:
+                fresh.close()
+
+        run()
+        print(f"  {name:12s}: {_timeit(run, repeat):6.2f} ms for shop list, details, employees, services")
+
+    engine.dispose()
+
+
+# ==== APPOINTMENT PAGES ====
+
+def bench_appointment_pages(history: int = 100000, page_size: int = 50, repeat: int = 5):
+    """Time the shop appointment listing: whole history vs OFFSET pages vs keyset pages, by depth"""
+    from sqlalchemy import func
+    from booking_manager import BookingManager
+    from models import Appointment, get_session
+    from pagination import encode_cursor
+
+    print(f"Appointment pages: {page_size} per page of {history} appointments, "
+          f"average of {repeat} (SQLite file)")
+    database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='barber_bench_'), 'bench.db')}"
+    engine, session, booking_manager, employee_ids, service_id = _bulk_shop(database_url, 10)
+    shop_id = booking_manager.get_employee(employee_ids[0]).shop_id
+    customer_id = booking_manager.customer_id_for_phone("555-6000", "History")
+    _add_history(session, shop_id, employee_ids, customer_id, history, history)
+    total = session.query(func.count(Appointment.id)).filter(
+        Appointment.shop_id == shop_id, Appointment.status != 'cancelled').scalar()
+
+    def run(listing):
+        fresh = get_session(engine)
+        try:
+            return listing(BookingManager(fresh))
+        finally:
+            fresh.close()
+
+    def whole_history(manager):
+        return manager.list_shop_appointments(shop_id, limit=total)[0]
+
+    everything = run(whole_history)
+    print(f"  whole history: {_timeit(lambda: run(whole_history), repeat):9.2f} ms")
+    for depth in (0, total // 2, total - page_size):
+        def offset_page(manager):
+            return [row._asdict() for row in manager.session.query(
+                Appointment.id, Appointment.appointment_date, Appointment.start_time
+            ).filter(
+                Appointment.shop_id == shop_id, Appointment.status != 'cancelled'
+            ).order_by(
+                Appointment.appointment_date, Appointment.start_time, Appointment.id
+            ).offset(depth).limit(page_size)]
+
+        last = everything[depth - 1] if depth else None
+        cursor = encode_cursor((last['appointment_date'], last['start_time'], last['id'])) if last else None
+        page, _ = run(lambda manager: manager.list_shop_appointments(shop_id, cursor=cursor, limit=page_size))
+        assert [a['id'] for a in page] == [a['id'] for a in everything[depth:depth + page_size]]
+        offset_ms = _timeit(lambda: run(offset_page), repeat)
+        keyset_ms = _timeit(lambda: run(lambda manager: manager.list_shop_appointments(
+            shop_id, cursor=cursor, limit=page_size)), repeat)
+        print(f"  row {depth:7d}: OFFSET {offset_ms:7.2f} ms | keyset {keyset_ms:6.2f} ms")
+
+    session.close()
+    engine.dispose()
+
+
+# ==== EXPORT ====
+
+def bench_export(history: Tuple[int, ...] = (10000, 100000, 300000)):
+    """Peak memory and time of a CSV export as the range grows: all rows at once vs streamed"""
+    import asyncio
+    import tracemalloc
+    from exporter import encode_rows, export_query, stream_appointments
+    from models import init_async_db, get_async_session
+
+    print("Export: CSV of a shop's whole history, peak traced memory; times include tracing (SQLite file)")
+    database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='barber_bench_'), 'bench.db')}"
+    engine, session, booking_manager, employee_ids, service_id = _bulk_shop(database_url, 10)
+    shop_id = booking_manager.get_employee(employee_ids[0]).shop_id
+    customer_id = booking_manager.customer_id_for_phone("555-6000", "History")
+    async_engine = init_async_db(database_url)
+    async_engine.echo = False
+
+    async def materialized() -> int:
+        # What a plain endpoint does: fetch every row, then build the whole body
+        async with get_async_session(async_engine) as export_session:
+            rows = (await export_session.execute(export_query(shop_id))).all()
+            return len(encode_rows(rows, 'csv', header=True))
+
+    async def streamed() -> int:
+        async with get_async_session(async_engine) as export_session:
+            size = 0
+            async for chunk in stream_appointments(export_session, shop_id, 'csv'):
+                size += len(chunk)
+            return size
+
+    async def measure(export) -> Tuple[int, float, float]:
+        tracemalloc.start()
+        started = timer.perf_counter()
+        size = await export()
+        elapsed = timer.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return size, elapsed * 1000, peak / 2 ** 20
+
+    async def run():
+        # One event loop for the whole run; pooled connections belong to it
+        added = 0
+        for count in history:
+            _add_history(session, shop_id, employee_ids, customer_id, count - added, count)
+            added = count
+            whole_size, whole_ms, whole_mb = await measure(materialized)
+            stream_size, stream_ms, stream_mb = await measure(streamed)
+            assert whole_size == stream_size, f"Exports differ: {whole_size} vs {stream_size} characters"
+            print(f"  {count:7d} appointments: all at once {whole_mb:7.1f} MB {whole_ms:7.0f} ms | "
+                  f"streamed {stream_mb:5.1f} MB {stream_ms:7.0f} ms")
+        await async_engine.dispose()
+
+    asyncio.run(run())
+    session.close()
+    engine.dispose()
+
+
+# ==== ASYNC ENDPOINTS ====
+
+def _mixed_app(engine, async_engine):
+    """A small app serving a slow report and a fast read, each over a blocking session and over an AsyncSession"""
+    from fastapi import FastAPI
+    from models import get_session, get_async_session
+    from booking_manager import BookingManager, AsyncBookingManager
+
+    app = FastAPI()
+
+    def report(manager, shop_id: int):
+        # The COUNT dashboard from before the rollups: a scan of the shop's whole history
+        return _legacy_dashboard(manager.session, shop_id)
+
+    def day_page(manager, shop_id: int, day: date):
+        return len(manager.list_shop_appointments(shop_id, day)[0])
+
+    @app.get("/blocking/report/{shop_id}")
+    async def blocking_report(shop_id: int):
+        # What the endpoints did before: a synchronous session inside an async handler
+        session = get_session(engine)
+        try:
+            return report(BookingManager(session), shop_id)
+        finally:
+            session.close()
+
+    @app.get("/blocking/day/{shop_id}")
+    async def blocking_day(shop_id: int, day: date):
+        session = get_session(engine)
+        try:
+            return day_page(BookingManager(session), shop_id, day)
+        finally:
+            session.close()
+
+    @app.get("/async/report/{shop_id}")
+    async def async_report(shop_id: int):
+        async with get_async_session(async_engine) as session:
+            return await AsyncBookingManager(session).run(lambda manager: report(manager, shop_id))
+
+    @app.get("/async/day/{shop_id}")
+    async def async_day(shop_id: int, day: date):
+        async with get_async_session(async_engine) as session:
+            return await AsyncBookingManager(session).run(lambda manager: day_page(manager, shop_id, day))
+
+    return app
+
+
+async def _load(app, slow_path: str, slow_requests: int, concurrency: int,
+                fast_path: str, fast_rate: float) -> Tuple[float, List[float], List[float]]:
+    """Send slow requests with a fixed concurrency while fast ones arrive at fast_rate per second.
+
+    Returns the elapsed s for the slow requests, the fast latencies in ms counted from when
+    each request was due (so a blocked loop cannot hide its delay) and the event-loop lags in ms.
+    """
+    import asyncio
+    import httpx
+
+    latencies, lags = [], []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                                 base_url="http://bench") as client:
+        queue = list(range(slow_requests))
+        done = asyncio.Event()
+
+        async def worker():
+            while queue:
+                queue.pop()
+                # The in-process transport never waits on a socket; yield as a network round trip would
+                await asyncio.sleep(0)
+                (await client.get(slow_path)).raise_for_status()
+
+        async def fast(due: float):
+            (await client.get(fast_path)).raise_for_status()
+            latencies.append((timer.perf_counter() - due) * 1000)
+
+        async def arrivals():
+            sent = []
+            due = timer.perf_counter()
+            while not done.is_set():
+                # Requests that fell due while the loop was blocked are all sent now
+                while due <= timer.perf_counter():
+                    sent.append(asyncio.create_task(fast(due)))
+                    due += 1 / fast_rate
+                await asyncio.sleep(max(0.0, due - timer.perf_counter()))
+            await asyncio.gather(*sent)
+
+        async def monitor():
+            # How late a 5 ms timer fires is how long the event loop was blocked
+            while not done.is_set():
+                sent = timer.perf_counter()
+                await asyncio.sleep(0.005)
+                lags.append((timer.perf_counter() - sent) * 1000 - 5)
+
+        start = timer.perf_counter()
+        background = [asyncio.create_task(arrivals()), asyncio.create_task(monitor())]
+        await asyncio.sleep(0)
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = timer.perf_counter() - start
+        done.set()
+        await asyncio.gather(*background)
+        return elapsed, latencies, lags
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def bench_async_endpoints(history: int = 50000, reports: int = 40, concurrency: int = 4,
+                          reads_per_second: float = 100):
+    """Compare a mixed workload, slow reports beside fast day listings: blocking vs async session"""
+    import asyncio
+    from models import init_async_db
+
+    print(f"Async endpoints: {reports} history reports, {concurrency} at a time, beside "
+          f"{reads_per_second:.0f} day listings/s, on {history} appointments (SQLite file)")
+    database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='barber_bench_'), 'bench.db')}"
+    engine, session, booking_manager, employee_ids, service_id = _bulk_shop(database_url, 10)
+    shop_id = booking_manager.get_employee(employee_ids[0]).shop_id
+    customer_id = booking_manager.customer_id_for_phone("555-6000", "History")
+    _add_history(session, shop_id, employee_ids, customer_id, history, history)
+    session.close()
+    yesterday = date.today() - timedelta(days=1)
+
+    async_engine = init_async_db(database_url)
+    async_engine.echo = False
+    app = _mixed_app(engine, async_engine)
+    for mode in ('blocking', 'async'):
+        elapsed, latencies, lags = asyncio.run(_load(
+            app, f"/{mode}/report/{shop_id}", reports, concurrency,
+            f"/{mode}/day/{shop_id}?day={yesterday}", reads_per_second
+        ))
+        print(f"  {mode:8s}: reports {reports / elapsed:5.1f} req/s | {len(latencies)} day listings "
+              f"p50 {_percentile(latencies, 0.5):6.1f} ms, p95 {_percentile(latencies, 0.95):6.1f} ms "
+              f"| event loop blocked up to {max(lags):6.1f} ms")
+
+    asyncio.run(async_engine.dispose())
+    engine.dispose()
+
+
+BENCHMARKS = {
+    'availability': bench_availability,
+    'concurrent-booking': bench_concurrent_booking,
+    'bulk-booking': bench_bulk_booking,
+    'sqlite-profiles': bench_sqlite_profiles,
+    'shop-details': bench_shop_details,
+    'dashboard': bench_dashboard,
+    'read-cache': bench_read_cache,
+    'appointment-pages': bench_appointment_pages,
+    'export': bench_export,
+    'async-endpoints': bench_async_endpoints,
+}
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark '{name}'. Choose from: {', '.join(BENCHMARKS)}")
+            sys.exit(1)
+        BENCHMARKS[name]()
+        print()
@@ -4,15 +4,84 @@ Handles all appointment scheduling logic
 """
 
 from datetime import datetime, date, time, timedelta
-from typing import List, Optional, Dict
+import asyncio
+import random
+from itertools import groupby, islice
+from time import sleep
+from typing import Any, Callable, List, Optional, Dict, Set, Tuple
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, not_
-from models import Shop, Employee, Customer, Appointment, Service, EmployeeSchedule
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy import and_, func, or_, not_
+from sqlalchemy.util import await_only
+from models import (
+    Shop, Employee, Customer, Appointment, AppointmentSeries, Service, EmployeeSchedule,
+    EmployeeDayOccupancy, ShopStats, is_lock_contention
+)
+from availability import DayAvailability, Interval, from_minutes, to_minutes
+from occupancy import (
+    busy_for_day, busy_for_range, encode_busy, entries_of, find_conflict, intervals_of,
+    occupancy_row, occupancy_rows, record_booking, record_bookings, release_booking,
+    release_bookings
+)
+from pagination import DEFAULT_PAGE_SIZE, keyset, next_page
+from recurrence import occurrences
+from shop_stats import (
+    adjust_employees, adjust_scheduled, dashboard_counts, scheduled_appointments, touch_shops
+)
+from schedule_overlay import ScheduleOverlay
+from cache import (
+    NOT_CACHED, SHOP_LISTINGS, SHOPS_KEY, availability_cache, customer_cache, page_key,
+    read_cache, reference_cache, shop_key
+)
+from phones import normalize_phone
+from reference import EMPLOYEE_COLUMNS, EmployeeRef, ServiceRef, ShopReference, load_shop_reference
+
+# Optimistic attempts before a booking that keeps losing races gives up
+BOOKING_ATTEMPTS = 5
+# Backoff before retrying a write: a random wait of up to base * 2**attempt seconds, capped
+RETRY_BASE_DELAY = 0.01
+RETRY_MAX_DELAY = 0.5
+# Most occurrences a recurring series may book (two years of weekly visits)
+MAX_SERIES_OCCURRENCES = 104
+
+
+def _shop_fields(shop: Shop) -> Dict:
+    """A shop's fields as the shop endpoints serve them"""
+    return {
+        "id": shop.id,
+        "name": shop.name,
+        "owner_name": shop.owner_name,
+        "address": shop.address,
+        "phone": shop.phone,
+        "opening_time": shop.opening_time.strftime("%H:%M"),
+        "closing_time": shop.closing_time.strftime("%H:%M")
+    }
 
 
 class BookingManager:
     def __init__(self, session: Session):
         self.session = session
+        # Schedule overrides, from the shop snapshots or loaded in bulk per date range
+        self.schedule_overlay = ScheduleOverlay(session, self._snapshot_overrides)
+        # Process-wide free-gap tables per employee-day, shared with other requests
+        self.availability_cache = availability_cache
+        # Process-wide phone -> customer id cache
+        self.customer_cache = customer_cache
+        # Process-wide snapshots of each shop's employees and services
+        self.reference_cache = reference_cache
+        # Shop, employee and service listings, possibly shared with other workers
+        self.read_cache = read_cache
+        # How a retried write waits; the async manager yields to the event loop instead
+        self.sleep = sleep
+    
+    def _retry_later(self, error: Exception, attempt: int):
+        """Roll back a write that lost a race or met a locked database, then back off"""
+        self.session.rollback()
+        if isinstance(error, OperationalError) and not is_lock_contention(error):
+            raise error
+        self.sleep(random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt)))
     
     def create_shop(self, name: str, owner_name: str, opening_time: str, closing_time: str, **kwargs) -> Shop:
         """Create a new shop"""
@@ -24,7 +93,11 @@ class BookingManager:
             **kwargs
         )
         self.session.add(shop)
+        self.session.flush()
+        self.session.add(ShopStats(shop_id=shop.id, scheduled_appointments=0,
+                                   total_customers=0, active_employees=0, version=0))
         self.session.commit()
+        self.read_cache.invalidate(SHOPS_KEY)
         return shop
     
     def add_employee(self, shop_id: int, name: str, phone: str, 
@@ -40,7 +113,11 @@ class BookingManager:
             **kwargs
         )
         self.session.add(employee)
+        self.session.flush()
+        adjust_employees(self.session, {shop_id: 1 if employee.is_active else 0})
         self.session.commit()
+        self.reference_cache.invalidate(shop_id)
+        self.forget_listings(shop_id)
         return employee
     
     def add_service(self, shop_id: int, name: str, duration_minutes: int, price: float, **kwargs) -> Service:
@@ -53,76 +130,292 @@ class BookingManager:
             **kwargs
         )
         self.session.add(service)
+        touch_shops(self.session, [shop_id])
         self.session.commit()
+        self.reference_cache.invalidate(shop_id)
+        self.forget_listings(shop_id)
         return service
     
+    def shop_reference(self, shop_id: int, refresh: bool = False) -> ShopReference:
+        """Get a shop's employees and services from the shared cache, loading them on a miss"""
+        reference = None if refresh else self.reference_cache.get(shop_id)
+        if reference is None:
+            reference = load_shop_reference(self.session, shop_id)
+            self.reference_cache.set(shop_id, reference)
+        return reference
+    
+    def _cached_page(self, key: str, query, column, fields: Callable[[Any], Dict],
+                     cursor: Optional[str], limit: int,
+                     version: Optional[int] = None) -> Tuple[List[Dict], Optional[str]]:
+        """Get a keyset page of a query by a unique column through the read cache, page by page"""
+        def load():
+            rows, next_cursor = next_page(keyset(query, (column,), cursor, limit).all(), limit,
+                                          lambda row: (getattr(row, column.key),))
+            return [fields(row) for row in rows], next_cursor
+        
+        page, next_cursor = self.read_cache.get_page(key, page_key(cursor, limit), load, version)
+        return page, next_cursor
+    
+    def list_shops(self, cursor: Optional[str] = None,
+                   limit: int = DEFAULT_PAGE_SIZE) -> Tuple[List[Dict], Optional[str]]:
+        """Get a page of shops by id as the shop list serves it, and the cursor of the next one"""
+        return self._cached_page(SHOPS_KEY, self.session.query(Shop), Shop.id, _shop_fields,
+                                 cursor, limit)
+    
+    def shop_details(self, shop_id: int, version: Optional[int] = None) -> Optional[Dict]:
+        """Get a shop's fields and employee count through the read cache; None for no such shop"""
+        def load():
+            shop = self.session.query(Shop).get(shop_id)
+            if not shop:
+                return None
+            employees = self.session.query(func.count(Employee.id)).filter(
+                Employee.shop_id == shop_id
+            ).scalar()
+            return dict(_shop_fields(shop), employees=employees)
+        
+        return self.read_cache.get(shop_key('shop', shop_id), load, version)
+    
+    def list_employees(self, shop_id: int, cursor: Optional[str] = None,
+                       limit: int = DEFAULT_PAGE_SIZE,
+                       version: Optional[int] = None) -> Tuple[List[Dict], Optional[str]]:
+        """Get a page of a shop's active employees by id, and the cursor of the next one"""
+        query = self.session.query(Employee).filter(
+            Employee.shop_id == shop_id,
+            Employee.is_active == True
+        )
+        return self._cached_page(shop_key('employees', shop_id), query, Employee.id, lambda e: {
+            "id": e.id,
+            "name": e.name,
+            "phone": e.phone,
+            "specialization": e.specialization,
+            "working_days": e.working_days,
+            "start_time": e.start_time.strftime("%H:%M"),
+            "end_time": e.end_time.strftime("%H:%M")
+        }, cursor, limit, version)
+    
+    def list_services(self, shop_id: int, cursor: Optional[str] = None,
+                      limit: int = DEFAULT_PAGE_SIZE,
+                      version: Optional[int] = None) -> Tuple[List[Dict], Optional[str]]:
+        """Get a page of a shop's services by id, and the cursor of the next one"""
+        query = self.session.query(Service).filter(Service.shop_id == shop_id)
+        return self._cached_page(shop_key('services', shop_id), query, Service.id, lambda s: {
+            "id": s.id,
+            "name": s.name,
+            "description": s.description,
+            "duration_minutes": s.duration_minutes,
+            "price": s.price
+        }, cursor, limit, version)
+    
+    def forget_listings(self, shop_id: int):
+        """Drop a shop's cached details and listings after its employees or services changed"""
+        self.read_cache.invalidate(*(shop_key(listing, shop_id) for listing in SHOP_LISTINGS))
+    
+    def _reference_item(self, kind: str, model, item_id: int):
+        """Get an employee or service snapshot through its shop's reference data"""
+        shop_id = self.reference_cache.shop_of(kind, item_id)
+        if shop_id is None:
+            shop_id = self.session.query(model.shop_id).filter(model.id == item_id).scalar()
+            if shop_id is None:
+                return None
+        
+        items = getattr(self.shop_reference(shop_id), kind)
+        if item_id not in items:
+            # Added by another worker after the snapshot was taken
+            items = getattr(self.shop_reference(shop_id, refresh=True), kind)
+        return items.get(item_id)
+    
+    def _snapshot_overrides(self, employee_id: int) -> Optional[Tuple[date, Dict]]:
+        """Get an employee's upcoming schedule overrides from their shop's snapshot"""
+        employee = self.get_employee(employee_id)
+        if not employee:
+            return None
+        reference = self.shop_reference(employee.shop_id)
+        return reference.overrides_from, reference.overrides.get(employee_id, {})
+    
+    def get_employee(self, employee_id: int) -> Optional[EmployeeRef]:
+        """Get an employee's scheduling fields from the reference cache"""
+        return self._reference_item('employees', Employee, employee_id)
+    
+    def get_service(self, service_id: int) -> Optional[ServiceRef]:
+        """Get a service's fields from the reference cache"""
+        return self._reference_item('services', Service, service_id)
+    
     def register_customer(self, name: str, phone: str, **kwargs) -> Customer:
         """Register a new customer or get existing one"""
-        # Check if customer exists
-        customer = self.session.query(Customer).filter_by(phone=phone).first()
-        if customer:
-            return customer
-        
-        # Create new customer
-        customer = Customer(name=name, phone=phone, **kwargs)
-        self.session.add(customer)
-        self.session.commit()
-        return customer
+        return self.session.query(Customer).get(self.customer_id_for_phone(phone, name, **kwargs))
+    
+    def customer_id_for_phone(self, phone: str, name: str, **kwargs) -> int:
+        """Get the id of the customer with a phone number, registering them if new"""
+        phone = normalize_phone(phone)
+        customer_id = self.customer_cache.get(phone)
+        if customer_id is not None:
+            return customer_id
+        
+        for attempt in range(BOOKING_ATTEMPTS):
+            # Check if customer exists
+            customer_id = self.session.query(Customer.id).filter_by(phone=phone).scalar()
+            if customer_id is not None:
+                break
+            
+            # Create new customer
+            customer = Customer(name=name, phone=phone, **kwargs)
+            self.session.add(customer)
+            try:
+                self.session.flush()
+                customer_id = customer.id
+                self.session.commit()
+                break
+            except IntegrityError:
+                # Registered by a concurrent request in the meantime
+                self.session.rollback()
+            except OperationalError as e:
+                self._retry_later(e, attempt)
+        else:
+            raise ValueError("Customer is being registered by someone else, please try again")
+        
+        # Only ids of committed rows are cached
+        self.customer_cache.set(phone, customer_id)
+        return customer_id
+    
+    def _working_hours(self, employee: EmployeeRef, day: date) -> Optional[Tuple[time, time]]:
+        """Get an employee's working hours on a date, or None on a day off"""
+        # A schedule override for the date takes precedence over the weekly pattern
+        override = self.schedule_overlay.get(employee.id, day)
+        if override:
+            if not override.is_available:
+                return None
+            return (override.start_time or employee.start_time,
+                    override.end_time or employee.end_time)
+        
+        day_name = day.strftime("%a")  # Get day abbreviation (Mon, Tue, etc.)
+        if day_name not in employee.working_days.split(","):
+            return None
+        return employee.start_time, employee.end_time
+    
+    def _service_duration(self, service_id: Optional[int]) -> int:
+        """Get a service's duration in minutes, 30 minutes by default"""
+        if service_id:
+            service = self.get_service(service_id)
+            if service:
+                return service.duration_minutes
+        return 30
+    
+    def _check_working_hours(self, employee: EmployeeRef, day: date, start: time, end: time):
+        """Reject a booking outside the special schedule set for its date, if there is one"""
+        override = self.schedule_overlay.get(employee.id, day)
+        if override:
+            hours = self._working_hours(employee, day)
+            if not hours:
+                raise ValueError("Employee is not working on this date")
+            if start < hours[0] or end > hours[1]:
+                raise ValueError("Time is outside the employee's working hours")
     
-    def get_employee_availability(self, employee_id: int, date: date) -> List[Dict]:
+    def _day_availability(self, employee: EmployeeRef, day: date,
+                          busy: List[Interval]) -> Optional[DayAvailability]:
+        """Build the free-gap table of an employee-day and cache it for every later request"""
+        hours = self._working_hours(employee, day)
+        table = DayAvailability(hours[0], hours[1], busy) if hours else None
+        self.availability_cache.set((employee.id, day), table)
+        return table
+    
+    def _forget_day(self, employee_id: int, day: date):
+        """Drop cached availability of an employee-day after it changed"""
+        self.availability_cache.invalidate(employee_id, day)
+    
+    def get_employee_availability(self, employee_id: int, date: date,
+                                  service_id: Optional[int] = None) -> List[Dict]:
         """Get available time slots for an employee on a specific date"""
-        employee = self.session.query(Employee).get(employee_id)
+        duration = self._service_duration(service_id)
+        
+        # The day's free gaps are worked out once, whatever service length asked first
+        table = self.availability_cache.get((employee_id, date), NOT_CACHED)
+        if table is NOT_CACHED:
+            employee = self.get_employee(employee_id)
+            if not employee:
+                return []
+            
+            # Only a working day needs its booked intervals from the occupancy table
+            hours = self._working_hours(employee, date)
+            busy = busy_for_day(self.session, employee_id, date) if hours else []
+            table = self._day_availability(employee, date, busy)
+        
+        # Only return start times where the whole service fits
+        return table.slots(duration) if table else []
+    
+    def get_availability_range(self, employee_id: int, start_date: date, end_date: date,
+                               service_id: Optional[int] = None) -> Dict[date, List[Dict]]:
+        """Get available time slots for an employee on every date of a range"""
+        employee = self.get_employee(employee_id)
         if not employee:
-            return []
+            return {}
+        duration = self._service_duration(service_id)
+        self.schedule_overlay.load([employee_id], start_date, end_date)
         
-        # Check if employee works on this day
-        day_name = date.strftime("%a")  # Get day abbreviation (Mon, Tue, etc.)
-        if day_name not in employee.working_days.split(","):
-            return []
-        
-        # Get employee's working hours
-        start_time = employee.start_time
-        end_time = employee.end_time
-        
-        # Get existing appointments for this employee on this date
-        appointments = self.session.query(Appointment).filter(
-            and_(
-                Appointment.employee_id == employee_id,
-                Appointment.appointment_date == date,
-                Appointment.status != 'cancelled'
-            )
-        ).all()
+        # Fetch the occupancy of the whole window at once
+        busy = busy_for_range(self.session, [employee_id], start_date, end_date)
         
-        # Generate time slots (30-minute intervals by default)
-        time_slots = []
-        current_time = datetime.combine(date, start_time)
-        end_datetime = datetime.combine(date, end_time)
-        slot_duration = timedelta(minutes=30)
+        availability = {}
+        day = start_date
+        while day <= end_date:
+            table = self._day_availability(employee, day, busy.get((employee_id, day), []))
+            availability[day] = table.slots(duration) if table else []
+            day += timedelta(days=1)
         
-        while current_time + slot_duration <= end_datetime:
-            slot_end = current_time + slot_duration
-            
-            # Check if slot is available (not booked)
-            is_available = True
-            for appointment in appointments:
-                appt_start = datetime.combine(date, appointment.start_time)
-                appt_end = datetime.combine(date, appointment.end_time)
-                
-                # Check for overlap
-                if not (slot_end <= appt_start or current_time >= appt_end):
-                    is_available = False
-                    break
-            
-            if is_available:
-                time_slots.append({
-                    'start_time': current_time.time(),
-                    'end_time': slot_end.time(),
-                    'available': True
-                })
-            
-            current_time = slot_end
+        return availability
+    
+    def get_shop_availability(self, shop_id: int, date: date,
+                              service_id: Optional[int] = None) -> Dict:
+        """Get every active employee's free slots for a date as a slot matrix"""
+        employees = [e for e in self.shop_reference(shop_id).employees.values() if e.is_active]
+        duration = self._service_duration(service_id)
+        self.schedule_overlay.load([e.id for e in employees], date, date)
+        
+        busy = busy_for_range(self.session, [e.id for e in employees], date, date)
+        
+        # Fitting starts per employee; the matrix columns are the union of their grids
+        free_starts = {}
+        columns = set()
+        for employee in employees:
+            table = self._day_availability(employee, date, busy.get((employee.id, date), []))
+            if not table:
+                free_starts[employee.id] = set()
+                continue
+            free_starts[employee.id] = set(table.starts(duration))
+            columns.update(table.grid())
+        
+        columns = sorted(columns)
+        return {
+            'slots': [from_minutes(start) for start in columns],
+            'employees': [{
+                'id': employee.id,
+                'name': employee.name,
+                'available': [start in free_starts[employee.id] for start in columns]
+            } for employee in employees]
+        }
+    
+    def set_employee_schedule(self, employee_id: int, date: date,
+                              start_time: Optional[str] = None, end_time: Optional[str] = None,
+                              is_available: bool = True) -> EmployeeSchedule:
+        """Set special working hours or a day off for an employee on a date"""
+        schedule = self.session.query(EmployeeSchedule).filter(
+            EmployeeSchedule.employee_id == employee_id,
+            EmployeeSchedule.date == date
+        ).order_by(EmployeeSchedule.id.desc()).first()
+        if not schedule:
+            schedule = EmployeeSchedule(employee_id=employee_id, date=date)
+            self.session.add(schedule)
+        
+        schedule.start_time = datetime.strptime(start_time, "%H:%M").time() if start_time else None
+        schedule.end_time = datetime.strptime(end_time, "%H:%M").time() if end_time else None
+        schedule.is_available = is_available
+        self.session.commit()
         
-        return time_slots
+        self.schedule_overlay.invalidate(employee_id)
+        employee = self.get_employee(employee_id)
+        if employee:
+            self.reference_cache.invalidate(employee.shop_id)
+        self._forget_day(employee_id, date)
+        return schedule
     
     def book_appointment(self, employee_id: int, customer_phone: str, customer_name: str,
                         appointment_date: date, start_time: str, service_id: Optional[int] = None,
@@ -130,10 +423,10 @@ class BookingManager:
         """Book an appointment"""
         
         # Get or create customer
-        customer = self.register_customer(customer_name, customer_phone)
+        customer_id = self.customer_id_for_phone(customer_phone, customer_name)
         
         # Get employee and shop
-        employee = self.session.query(Employee).get(employee_id)
+        employee = self.get_employee(employee_id)
         if not employee:
             raise ValueError("Employee not found")
         
@@ -141,58 +434,413 @@ class BookingManager:
         start_time_obj = datetime.strptime(start_time, "%H:%M").time()
         
         # Calculate end time based on service duration
-        duration = 30  # Default 30 minutes
-        if service_id:
-            service = self.session.query(Service).get(service_id)
-            if service:
-                duration = service.duration_minutes
+        duration = self._service_duration(service_id)
         
         end_time_obj = (datetime.combine(date.today(), start_time_obj) + 
                         timedelta(minutes=duration)).time()
         
-        # Check availability
-        conflicting = self.session.query(Appointment).filter(
-            and_(
-                Appointment.employee_id == employee_id,
-                Appointment.appointment_date == appointment_date,
-                Appointment.status != 'cancelled',
-                or_(
-                    and_(Appointment.start_time <= start_time_obj, 
-                         Appointment.end_time > start_time_obj),
-                    and_(Appointment.start_time < end_time_obj, 
-                         Appointment.end_time >= end_time_obj)
-                )
+        # Respect a special schedule set for this date
+        self._check_working_hours(employee, appointment_date, start_time_obj, end_time_obj)
+        
+        shop_id = employee.shop_id
+        
+        # The employee-day's occupancy row is the lock: its versioned UPDATE fails
+        # if another booking changed the same day since we checked it, and we retry
+        for attempt in range(BOOKING_ATTEMPTS):
+            row = occupancy_row(self.session, employee_id, appointment_date)
+            if find_conflict(entries_of(row), start_time_obj, end_time_obj):
+                self.session.rollback()
+                raise ValueError("Time slot not available")
+            
+            # Create appointment
+            appointment = Appointment(
+                shop_id=shop_id,
+                employee_id=employee_id,
+                customer_id=customer_id,
+                service_id=service_id,
+                appointment_date=appointment_date,
+                start_time=start_time_obj,
+                end_time=end_time_obj,
+                notes=notes,
+                status='scheduled'
             )
-        ).first()
-        
-        if conflicting:
-            raise ValueError("Time slot not available")
-        
-        # Create appointment
-        appointment = Appointment(
-            shop_id=employee.shop_id,
-            employee_id=employee_id,
-            customer_id=customer.id,
-            service_id=service_id,
-            appointment_date=appointment_date,
-            start_time=start_time_obj,
-            end_time=end_time_obj,
-            notes=notes,
-            status='scheduled'
-        )
+            
+            try:
+                self.session.add(appointment)
+                self.session.flush()
+                record_booking(self.session, appointment, row)
+                adjust_scheduled(self.session, {(shop_id, appointment_date): 1},
+                                 [(shop_id, customer_id)])
+                self.session.commit()
+            except (StaleDataError, IntegrityError, OperationalError) as e:
+                self._retry_later(e, attempt)
+                continue
+            
+            self._forget_day(employee_id, appointment_date)
+            return appointment
         
-        self.session.add(appointment)
-        self.session.commit()
-        return appointment
+        raise ValueError("Time slot is being booked by someone else, please try again")
+    
+    def book_many(self, bookings: List[Dict]) -> List[Dict]:
+        """Book a batch of appointments in one transaction.
+        
+        Each booking takes the keyword arguments of book_appointment. Bookings are
+        checked in order against the database and against each other; the result
+        lists, per booking, its new appointment or why it was rejected.
+        """
+        for attempt in range(BOOKING_ATTEMPTS):
+            try:
+                results, booked = self._book_batch(bookings)
+                self.session.commit()
+            except (StaleDataError, IntegrityError, OperationalError) as e:
+                # Another worker booked one of the same employee-days; start over
+                self._retry_later(e, attempt)
+                continue
+            
+            for employee_id, day in booked:
+                self._forget_day(employee_id, day)
+            return results
+        
+        raise ValueError("Bookings are being changed by someone else, please try again")
+    
+    def _book_batch(self, bookings: List[Dict]) -> Tuple[List[Dict], List[Tuple[int, date]]]:
+        """Validate and flush a batch of bookings; the caller commits"""
+        results: List[Dict] = [{} for _ in bookings]
+        parsed = []
+        for index, booking in enumerate(bookings):
+            try:
+                start = datetime.strptime(booking['start_time'], "%H:%M").time()
+            except ValueError:
+                results[index] = {'status': 'invalid', 'error': "Invalid start time"}
+                continue
+            try:
+                phone = normalize_phone(booking['customer_phone'])
+            except ValueError as e:
+                results[index] = {'status': 'invalid', 'error': str(e)}
+                continue
+            parsed.append((index, dict(booking, customer_phone=phone), start))
+        
+        # Everything the batch refers to, one query per table
+        employee_ids = {booking['employee_id'] for _, booking, _ in parsed}
+        employees = {row.id: EmployeeRef(*row) for row in self.session.query(
+            *EMPLOYEE_COLUMNS).filter(Employee.id.in_(employee_ids))}
+        service_ids = {booking.get('service_id') for _, booking, _ in parsed} - {None}
+        durations = dict(self.session.query(Service.id, Service.duration_minutes).filter(
+            Service.id.in_(service_ids))) if service_ids else {}
+        customer_ids = {}
+        for _, booking, _ in parsed:
+            customer_id = self.customer_cache.get(booking['customer_phone'])
+            if customer_id is not None:
+                customer_ids[booking['customer_phone']] = customer_id
+        unknown = {booking['customer_phone'] for _, booking, _ in parsed} - set(customer_ids)
+        for customer_id, phone in self.session.query(Customer.id, Customer.phone).filter(
+                Customer.phone.in_(unknown)) if unknown else []:
+            customer_ids[phone] = customer_id
+            self.customer_cache.set(phone, customer_id)
+        
+        days = [booking['appointment_date'] for _, booking, _ in parsed]
+        rows = {}
+        if days:
+            self.schedule_overlay.load(list(employees), min(days), max(days))
+            rows = occupancy_rows(self.session, list(employees), min(days), max(days))
+        entries = {key: entries_of(row) for key, row in rows.items()}
+        
+        accepted = []
+        new_customers: Dict[str, Customer] = {}
+        for index, booking, start in parsed:
+            employee = employees.get(booking['employee_id'])
+            if not employee:
+                results[index] = {'status': 'invalid', 'error': "Employee not found"}
+                continue
+            
+            day = booking['appointment_date']
+            service_id = booking.get('service_id')
+            end = (datetime.combine(day, start) +
+                   timedelta(minutes=durations.get(service_id, 30))).time()
+            try:
+                self._check_working_hours(employee, day, start, end)
+            except ValueError as e:
+                results[index] = {'status': 'invalid', 'error': str(e)}
+                continue
+            
+            # Earlier bookings of the batch occupy the day like stored ones
+            day_entries = entries.setdefault((employee.id, day), [])
+            if find_conflict(day_entries, start, end) is not None:
+                results[index] = {'status': 'conflict', 'error': "Time slot not available"}
+                continue
+            day_entries.append((to_minutes(start), to_minutes(end), 0))
+            
+            phone = booking['customer_phone']
+            if phone not in customer_ids and phone not in new_customers:
+                new_customers[phone] = Customer(name=booking['customer_name'], phone=phone)
+            accepted.append((index, booking, employee, start, end))
+        
+        # Insert new customers, then the appointments, in bulk
+        self.session.add_all(new_customers.values())
+        self.session.flush()
+        customer_ids.update((phone, c.id) for phone, c in new_customers.items())
+        appointments = []
+        for index, booking, employee, start, end in accepted:
+            appointments.append(Appointment(
+                shop_id=employee.shop_id,
+                employee_id=employee.id,
+                customer_id=customer_ids[booking['customer_phone']],
+                service_id=booking.get('service_id'),
+                series_id=booking.get('series_id'),
+                appointment_date=booking['appointment_date'],
+                start_time=start,
+                end_time=end,
+                notes=booking.get('notes', ""),
+                status='scheduled'
+            ))
+        self.session.add_all(appointments)
+        self.session.flush()
+        
+        # Claim each employee-day once
+        by_day: Dict[Tuple[int, date], List[Appointment]] = {}
+        for (index, *_), appointment in zip(accepted, appointments):
+            by_day.setdefault((appointment.employee_id, appointment.appointment_date),
+                              []).append(appointment)
+            results[index] = {
+                'status': 'booked',
+                'id': appointment.id,
+                'appointment_date': appointment.appointment_date,
+                'start_time': appointment.start_time,
+                'end_time': appointment.end_time
+            }
+        for key, day_appointments in by_day.items():
+            record_bookings(self.session, day_appointments, rows.get(key))
+        booked_per_day: Dict[Tuple[int, date], int] = {}
+        for appointment in appointments:
+            key = (appointment.shop_id, appointment.appointment_date)
+            booked_per_day[key] = booked_per_day.get(key, 0) + 1
+        adjust_scheduled(self.session, booked_per_day,
+                         [(a.shop_id, a.customer_id) for a in appointments])
+        self.session.flush()
+        return results, list(by_day)
+    
+    def book_series(self, employee_id: int, customer_phone: str, customer_name: str,
+                    start_date: date, start_time: str, frequency: str,
+                    until: Optional[date] = None, count: Optional[int] = None,
+                    service_id: Optional[int] = None, notes: str = "") -> AppointmentSeries:
+        """Book a recurring series; every occurrence must be free or nothing is booked"""
+        dates = list(islice(occurrences(start_date, frequency, until, count),
+                            MAX_SERIES_OCCURRENCES + 1))
+        if not dates:
+            raise ValueError("Series has no occurrences")
+        if len(dates) > MAX_SERIES_OCCURRENCES:
+            raise ValueError(f"A series is limited to {MAX_SERIES_OCCURRENCES} occurrences")
+        
+        customer_id = self.customer_id_for_phone(customer_phone, customer_name)
+        employee = self.get_employee(employee_id)
+        if not employee:
+            raise ValueError("Employee not found")
+        
+        start_time_obj = datetime.strptime(start_time, "%H:%M").time()
+        end_time_obj = (datetime.combine(start_date, start_time_obj) +
+                        timedelta(minutes=self._service_duration(service_id))).time()
+        shop_id = employee.shop_id
+        
+        for attempt in range(BOOKING_ATTEMPTS):
+            try:
+                series = AppointmentSeries(
+                    shop_id=shop_id,
+                    employee_id=employee_id,
+                    customer_id=customer_id,
+                    service_id=service_id,
+                    frequency=frequency,
+                    start_date=start_date,
+                    until_date=until,
+                    occurrence_count=count,
+                    start_time=start_time_obj,
+                    end_time=end_time_obj,
+                    notes=notes
+                )
+                self.session.add(series)
+                self.session.flush()
+                
+                # All occurrences are checked with one range read of the employee's days
+                results, booked = self._book_batch([{
+                    'employee_id': employee_id,
+                    'customer_phone': customer_phone,
+                    'customer_name': customer_name,
+                    'appointment_date': day,
+                    'start_time': start_time,
+                    'service_id': service_id,
+                    'series_id': series.id,
+                    'notes': notes
+                } for day in dates])
+                rejected = [f"{day} ({result['error']})"
+                            for day, result in zip(dates, results) if result['status'] != 'booked']
+                if rejected:
+                    self.session.rollback()
+                    raise ValueError(f"Series cannot be booked on: {', '.join(rejected)}")
+                self.session.commit()
+            except (StaleDataError, IntegrityError, OperationalError) as e:
+                self._retry_later(e, attempt)
+                continue
+            
+            for key in booked:
+                self._forget_day(*key)
+            return series
+        
+        raise ValueError("Time slots are being booked by someone else, please try again")
+    
+    def _series_days(self, series_id: int, from_date: date) -> Dict[date, Set[int]]:
+        """Get the ids of a series' scheduled appointments on or after a date, per date"""
+        days: Dict[date, Set[int]] = {}
+        for appointment_id, day in self.session.query(
+                Appointment.id, Appointment.appointment_date).filter(
+                Appointment.series_id == series_id,
+                Appointment.appointment_date >= from_date,
+                Appointment.status != 'cancelled'):
+            days.setdefault(day, set()).add(appointment_id)
+        return days
+    
+    def cancel_series(self, series_id: int, from_date: Optional[date] = None) -> Optional[int]:
+        """Cancel the occurrences of a series from a date on (today by default)"""
+        from_date = from_date or date.today()
+        for attempt in range(BOOKING_ATTEMPTS):
+            series = self.session.query(AppointmentSeries).get(series_id)
+            if not series:
+                return None
+            employee_id = series.employee_id
+            days = self._series_days(series_id, from_date)
+            
+            try:
+                if days:
+                    rows = occupancy_rows(self.session, [employee_id], min(days), max(days))
+                    for day, appointment_ids in days.items():
+                        if (employee_id, day) in rows:
+                            release_bookings(rows[(employee_id, day)], appointment_ids)
+                    appointment_ids = set().union(*days.values())
+                    scheduled = self.session.query(
+                        Appointment.appointment_date, func.count(Appointment.id)
+                    ).filter(
+                        Appointment.id.in_(appointment_ids),
+                        Appointment.status == 'scheduled'
+                    ).group_by(Appointment.appointment_date).all()
+                    # One UPDATE cancels every remaining occurrence
+                    self.session.query(Appointment).filter(
+                        Appointment.id.in_(appointment_ids)
+                    ).update({'status': 'cancelled'}, synchronize_session=False)
+                    if scheduled:
+                        adjust_scheduled(self.session, {(series.shop_id, day): -count
+                                                        for day, count in scheduled})
+                    else:
+                        touch_shops(self.session, [series.shop_id])
+                
+                if from_date <= series.start_date:
+                    series.status = 'cancelled'
+                elif series.until_date is None or series.until_date >= from_date:
+                    series.until_date = from_date - timedelta(days=1)
+                self.session.commit()
+            except (StaleDataError, OperationalError) as e:
+                self._retry_later(e, attempt)
+                continue
+            
+            for day in days:
+                self._forget_day(employee_id, day)
+            return sum(len(ids) for ids in days.values())
+        
+        raise ValueError("Series is being changed by someone else, please try again")
+    
+    def reschedule_series(self, series_id: int, start_time: str,
+                          from_date: Optional[date] = None) -> Optional[int]:
+        """Move the occurrences of a series from a date on (today by default) to a new time"""
+        from_date = from_date or date.today()
+        start = datetime.strptime(start_time, "%H:%M").time()
+        for attempt in range(BOOKING_ATTEMPTS):
+            series = self.session.query(AppointmentSeries).get(series_id)
+            if not series:
+                return None
+            if series.status == 'cancelled':
+                raise ValueError("Series is cancelled")
+            duration = (datetime.combine(from_date, series.end_time) -
+                        datetime.combine(from_date, series.start_time))
+            end = (datetime.combine(from_date, start) + duration).time()
+            employee = self.get_employee(series.employee_id)
+            if not employee:
+                raise ValueError("Employee not found")
+            days = self._series_days(series_id, from_date)
+            if not days:
+                return 0
+            
+            # Check every remaining occurrence against the days' other bookings at once
+            self.schedule_overlay.load([employee.id], min(days), max(days))
+            rows = occupancy_rows(self.session, [employee.id], min(days), max(days))
+            rejected = []
+            for day, appointment_ids in sorted(days.items()):
+                others = [entry for entry in entries_of(rows.get((employee.id, day)))
+                          if entry[2] not in appointment_ids]
+                try:
+                    self._check_working_hours(employee, day, start, end)
+                except ValueError as e:
+                    rejected.append(f"{day} ({e})")
+                    continue
+                if find_conflict(others, start, end) is not None:
+                    rejected.append(f"{day} (Time slot not available)")
+            if rejected:
+                self.session.rollback()
+                raise ValueError(f"Series cannot be moved on: {', '.join(rejected)}")
+            
+            try:
+                # One UPDATE moves every remaining occurrence
+                self.session.query(Appointment).filter(
+                    Appointment.id.in_(set().union(*days.values()))
+                ).update({'start_time': start, 'end_time': end}, synchronize_session=False)
+                for day, appointment_ids in days.items():
+                    row = rows.get((employee.id, day))
+                    if row is None:
+                        # Claimed like a first booking; a concurrent one collides on the key
+                        row = EmployeeDayOccupancy(employee_id=employee.id, date=day, busy='')
+                        self.session.add(row)
+                    release_bookings(row, appointment_ids)
+                    row.busy = encode_busy(entries_of(row) + [
+                        (to_minutes(start), to_minutes(end), appointment_id)
+                        for appointment_id in appointment_ids])
+                series.start_time, series.end_time = start, end
+                touch_shops(self.session, [series.shop_id])
+                self.session.commit()
+            except (StaleDataError, IntegrityError, OperationalError) as e:
+                self._retry_later(e, attempt)
+                continue
+            
+            for day in days:
+                self._forget_day(employee.id, day)
+            return sum(len(ids) for ids in days.values())
+        
+        raise ValueError("Series is being changed by someone else, please try again")
     
     def cancel_appointment(self, appointment_id: int) -> bool:
         """Cancel an appointment"""
-        appointment = self.session.query(Appointment).get(appointment_id)
-        if appointment:
-            appointment.status = 'cancelled'
-            self.session.commit()
+        for attempt in range(BOOKING_ATTEMPTS):
+            appointment = self.session.query(Appointment).get(appointment_id)
+            if not appointment:
+                return False
+            
+            try:
+                was_scheduled = appointment.status == 'scheduled'
+                was_cancelled = appointment.status == 'cancelled'
+                if not was_cancelled:
+                    release_booking(self.session, appointment)
+                appointment.status = 'cancelled'
+                if was_scheduled:
+                    self.session.flush()
+                    adjust_scheduled(self.session,
+                                     {(appointment.shop_id, appointment.appointment_date): -1})
+                elif not was_cancelled:
+                    touch_shops(self.session, [appointment.shop_id])
+                self.session.commit()
+            except (StaleDataError, OperationalError) as e:
+                # Another write touched the same employee-day; re-read and retry
+                self._retry_later(e, attempt)
+                continue
+            
+            self._forget_day(appointment.employee_id, appointment.appointment_date)
             return True
-        return False
+        
+        raise ValueError("Appointment is being changed by someone else, please try again")
     
     def get_shop_appointments(self, shop_id: int, date: Optional[date] = None) -> List[Appointment]:
         """Get all appointments for a shop"""
@@ -206,6 +854,40 @@ class BookingManager:
         
         return query.order_by(Appointment.appointment_date, Appointment.start_time).all()
     
+    def list_shop_appointments(self, shop_id: int, date: Optional[date] = None,
+                               cursor: Optional[str] = None,
+                               limit: int = DEFAULT_PAGE_SIZE) -> Tuple[List[Dict], Optional[str]]:
+        """Get a page of a shop's appointments with employee, customer and service names in one query.
+        
+        Returns the page and the cursor of the next one, None on the last page.
+        """
+        query = self.session.query(
+            Appointment.id,
+            Employee.name.label('employee_name'),
+            Customer.name.label('customer_name'),
+            Appointment.appointment_date,
+            Appointment.start_time,
+            Appointment.end_time,
+            Service.name.label('service_name'),
+            Appointment.status
+        ).join(
+            Employee, Employee.id == Appointment.employee_id
+        ).join(
+            Customer, Customer.id == Appointment.customer_id
+        ).outerjoin(
+            Service, Service.id == Appointment.service_id
+        ).filter(
+            Appointment.shop_id == shop_id,
+            Appointment.status != 'cancelled'
+        )
+        
+        if date:
+            query = query.filter(Appointment.appointment_date == date)
+        
+        order = (Appointment.appointment_date, Appointment.start_time, Appointment.id)
+        rows = [row._asdict() for row in keyset(query, order, cursor, limit)]
+        return next_page(rows, limit, lambda a: (a['appointment_date'], a['start_time'], a['id']))
+    
     def get_employee_appointments(self, employee_id: int, date: Optional[date] = None) -> List[Appointment]:
         """Get appointments for a specific employee"""
         query = self.session.query(Appointment).filter(
@@ -218,44 +900,128 @@ class BookingManager:
         
         return query.order_by(Appointment.appointment_date, Appointment.start_time).all()
     
+    def get_shop_summary(self, shop_id: int, version: Optional[int] = None) -> Optional[Dict]:
+        """Get a shop's details with its employee and scheduled appointment counts, whatever its history"""
+        details = self.shop_details(shop_id, version)
+        if not details:
+            return None
+        
+        # The scheduled count moves with every booking, so it is always read fresh
+        return dict(details, scheduled_appointments=scheduled_appointments(self.session, shop_id))
+    
+    def get_dashboard(self, shop_id: int) -> Optional[Dict]:
+        """Get a shop's appointment, staff and customer counts for the owner dashboard"""
+        shop = self.session.query(Shop).get(shop_id)
+        if not shop:
+            return None
+        
+        today = date.today()
+        week_start = today - timedelta(days=today.weekday())
+        week_end = week_start + timedelta(days=6)
+        
+        # The shop's counters plus at most seven day rows, however long its history
+        stats, scheduled_per_day = dashboard_counts(self.session, shop_id, week_start, week_end)
+        
+        return {
+            'shop': shop,
+            'today': today,
+            'todays_appointments': scheduled_per_day.get(today, 0),
+            'week_appointments': sum(scheduled_per_day.values()),
+            'active_employees': stats.active_employees,
+            'total_customers': stats.total_customers
+        }
+    
     def get_next_available_slot(self, employee_id: Optional[int] = None, 
-                                shop_id: Optional[int] = None) -> Optional[Dict]:
-        """Find the next available appointment slot"""
+                                shop_id: Optional[int] = None,
+                                duration_minutes: int = 30,
+                                max_days_ahead: int = 30) -> Optional[Dict]:
+        """Find the earliest slot where a service of the given duration fits"""
+        # Candidate employees: the requested one, or every active one in the shop
+        if employee_id:
+            employee = self.get_employee(employee_id)
+            employees = [employee] if employee else []
+        elif shop_id:
+            employees = [e for e in self.shop_reference(shop_id).employees.values()
+                         if e.is_active]
+        else:
+            return None
+        
+        if not employees:
+            return None
+        
         # Start from today
-        current_date = date.today()
-        max_days_ahead = 30
+        first_date = date.today()
+        last_date = first_date + timedelta(days=max_days_ahead - 1)
+        self.schedule_overlay.load([e.id for e in employees], first_date, last_date)
+        
+        # Stream the occupancy of all candidates over the horizon in date order
+        busy_rows = self.session.query(EmployeeDayOccupancy).filter(
+            EmployeeDayOccupancy.employee_id.in_([e.id for e in employees]),
+            EmployeeDayOccupancy.date >= first_date,
+            EmployeeDayOccupancy.date <= last_date
+        ).order_by(EmployeeDayOccupancy.date).yield_per(500)
+        busy_days = groupby(busy_rows, key=lambda row: row.date)
+        next_busy_day = next(busy_days, None)
         
         for days_ahead in range(max_days_ahead):
-            check_date = current_date + timedelta(days=days_ahead)
+            check_date = first_date + timedelta(days=days_ahead)
             
-            if employee_id:
-                slots = self.get_employee_availability(employee_id, check_date)
-                if slots:
-                    return {
-                        'employee_id': employee_id,
-                        'date': check_date,
-                        'time': slots[0]['start_time']
-                    }
-            elif shop_id:
-                # Check all employees in the shop
-                employees = self.session.query(Employee).filter(
-                    Employee.shop_id == shop_id,
-                    Employee.is_active == True
-                ).all()
-                
-                for emp in employees:
-                    slots = self.get_employee_availability(emp.id, check_date)
-                    if slots:
-                        return {
-                            'employee_id': emp.id,
-                            'employee_name': emp.name,
-                            'date': check_date,
-                            'time': slots[0]['start_time']
-                        }
+            # Pull this day's occupancy off the stream, if it has any
+            busy_by_employee = {}
+            if next_busy_day and next_busy_day[0] == check_date:
+                for row in next_busy_day[1]:
+                    busy_by_employee[row.employee_id] = intervals_of(row)
+                next_busy_day = next(busy_days, None)
+            
+            # Each barber's earliest fit of the day; ties go to the lower employee id
+            candidates = []
+            for order, employee in enumerate(employees):
+                table = self._day_availability(employee, check_date,
+                                               busy_by_employee.get(employee.id, []))
+                start = table.earliest(duration_minutes) if table else None
+                if start is not None:
+                    candidates.append((start, order))
+            
+            if candidates:
+                start, order = min(candidates)
+                employee = employees[order]
+                return {
+                    'employee_id': employee.id,
+                    'employee_name': employee.name,
+                    'date': check_date,
+                    'time': from_minutes(start)
+                }
         
         return None
 
 
+class AsyncBookingManager:
+    """BookingManager for an AsyncSession.
+    
+    Every BookingManager method is available as a coroutine. It runs on the session's
+    connection through run_sync, so the event loop is free while the database works.
+    """
+    
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.manager = BookingManager(session.sync_session)
+        # Retry backoff must not block the event loop
+        self.manager.sleep = lambda seconds: await_only(asyncio.sleep(seconds))
+    
+    async def run(self, func: Callable[[BookingManager], Any]) -> Any:
+        """Run synchronous code, such as lazy-loading response formatting, with the manager"""
+        return await self.session.run_sync(lambda _: func(self.manager))
+    
+    def __getattr__(self, name: str):
+        method = getattr(self.manager, name)
+        if name.startswith('_') or not callable(method):
+            raise AttributeError(name)
+        
+        async def call(*args, **kwargs):
+            return await self.run(lambda manager: method(*args, **kwargs))
+        return call
+
+
 # Example usage and testing
 if __name__ == "__main__":
     from models import init_db, get_session
@@ -0,0 +1,387 @@
+"""
+Caches
+LRU caches shared by all requests handled by this worker process, and a read-through
+cache whose backend can be shared by every worker
+"""
+
+import json
+import os
+import threading
+import time as timer
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import date
+from fnmatch import fnmatchcase
+from typing import Any, Callable, Dict, Hashable, Iterator, Optional, Tuple
+
+
+# Default for LRUCache.get that tells a miss apart from a cached None
+NOT_CACHED = object()
+
+
+class LRUCache:
+    """Thread-safe least-recently-used cache with a size limit and hit/miss counters.
+
+    With a ttl (in seconds), an entry older than that counts as a miss and is dropped,
+    which bounds how long a change made by another worker process can go unseen.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        # Key -> monotonic expiry time, kept only with a ttl
+        self._expires: Dict[Hashable, float] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get a cached value and mark it as recently used"""
+        with self._lock:
+            if key in self._data:
+                if self.ttl is not None and self._expires[key] <= timer.monotonic():
+                    self._remove(key)
+                else:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any):
+        """Store a value, evicting the least recently used entry when full"""
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if self.ttl is not None:
+                self._expires[key] = timer.monotonic() + self.ttl
+            self._on_set(key)
+            while len(self._data) > self.maxsize:
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def pop(self, key: Hashable):
+        """Remove a single entry if present"""
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def clear(self):
+        """Remove every entry and reset the counters"""
+        with self._lock:
+            self._data.clear()
+            self._expires.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def _remove(self, key: Hashable):
+        """Drop a present entry; called with the lock held"""
+        del self._data[key]
+        self._expires.pop(key, None)
+        self._on_remove(key)
+
+    def _on_set(self, key: Hashable):
+        """Hook for subclasses that index their keys; called with the lock held"""
+
+    def _on_remove(self, key: Hashable):
+        """Hook for subclasses that index their keys; called with the lock held"""
+
+    def stats(self) -> Dict:
+        """Get size and hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class AvailabilityCache(LRUCache):
+    """Free-gap tables (DayAvailability, None on a day off) keyed by (employee_id, date).
+
+    One table answers every service length of its day. The worker that books or
+    changes a day evicts it at once; other workers only see the change once their
+    entry for the day expires.
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: Optional[float] = None):
+        super().__init__(maxsize, ttl)
+
+    def invalidate(self, employee_id: int, day: date):
+        """Evict the table of one employee-day"""
+        self.pop((employee_id, day))
+
+
+class ReferenceCache(LRUCache):
+    """Shop reference snapshots keyed by shop id, with the shop of every employee and service seen.
+
+    Writers in this process invalidate a shop's snapshot; employees and services added
+    through other workers are listed once the snapshot expires.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: Optional[float] = None):
+        super().__init__(maxsize, ttl)
+        # ('employees' | 'services', id) -> shop id; ids never move between shops
+        self._owners: Dict[Tuple[str, int], int] = {}
+
+    def _on_set(self, shop_id: int):
+        reference = self._data[shop_id]
+        for kind in ('employees', 'services'):
+            for item_id in getattr(reference, kind):
+                self._owners[(kind, item_id)] = shop_id
+
+    def shop_of(self, kind: str, item_id: int) -> Optional[int]:
+        """Get the shop an employee or service belongs to, if known"""
+        with self._lock:
+            return self._owners.get((kind, item_id))
+
+    def invalidate(self, shop_id: int):
+        """Drop a shop's snapshot after its employees or services changed"""
+        self.pop(shop_id)
+
+    def clear(self):
+        with self._lock:
+            self._owners.clear()
+        super().clear()
+
+
+class CacheBackend(ABC):
+    """Where a ReadThroughCache keeps its entries; get returns None for a missing or expired key"""
+
+    @abstractmethod
+    def get(self, key: str) -> Any:
+        """Get a live entry, or None"""
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: float):
+        """Store an entry for ttl seconds"""
+
+    @abstractmethod
+    def delete(self, key: str):
+        """Drop an entry, if there is one"""
+
+    @abstractmethod
+    def clear(self):
+        """Drop every entry"""
+
+
+class LocalBackend(CacheBackend):
+    """Entries held by this worker process alone, least recently used evicted first"""
+
+    def __init__(self, maxsize: int = 1024):
+        self._entries = LRUCache(maxsize)
+
+    def get(self, key: str) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= timer.monotonic():
+            self._entries.pop(key)
+            return None
+        return value
+
+    def set(self, key: str, value: Any, ttl: float):
+        self._entries.set(key, (timer.monotonic() + ttl, value))
+
+    def delete(self, key: str):
+        self._entries.pop(key)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class SharedBackend(CacheBackend):
+    """Entries in a store every worker reads, such as Redis; values travel as JSON.
+
+    The client needs get, set(name, value, px=milliseconds), delete and scan_iter(match=...)
+    as redis.Redis has them; MemoryStore stands in for it where no server runs.
+    """
+
+    def __init__(self, client, prefix: str = "barber:"):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key: str) -> Any:
+        raw = self.client.get(self.prefix + key)
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: float):
+        self.client.set(self.prefix + key, json.dumps(value), px=max(1, int(ttl * 1000)))
+
+    def delete(self, key: str):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        for name in list(self.client.scan_iter(match=self.prefix + "*")):
+            self.client.delete(name)
+
+
+class MemoryStore:
+    """The few Redis commands SharedBackend uses, kept in memory; several backends may share one"""
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[Optional[float], str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> Optional[str]:
+        with self._lock:
+            entry = self._data.get(name)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= timer.monotonic():
+                del self._data[name]
+                return None
+            return value
+
+    def set(self, name: str, value: str, px: Optional[int] = None):
+        with self._lock:
+            self._data[name] = (timer.monotonic() + px / 1000 if px else None, value)
+
+    def delete(self, *names: str):
+        with self._lock:
+            for name in names:
+                self._data.pop(name, None)
+
+    def scan_iter(self, match: str = "*") -> Iterator[str]:
+        with self._lock:
+            names = [name for name in self._data if fnmatchcase(name, match)]
+        return iter(names)
+
+
+class ReadThroughCache:
+    """Values loaded on a miss and kept for a TTL in a pluggable backend; writers delete their keys.
+
+    A value may be stored with the version of the data it was read at. A read that
+    already knows a newer version treats an older value as a miss, whichever worker
+    cached it, so a response is never older than the version it reports.
+
+    A paged listing caches each page on its own, so neither a miss nor a hit handles
+    more than one page; see get_page.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _cached(self, key: str, version: Optional[int]) -> Any:
+        """The value stored under key, or None when missing or older than version"""
+        entry = self.backend.get(key)
+        if entry is None:
+            return None
+        cached_version, value = entry
+        if version is None or (cached_version is not None and cached_version >= version):
+            return value
+        return None
+
+    def get(self, key: str, load: Callable[[], Any], version: Optional[int] = None) -> Any:
+        """Get a cached value, calling load() and storing its result on a miss (None is not stored)"""
+        value = self._cached(key, version)
+        if value is not None:
+            with self._lock:
+                self.hits += 1
+            return value
+        with self._lock:
+            self.misses += 1
+        value = load()
+        if value is not None:
+            self.backend.set(key, [version, value], self.ttl)
+        return value
+
+    def get_page(self, key: str, page: str, load: Callable[[], Any],
+                 version: Optional[int] = None) -> Any:
+        """Get one page of the listing cached under key, calling load() for that page alone on a miss.
+
+        key holds a generation token and the pages are stored under it, so invalidate(key),
+        or a read that knows a newer version, retires every page of the listing at once.
+        """
+        generation = self._cached(key, version)
+        if generation is None:
+            generation = uuid.uuid4().hex
+            self.backend.set(key, [version, generation], self.ttl)
+        return self.get(f"{key}/{generation}/{page}", load)
+
+    def invalidate(self, *keys: str):
+        """Drop entries after the data behind them changed"""
+        for key in keys:
+            self.backend.delete(key)
+
+    def clear(self):
+        """Remove every entry and reset the counters"""
+        self.backend.clear()
+        with self._lock:
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict:
+        """Get the backend, TTL and hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': type(self.backend).__name__,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+def backend_from_url(url: Optional[str]) -> CacheBackend:
+    """A LocalBackend without a URL, else a SharedBackend on the Redis server it names"""
+    if not url:
+        return LocalBackend(maxsize=int(os.environ.get("READ_CACHE_SIZE", 1024)))
+    import redis  # Only needed for a shared store
+    return SharedBackend(redis.Redis.from_url(url))
+
+
+# Read cache keys: the shop list, and per shop its details and listings
+SHOPS_KEY = "shops"
+SHOP_LISTINGS = ('shop', 'employees', 'services')
+
+
+def shop_key(listing: str, shop_id: int) -> str:
+    return f"{listing}:{shop_id}"
+
+
+def page_key(cursor: Optional[str], limit: int) -> str:
+    """Name a page of a listing within its generation by where it starts and its size"""
+    return f"{cursor or ''}:{limit}"
+
+
+# Shared by every BookingManager in this process; bookings made through other
+# workers show up once an entry is AVAILABILITY_CACHE_TTL seconds old
+availability_cache = AvailabilityCache(
+    maxsize=int(os.environ.get("AVAILABILITY_CACHE_SIZE", 4096)),
+    ttl=float(os.environ.get("AVAILABILITY_CACHE_TTL", 30))
+)
+
+# Canonical phone number -> customer id; only committed customers are added
+customer_cache = LRUCache(
+    maxsize=int(os.environ.get("CUSTOMER_CACHE_SIZE", 10000))
+)
+
+# Shop id -> ShopReference of its employees and services, reloaded after REFERENCE_CACHE_TTL seconds
+reference_cache = ReferenceCache(
+    maxsize=int(os.environ.get("REFERENCE_CACHE_SIZE", 256)),
+    ttl=float(os.environ.get("REFERENCE_CACHE_TTL", 60))
+)
+
+# Shop, employee and service listings of the read endpoints; CACHE_URL (redis://...)
+# shares them between worker processes
+read_cache = ReadThroughCache(
+    backend_from_url(os.environ.get("CACHE_URL")),
+    ttl=float(os.environ.get("READ_CACHE_TTL", 300))
+)
@@ -0,0 +1,988 @@
+"""
+Database Checks - Guards the hot paths against full table scans
+Run: python db_checks.py   (exits with status 1 when a check fails)
+"""
+
+import asyncio
+import csv
+import io
+import json
+import os
+import sys
+import tempfile
+import time as timer
+from copy import deepcopy
+from datetime import date, time, timedelta
+from typing import List, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError
+
+# Point the API at a scratch database before it is imported
+_scratch_dir = tempfile.mkdtemp(prefix="barber_checks_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_scratch_dir, 'checks.db')}"
+
+import main
+from fastapi.testclient import TestClient
+from models import (
+    Appointment, Base, Customer, Employee, EmployeeDayOccupancy, Service, ShopCustomer, ShopStats,
+    get_async_session, get_session, init_async_db
+)
+from availability import from_minutes
+from booking_manager import BookingManager
+from occupancy import busy_for_day
+from recurrence import occurrences
+from cache import (
+    AvailabilityCache, CacheBackend, MemoryStore, ReadThroughCache, ReferenceCache, SharedBackend
+)
+from exporter import stream_appointments
+from importer import Checkpoint, import_records, read_records
+from instrumentation import track
+from maintenance import normalize_phones
+from shop_stats import adjust_scheduled
+
+# Listing every shop reads the whole table by design
+ALLOWED_SCANS = {"shops"}
+
+# Everything a repeat customer's booking may run once reference data (schedule overrides
+# included) is cached: the conflict check, the two writes, the shop counters, the day
+# rollup and the known-customer lookup
+BOOKING_STATEMENTS = [
+    ("SELECT", "employee_day_occupancy"),
+    ("INSERT", "appointments"),
+    ("UPDATE", "employee_day_occupancy"),
+    ("UPDATE", "shop_stats"),
+    ("UPDATE", "shop_day_stats"),
+    ("SELECT", "shop_customers"),
+]
+
+# Statements the shop appointment listing may run, however many rows it returns:
+# the shop version lookup for its ETag and the listing itself
+LISTING_STATEMENTS = 2
+
+# Statements a read answered with 304 Not Modified may run: the shop version lookup
+NOT_MODIFIED_STATEMENTS = 1
+
+# Statements a warm read of cached reference data may run: none for the shop list, the
+# version lookup per shop, and for shop details also the live scheduled appointment count
+CACHED_READ_STATEMENTS = {"": 0, "{shop_id}": 2, "{shop_id}/employees": 1, "{shop_id}/services": 1}
+
+# Statements the dashboard may run, however long the shop's history:
+# the shop, its counters and the week's day rows
+DASHBOARD_STATEMENTS = 3
+
+
+class StatementRecorder:
+    """Collects every statement an engine executes while active"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements: List[Tuple[str, tuple]] = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append((statement, parameters))
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._record)
+
+    def selects(self) -> List[Tuple[str, tuple]]:
+        return [(s, p) for s, p in self.statements if s.lstrip().upper().startswith("SELECT")]
+
+
+def explain(engine, statement: str, parameters) -> List[str]:
+    """Get the EXPLAIN QUERY PLAN detail lines of a statement"""
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters or ())
+        return [row[3] for row in cursor.fetchall()]
+    finally:
+        connection.close()
+
+
+def full_scans(plan: List[str]) -> List[str]:
+    """Pick the plan lines that read a whole table or index"""
+    scans = []
+    for detail in plan:
+        words = detail.split()
+        if len(words) < 2 or words[0] != "SCAN":
+            continue
+        # Constant rows, subqueries and their aliases are not table reads
+        table = words[1]
+        if table not in Base.metadata.tables or table in ALLOWED_SCANS:
+            continue
+        scans.append(detail)
+    return scans
+
+
+def statement_target(statement: str) -> Tuple[str, str]:
+    """Get the verb and main table of a statement, e.g. ("SELECT", "appointments")"""
+    words = statement.replace("(", " ").split()
+    verb = words[0].upper()
+    if verb == "SELECT":
+        return verb, words[[w.upper() for w in words].index("FROM") + 1]
+    if verb == "INSERT":
+        return verb, words[2]
+    return verb, words[1]
+
+
+def seed(session) -> dict:
+    """Create a shop with barbers, services and a few days of bookings"""
+    booking_manager = BookingManager(session)
+    shop = booking_manager.create_shop("Plan Check Cuts", "Owner", "09:00", "20:00")
+    employees = [
+        booking_manager.add_employee(shop.id, f"Barber {i}", f"555-01{i:02d}",
+                                     "Mon,Tue,Wed,Thu,Fri,Sat,Sun", "09:00", "18:00")
+        for i in range(3)
+    ]
+    service = booking_manager.add_service(shop.id, "Haircut", 30, 25.0)
+
+    today = date.today()
+    for day in range(5):
+        for i, employee in enumerate(employees):
+            booking_manager.book_appointment(
+                employee_id=employee.id,
+                customer_phone=f"555-2{day}{i:02d}",
+                customer_name=f"Customer {day}-{i}",
+                appointment_date=today + timedelta(days=day),
+                start_time="10:00",
+                service_id=service.id
+            )
+    return {'shop_id': shop.id, 'employee_id': employees[0].id, 'service_id': service.id}
+
+
+def hot_paths(ids: dict) -> List[Tuple[str, str, dict]]:
+    """Requests that must be served from indexes"""
+    today = date.today()
+    tomorrow = today + timedelta(days=1)
+    shop_id, employee_id, service_id = ids['shop_id'], ids['employee_id'], ids['service_id']
+    booking = {
+        "employee_id": employee_id,
+        "customer_name": "Plan Check",
+        "customer_phone": "555-9999",
+        "appointment_date": str(tomorrow),
+        "start_time": "15:00",
+        "service_id": service_id
+    }
+    return [
+        ("GET", f"/api/shops/{shop_id}", {}),
+        ("GET", f"/api/shops/{shop_id}/employees", {}),
+        ("GET", f"/api/shops/{shop_id}/services", {}),
+        ("GET", f"/api/shops/{shop_id}/appointments", {}),
+        ("GET", f"/api/shops/{shop_id}/appointments", {"params": {"date": str(today)}}),
+        ("GET", f"/api/shops/{shop_id}/availability", {"params": {"date": str(today)}}),
+        ("GET", f"/api/shops/{shop_id}/appointments/export",
+         {"params": {"from": str(today), "to": str(today + timedelta(days=30)), "format": "ndjson"}}),
+        ("GET", f"/api/employees/{employee_id}/availability",
+         {"params": {"date": str(tomorrow), "service_id": service_id}}),
+        ("GET", f"/api/employees/{employee_id}/availability",
+         {"params": {"from": str(today), "to": str(today + timedelta(days=30))}}),
+        ("POST", "/api/bookings", {"json": booking}),
+        ("POST", "/api/bookings/bulk", {"json": {"bookings": [
+            dict(booking, start_time="16:00"),
+            dict(booking, start_time="16:00", customer_phone="555-9998")
+        ]}}),
+        ("DELETE", "/api/bookings/1", {}),
+        ("POST", "/api/series", {"json": dict(booking, start_time="17:00", start_date=str(tomorrow),
+                                              frequency="weekly", count=8)}),
+        ("PATCH", "/api/series/1", {"json": {"start_time": "17:15"}}),
+        ("DELETE", "/api/series/1", {}),
+        ("GET", f"/api/dashboard/{shop_id}", {}),
+    ]
+
+
+def check_query_plans(client: TestClient, ids: dict) -> List[str]:
+    """Fail any hot-path query whose plan falls back to a full scan"""
+    failures = []
+    for method, path, kwargs in hot_paths(ids):
+        # Endpoints run their statements on the async engine's underlying engine
+        with StatementRecorder(main.async_engine.sync_engine) as recorder:
+            response = client.request(method, path, **kwargs)
+        if response.status_code >= 400:
+            failures.append(f"{method} {path}: HTTP {response.status_code}")
+            continue
+        for statement, parameters in recorder.selects():
+            for scan in full_scans(explain(main.engine, statement, parameters)):
+                failures.append(f"{method} {path}: {scan}\n    {' '.join(statement.split())}")
+
+    # Code paths without an endpoint of their own
+    session = get_session(main.engine)
+    try:
+        with StatementRecorder(main.engine) as recorder:
+            BookingManager(session).get_next_available_slot(shop_id=ids['shop_id'],
+                                                            duration_minutes=60)
+        for statement, parameters in recorder.selects():
+            for scan in full_scans(explain(main.engine, statement, parameters)):
+                failures.append(f"get_next_available_slot: {scan}\n    {' '.join(statement.split())}")
+    finally:
+        session.close()
+    return failures
+
+
+def check_booking_statements(client: TestClient, ids: dict) -> List[str]:
+    """Fail when a warm booking touches reference tables or issues extra statements"""
+    session = get_session(main.engine)
+    try:
+        booking = {
+            "employee_id": ids['employee_id'],
+            "customer_phone": "555-4242",
+            "customer_name": "Regular",
+            "appointment_date": date.today() + timedelta(days=2),
+            "service_id": ids['service_id']
+        }
+        # An earlier request has already cached the shop and the customer
+        BookingManager(session).book_appointment(start_time="12:00", **booking)
+        with StatementRecorder(main.engine) as recorder:
+            BookingManager(session).book_appointment(start_time="13:00", **booking)
+    finally:
+        session.close()
+
+    issued = [statement_target(statement) for statement, _ in recorder.statements]
+    if issued == BOOKING_STATEMENTS:
+        return []
+    return [f"book_appointment issued {len(issued)} statements, expected {len(BOOKING_STATEMENTS)}"] + \
+        [f"  {verb} {table}" for verb, table in issued]
+
+
+def check_listing_statements(client: TestClient, ids: dict) -> List[str]:
+    """Fail when the shop appointment listing runs more queries as the shop gets busier"""
+    path = f"/api/shops/{ids['shop_id']}/appointments"
+    failures = []
+    for extra in (0, 30):
+        if extra:
+            # New customers and a mix of with and without a service, so nothing is shared
+            session = get_session(main.engine)
+            try:
+                employee_ids = list(BookingManager(session).shop_reference(ids['shop_id']).employees)
+                BookingManager(session).book_many([{
+                    "employee_id": employee_ids[i % len(employee_ids)],
+                    "customer_phone": f"555-31{i:02d}",
+                    "customer_name": f"Listing {i}",
+                    "appointment_date": date.today() + timedelta(days=3),
+                    "start_time": f"{9 + i // len(employee_ids):02d}:30",
+                    "service_id": ids['service_id'] if i % 2 else None
+                } for i in range(extra)])
+            finally:
+                session.close()
+
+        with StatementRecorder(main.async_engine.sync_engine) as recorder:
+            response = client.get(path)
+        if response.status_code >= 400:
+            failures.append(f"GET {path}: HTTP {response.status_code}")
+        elif len(recorder.statements) != LISTING_STATEMENTS:
+            failures.append(f"GET {path} with {len(response.json())} appointments ran "
+                            f"{len(recorder.statements)} statements, expected {LISTING_STATEMENTS}")
+    return failures
+
+
+def check_listing_pages(client: TestClient, ids: dict) -> List[str]:
+    """Fail when paging through the shop's appointments loses rows or a page sorts or scans"""
+    path = f"/api/shops/{ids['shop_id']}/appointments"
+    everything = client.get(path, params={"limit": 500}).json()
+    pages, failures, cursor = [], [], None
+    while True:
+        params = {"limit": 7, "cursor": cursor} if cursor else {"limit": 7}
+        with StatementRecorder(main.async_engine.sync_engine) as recorder:
+            response = client.get(path, params=params)
+        if response.status_code >= 400:
+            return failures + [f"GET {path} page {len(pages) + 1}: HTTP {response.status_code}"]
+        pages.append(response.json())
+        for statement, parameters in recorder.selects():
+            plan = explain(main.engine, statement, parameters)
+            # A deep page must cost what the first one does: an index range, never a sort
+            failures += [f"GET {path} page {len(pages)}: {detail}" for detail in full_scans(plan) +
+                         [d for d in plan if d.startswith("USE TEMP B-TREE")]]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    if [a for page in pages for a in page] != everything:
+        failures.append(f"GET {path}: {len(pages)} pages do not add up to the {len(everything)} appointments")
+    return failures
+
+
+def check_conditional_gets(client: TestClient, ids: dict) -> List[str]:
+    """Fail when a current ETag does not short-circuit a read, or a stale one still does"""
+    shop_id = ids['shop_id']
+    paths = [f"/api/shops/{shop_id}", f"/api/shops/{shop_id}/employees",
+             f"/api/shops/{shop_id}/services", f"/api/shops/{shop_id}/appointments"]
+    failures = []
+    etags = {}
+    for path in paths:
+        etags[path] = client.get(path).headers.get("ETag")
+        if not etags[path]:
+            failures.append(f"GET {path}: no ETag")
+            continue
+        with StatementRecorder(main.async_engine.sync_engine) as recorder:
+            response = client.get(path, headers={"If-None-Match": etags[path]})
+        if response.status_code != 304 or response.content:
+            failures.append(f"GET {path} with its ETag: HTTP {response.status_code}, expected an empty 304")
+        elif len(recorder.statements) != NOT_MODIFIED_STATEMENTS:
+            failures.append(f"GET {path} with its ETag ran {len(recorder.statements)} statements, "
+                            f"expected {NOT_MODIFIED_STATEMENTS}")
+
+    # Any write to the shop makes every tag handed out before it stale
+    session = get_session(main.engine)
+    try:
+        BookingManager(session).add_service(shop_id, "Beard Trim", 15, 10.0)
+    finally:
+        session.close()
+    for path in paths:
+        if etags[path] and client.get(path, headers={"If-None-Match": etags[path]}).status_code != 200:
+            failures.append(f"GET {path}: still 304 after the shop changed")
+    return failures
+
+
+def check_read_cache(client: TestClient, ids: dict) -> List[str]:
+    """Fail when warm reference reads query the database, or a worker misses another's write"""
+    shop_id = ids['shop_id']
+    failures = []
+    for suffix, expected in CACHED_READ_STATEMENTS.items():
+        path = "/api/shops" + ("/" + suffix.format(shop_id=shop_id) if suffix else "")
+        client.get(path)
+        with StatementRecorder(main.async_engine.sync_engine) as recorder:
+            response = client.get(path)
+        if response.status_code >= 400:
+            failures.append(f"GET {path}: HTTP {response.status_code}")
+        elif len(recorder.statements) != expected:
+            failures.append(f"GET {path} from the cache ran {len(recorder.statements)} statements, "
+                            f"expected {expected}")
+
+    # Two workers sharing one store, as with CACHE_URL: each sees the other's writes at once
+    store = MemoryStore()
+    session = get_session(main.engine)
+    try:
+        workers = [BookingManager(session), BookingManager(session)]
+        for worker in workers:
+            worker.read_cache = ReadThroughCache(SharedBackend(store), ttl=300)
+        shops = len(workers[0].list_shops()[0])
+        services = len(workers[0].list_services(shop_id)[0])
+        workers[1].create_shop("Coherent Cuts", "Owner", "09:00", "20:00")
+        workers[1].add_service(shop_id, "Hot Towel", 10, 5.0)
+        if len(workers[0].list_shops()[0]) != shops + 1:
+            failures.append("a shop created by one worker is missing from another's shop list")
+        if len(workers[0].list_services(shop_id)[0]) != services + 1:
+            failures.append("a service added by one worker is missing from another's listing")
+    finally:
+        session.close()
+
+    # A backend missing part of the interface fails where it is built, not on first use
+    class PartialBackend(CacheBackend):
+        def get(self, key): return None
+        def set(self, key, value, ttl): pass
+        def delete(self, key): pass
+    try:
+        PartialBackend()
+        failures.append("a cache backend without clear() could be constructed")
+    except TypeError:
+        pass
+    return failures
+
+
+def walk_pages(client: TestClient, path: str, limit: int) -> Tuple[List[dict], List[int]]:
+    """Follow a listing's cursors; return its rows and the statements each page ran"""
+    rows, statements, cursor = [], [], None
+    while True:
+        params = {"limit": limit, "cursor": cursor} if cursor else {"limit": limit}
+        with StatementRecorder(main.async_engine.sync_engine) as recorder:
+            response = client.get(path, params=params)
+        rows += response.json()
+        statements.append(len(recorder.statements))
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return rows, statements
+
+
+def check_cached_pages(client: TestClient, ids: dict) -> List[str]:
+    """Fail when a cached listing loads more than the page asked for, or a write leaves pages stale"""
+    shop_id = ids['shop_id']
+    failures = []
+    for suffix in ("", "{shop_id}/employees", "{shop_id}/services"):
+        path = "/api/shops" + ("/" + suffix.format(shop_id=shop_id) if suffix else "")
+        everything = client.get(path, params={"limit": 500}).json()
+        # A miss runs one keyset query for its own page; a hit runs none
+        for walk, extra in (("cold", 1), ("warm", 0)):
+            rows, statements = walk_pages(client, path, 1)
+            expected = CACHED_READ_STATEMENTS[suffix] + extra
+            if rows != everything:
+                failures.append(f"GET {path}: {walk} pages do not add up to the {len(everything)} rows")
+            if any(count != expected for count in statements):
+                failures.append(f"GET {path}: {walk} pages ran {statements} statements, "
+                                f"expected {expected} each")
+
+    # A write retires every cached page of the listing, not just the first
+    path = f"/api/shops/{shop_id}/services"
+    session = get_session(main.engine)
+    try:
+        service_id = BookingManager(session).add_service(shop_id, "Neck Shave", 10, 6.0).id
+    finally:
+        session.close()
+    rows, _ = walk_pages(client, path, 1)
+    if not rows or rows[-1]['id'] != service_id:
+        failures.append(f"GET {path}: a service added after the pages were cached is missing")
+    return failures
+
+
+def check_availability_expiry(client: TestClient, ids: dict) -> List[str]:
+    """Fail when a slot booked through another worker stays advertised past the cache TTL"""
+    employee_id = ids['employee_id']
+    day = date.today() + timedelta(days=6)
+    # Two workers, each with its own availability cache and a new session per request
+    caches = [AvailabilityCache(ttl=0.2), AvailabilityCache(ttl=0.2)]
+
+    def free_starts(worker: int) -> set:
+        session = get_session(main.engine)
+        try:
+            manager = BookingManager(session)
+            manager.availability_cache = caches[worker]
+            return {slot['start_time'] for slot in manager.get_employee_availability(employee_id, day)}
+        finally:
+            session.close()
+
+    if time(11, 0) not in free_starts(0):
+        return ["11:00 is not free to begin with"]
+    session = get_session(main.engine)
+    try:
+        booking_manager = BookingManager(session)
+        booking_manager.availability_cache = caches[1]
+        booking_manager.book_appointment(employee_id, "555-5151", "Other Worker", day, "11:00")
+    finally:
+        session.close()
+
+    failures = []
+    if time(11, 0) in free_starts(1):
+        failures.append("the booking worker still advertises the slot it just booked")
+    timer.sleep(0.25)
+    if time(11, 0) in free_starts(0):
+        failures.append("another worker still advertises a booked slot after its cache TTL")
+    return failures
+
+
+def check_dashboard_statements(client: TestClient, ids: dict) -> List[str]:
+    """Fail when the dashboard reads more as the shop's history grows"""
+    path = f"/api/dashboard/{ids['shop_id']}"
+    failures = []
+    for extra in (0, 40):
+        if extra:
+            # Past and future days, each with new customers
+            session = get_session(main.engine)
+            try:
+                BookingManager(session).book_many([{
+                    "employee_id": ids['employee_id'],
+                    "customer_phone": f"555-41{i:02d}",
+                    "customer_name": f"History {i}",
+                    "appointment_date": date.today() + timedelta(days=i - extra // 2),
+                    "start_time": "09:00",
+                    "service_id": ids['service_id']
+                } for i in range(extra)])
+            finally:
+                session.close()
+
+        with StatementRecorder(main.async_engine.sync_engine) as recorder:
+            response = client.get(path)
+        if response.status_code >= 400:
+            failures.append(f"GET {path}: HTTP {response.status_code}")
+        elif len(recorder.statements) != DASHBOARD_STATEMENTS:
+            failures.append(f"GET {path} ran {len(recorder.statements)} statements, "
+                            f"expected {DASHBOARD_STATEMENTS}")
+        # Counting appointments is what the rollups are there to avoid
+        failures += [f"GET {path}: {' '.join(statement.split())}"
+                     for statement, _ in recorder.statements
+                     if statement_target(statement)[1] == "appointments"]
+    return failures
+
+
+def check_imported_shops(client: TestClient, ids: dict) -> List[str]:
+    """Fail when an imported shop lacks the counters that give it an ETag and a cheap dashboard"""
+    upload = "name,owner_name\r\nImported Cuts,Owner\r\nImported Fades,Owner\r\n"
+    response = client.post("/api/import/shops", files={"file": ("shops.csv", upload, "text/csv")})
+    if response.status_code >= 400 or response.json().get('imported') != 2:
+        return [f"POST /api/import/shops: HTTP {response.status_code} {response.text}"]
+
+    failures = []
+    shops = client.get("/api/shops", params={"limit": 500}).json()
+    for shop in shops[-2:]:
+        if not client.get(f"/api/shops/{shop['id']}").headers.get("ETag"):
+            failures.append(f"imported shop {shop['id']} has no ETag")
+        with StatementRecorder(main.async_engine.sync_engine) as recorder:
+            client.get(f"/api/dashboard/{shop['id']}")
+        if len(recorder.statements) != DASHBOARD_STATEMENTS:
+            failures.append(f"dashboard of imported shop {shop['id']} ran {len(recorder.statements)} "
+                            f"statements, expected {DASHBOARD_STATEMENTS}")
+    return failures
+
+
+def check_recurring_series(client: TestClient, ids: dict) -> List[str]:
+    """Fail when a series books, moves or cancels the wrong occurrences, or loses track of them"""
+    failures = []
+    # The 31st recurs only in months that have one
+    monthly = list(occurrences(date(2025, 1, 31), 'monthly', count=3))
+    if monthly != [date(2025, 1, 31), date(2025, 3, 31), date(2025, 5, 31)]:
+        failures.append(f"monthly from Jan 31 gave {monthly}")
+
+    employee_id = ids['employee_id']
+    dates = [date.today() + timedelta(days=60, weeks=week) for week in range(4)]
+    response = client.post("/api/series", json={
+        "employee_id": employee_id,
+        "customer_name": "Series Regular",
+        "customer_phone": "555-6161",
+        "start_date": str(dates[0]),
+        "start_time": "12:00",
+        "frequency": "weekly",
+        "count": 4,
+        "service_id": ids['service_id']
+    })
+    if response.status_code >= 400:
+        return failures + [f"POST /api/series: HTTP {response.status_code}"]
+    series_id = response.json()['id']
+    path = f"/api/series/{series_id}"
+
+    def expect(step: str, starts: dict):
+        """Compare the series' scheduled occurrences, and the employee's occupancy, with {date: start}"""
+        session = get_session(main.engine)
+        try:
+            scheduled = dict(session.query(Appointment.appointment_date, Appointment.start_time).filter(
+                Appointment.series_id == series_id,
+                Appointment.status == 'scheduled'
+            ))
+            occupied = {day: from_minutes(start) for day in dates
+                        for start, _ in busy_for_day(session, employee_id, day)}
+        finally:
+            session.close()
+        if scheduled != starts:
+            failures.append(f"after {step}: scheduled {scheduled}, expected {starts}")
+        if occupied != starts:
+            failures.append(f"after {step}: occupancy holds {occupied}, expected {starts}")
+
+    expect("booking", {day: time(12, 0) for day in dates})
+
+    cancelled = client.delete(path, params={"from": str(dates[2])}).json().get('cancelled')
+    if cancelled != 2:
+        failures.append(f"cancelling from the third date cancelled {cancelled}, expected 2")
+    expect("cancelling from the third date", {day: time(12, 0) for day in dates[:2]})
+
+    # A day without an occupancy row, as in a database whose rows were never built
+    session = get_session(main.engine)
+    try:
+        session.query(EmployeeDayOccupancy).filter_by(employee_id=employee_id, date=dates[0]).delete()
+        session.commit()
+    finally:
+        session.close()
+    moved = client.patch(path, json={"start_time": "14:00", "from_date": str(dates[0])})
+    if moved.status_code >= 400:
+        failures.append(f"PATCH {path}: HTTP {moved.status_code}")
+    expect("rescheduling", {day: time(14, 0) for day in dates[:2]})
+
+    client.delete(path, params={"from": str(dates[0])})
+    expect("cancelling the rest", {})
+    if client.patch(path, json={"start_time": "15:00"}).status_code != 400:
+        failures.append(f"PATCH {path}: a cancelled series was rescheduled")
+    return failures
+
+
+def check_reference_refresh(client: TestClient, ids: dict) -> List[str]:
+    """Fail when a barber added by an import or by another worker never shows up shop-wide"""
+    shop_id = ids['shop_id']
+    day = date.today() + timedelta(days=7)
+    failures = []
+
+    def barbers(response) -> set:
+        return {employee['name'] for employee in response['employees']}
+
+    path = f"/api/shops/{shop_id}/availability"
+    client.get(path, params={"date": str(day)})
+    upload = "name,phone\r\nImported Barber,555-7171\r\n"
+    client.post("/api/import/employees", params={"shop_id": shop_id},
+                files={"file": ("employees.csv", upload, "text/csv")})
+    if "Imported Barber" not in barbers(client.get(path, params={"date": str(day)}).json()):
+        failures.append(f"GET {path}: an imported barber is missing")
+
+    # Another worker, with its own snapshot of the shop
+    cache = ReferenceCache(ttl=0.2)
+
+    def worker_barbers() -> set:
+        session = get_session(main.engine)
+        try:
+            manager = BookingManager(session)
+            manager.reference_cache = cache
+            return barbers(manager.get_shop_availability(shop_id, day))
+        finally:
+            session.close()
+
+    worker_barbers()
+    session = get_session(main.engine)
+    try:
+        BookingManager(session).add_employee(shop_id, "Late Barber", "555-7272",
+                                             "Mon,Tue,Wed,Thu,Fri,Sat,Sun", "09:00", "18:00")
+    finally:
+        session.close()
+    timer.sleep(0.25)
+    if "Late Barber" not in worker_barbers():
+        failures.append("a barber added through another worker is missing after the cache TTL")
+    return failures
+
+
+def check_failed_statements(client: TestClient, ids: dict) -> List[str]:
+    """Fail when statements that raise leave timing state on the connection or are counted"""
+    failures = []
+    with main.engine.connect() as conn:
+        before = deepcopy(conn.info)
+        with track() as stats:
+            for _ in range(3):
+                try:
+                    conn.exec_driver_sql("SELECT * FROM no_such_table")
+                except DBAPIError:
+                    conn.rollback()
+            conn.exec_driver_sql("SELECT 1")
+        if conn.info != before:
+            failures.append(f"connection info grew from {before} to {dict(conn.info)}")
+    if stats.statements != 1:
+        failures.append(f"counted {stats.statements} statements, expected the 1 that ran")
+    return failures
+
+
+def check_availability_range(client: TestClient, ids: dict) -> List[str]:
+    """Fail when a range of days disagrees with asking day by day, or a bad range is accepted"""
+    path = f"/api/employees/{ids['employee_id']}/availability"
+    today = date.today()
+    failures = []
+    for params in ({}, {"service_id": ids['service_id']}):
+        response = client.get(path, params=dict(params, **{"from": str(today),
+                                                            "to": str(today + timedelta(days=13))}))
+        if response.status_code != 200:
+            failures.append(f"GET {path} for 14 days {params}: HTTP {response.status_code}")
+            continue
+        days = response.json()
+        if [entry["date"] for entry in days] != [str(today + timedelta(days=i)) for i in range(14)]:
+            failures.append(f"GET {path} for 14 days {params}: dates {[e['date'] for e in days]}")
+        for entry in days:
+            single = client.get(path, params=dict(params, date=entry["date"])).json()
+            if entry["slots"] != single:
+                failures.append(f"GET {path} {params}: range slots of {entry['date']} differ from that day's")
+
+    # The largest window is 62 days, counted inclusively; 'to' may not precede 'from'
+    for span, expected in ((61, 200), (62, 400), (-1, 400)):
+        response = client.get(path, params={"from": str(today), "to": str(today + timedelta(days=span))})
+        if response.status_code != expected:
+            failures.append(f"GET {path} from today to {span:+d} days: HTTP {response.status_code}, "
+                            f"expected {expected}")
+        elif expected == 200 and len(response.json()) != span + 1:
+            failures.append(f"GET {path} for {span + 1} days returned {len(response.json())} days")
+    return failures
+
+
+def check_shop_matrix(client: TestClient, ids: dict) -> List[str]:
+    """Fail when the shop matrix leaves out a barber or marks slots unlike their own availability"""
+    shop_id = ids['shop_id']
+    path = f"/api/shops/{shop_id}/availability"
+    barbers = {e["id"] for e in client.get(f"/api/shops/{shop_id}/employees", params={"limit": 500}).json()}
+    failures = []
+    # Tomorrow every seeded barber has a 10:00 booking
+    day = str(date.today() + timedelta(days=1))
+    for params in ({}, {"service_id": ids['service_id']}):
+        matrix = client.get(path, params=dict(params, date=day)).json()
+        listed = {e["id"] for e in matrix["employees"]}
+        if listed != barbers:
+            failures.append(f"GET {path} {params}: lists barbers {sorted(listed)}, expected {sorted(barbers)}")
+        for employee in matrix["employees"]:
+            if len(employee["availability"]) != len(matrix["slots"]):
+                failures.append(f"GET {path} {params}: barber {employee['id']} has "
+                                f"{len(employee['availability'])} cells for {len(matrix['slots'])} slots")
+                continue
+            free = {slot for slot, cell in zip(matrix["slots"], employee["availability"]) if cell == "1"}
+            own = client.get(f"/api/employees/{employee['id']}/availability",
+                             params=dict(params, date=day)).json()
+            expected = {slot["start_time"][:5] for slot in own}
+            if free != expected:
+                failures.append(f"GET {path} {params}: barber {employee['id']} free at {sorted(free)}, "
+                                f"their own availability says {sorted(expected)}")
+    return failures
+
+
+def check_availability_tables(client: TestClient, ids: dict) -> List[str]:
+    """Fail when another service length re-reads a day already worked out, or a booking leaves it stale"""
+    employee_id = ids['employee_id']
+    day = date.today() + timedelta(days=8)
+    cache = AvailabilityCache()
+    session = get_session(main.engine)
+    try:
+        long_service = BookingManager(session).add_service(ids['shop_id'], "Full Works", 60, 40.0).id
+    finally:
+        session.close()
+
+    def starts(service_id=None, cached: bool = True) -> Tuple[set, int]:
+        session = get_session(main.engine)
+        try:
+            manager = BookingManager(session)
+            manager.availability_cache = cache if cached else AvailabilityCache()
+            # Looks the service up before recording, as a warm worker would have it cached
+            manager.get_service(long_service)
+            with StatementRecorder(main.engine) as recorder:
+                slots = manager.get_employee_availability(employee_id, day, service_id)
+            return {slot['start_time'] for slot in slots}, len(recorder.statements)
+        finally:
+            session.close()
+
+    failures = []
+    starts()
+    long_starts, statements = starts(long_service)
+    if statements:
+        failures.append(f"a 60 minute service ran {statements} statements on a day already worked out")
+    if long_starts != starts(long_service, cached=False)[0]:
+        failures.append("60 minute slots from the cached day differ from a fresh computation")
+
+    session = get_session(main.engine)
+    try:
+        booking_manager = BookingManager(session)
+        booking_manager.availability_cache = cache
+        booking_manager.book_appointment(employee_id, "555-6161", "Table Check", day, "13:00")
+    finally:
+        session.close()
+    for service_id in (None, long_service):
+        if time(13, 0) in starts(service_id)[0]:
+            failures.append(f"a booked 13:00 is still offered for service {service_id}")
+    return failures
+
+
+def check_schedule_overrides(client: TestClient, ids: dict) -> List[str]:
+    """Fail when an override's hours or day off do not narrow slots and bookings"""
+    employee_id = ids['employee_id']
+    path = f"/api/employees/{employee_id}/availability"
+    narrowed, day_off = date.today() + timedelta(days=10), date.today() + timedelta(days=11)
+    failures = []
+
+    def starts(day: date) -> List[str]:
+        return [slot["start_time"][:5] for slot in client.get(path, params={"date": str(day)}).json()]
+
+    def book(day: date, start: str) -> int:
+        return client.post("/api/bookings", json={
+            "employee_id": employee_id, "customer_name": "Override Check", "customer_phone": "555-7171",
+            "appointment_date": str(day), "start_time": start, "service_id": ids['service_id']
+        }).status_code
+
+    # Read first, so the overrides must also evict what is already cached
+    if not starts(narrowed) or not starts(day_off):
+        return ["the barber has no slots to begin with"]
+    client.put(f"/api/employees/{employee_id}/schedule",
+               json={"date": str(narrowed), "start_time": "12:00", "end_time": "15:00"})
+    client.put(f"/api/employees/{employee_id}/schedule", json={"date": str(day_off), "is_available": False})
+
+    # 30 minute slots from 12:00, the last one ending at 15:00
+    expected = [f"{minute // 60:02d}:{minute % 60:02d}" for minute in range(12 * 60, 15 * 60, 30)]
+    if starts(narrowed) != expected:
+        failures.append(f"slots on a 12:00-15:00 override are {starts(narrowed)}, expected {expected}")
+    ranged = client.get(path, params={"from": str(narrowed), "to": str(day_off)}).json()
+    if [[slot["start_time"][:5] for slot in entry["slots"]] for entry in ranged] != [expected, []]:
+        failures.append("the range endpoint does not apply the overrides")
+    if starts(day_off):
+        failures.append(f"a day off still offers {starts(day_off)}")
+
+    for day, start, expected_status in ((narrowed, "10:00", 400), (narrowed, "14:45", 400),
+                                         (day_off, "12:00", 400), (narrowed, "12:00", 200)):
+        status_code = book(day, start)
+        if status_code != expected_status:
+            failures.append(f"booking {day} {start}: HTTP {status_code}, expected {expected_status}")
+    return failures
+
+
+def check_import_resume(client: TestClient, ids: dict) -> List[str]:
+    """Fail when an interrupted import resumes with duplicates, loses rows or skews the shop counters"""
+    session = get_session(main.engine)
+    try:
+        shop_id = BookingManager(session).create_shop("Resume Cuts", "Owner", "09:00", "18:00").id
+        # Line 4 has a bad time; line 6 is an inactive barber
+        lines = ["name,phone,start_time,is_active"] + [
+            f"Resumed {i},555-81{i:02d},{'9am' if i == 2 else '09:00'},{'false' if i == 4 else 'true'}"
+            for i in range(6)
+        ]
+        checkpoint = Checkpoint(os.path.join(_scratch_dir, "employees.csv.checkpoint"), "employees")
+
+        def interrupted():
+            # The import dies while reading the third record, after the first chunk committed
+            for number, record in enumerate(read_records(lines, "csv")):
+                if number == 2:
+                    raise RuntimeError("connection lost")
+                yield record
+
+        failures = []
+        try:
+            import_records(session, "employees", interrupted(), defaults={'shop_id': shop_id},
+                           chunk_size=2, checkpoint=checkpoint)
+            failures.append("the interrupted import did not stop")
+        except RuntimeError:
+            pass
+        if checkpoint.load() != 2:
+            failures.append(f"checkpoint after one chunk of 2 is at record {checkpoint.load()}")
+
+        report = import_records(session, "employees", read_records(lines, "csv"),
+                                defaults={'shop_id': shop_id}, chunk_size=2,
+                                resume_from=checkpoint.load(), checkpoint=checkpoint)
+        if (report['records'], report['imported'], report['failed']) != (6, 3, 1):
+            failures.append(f"resumed import reported {report['records']} records, {report['imported']} "
+                            f"imported, {report['failed']} failed; expected 6, 3, 1")
+        if report['errors'] != [{'line': 4, 'error': "start_time: expected HH:MM"}]:
+            failures.append(f"error report is {report['errors']}")
+
+        names = sorted(name for name, in session.query(Employee.name).filter(Employee.shop_id == shop_id))
+        expected = [f"Resumed {i}" for i in range(6) if i != 2]
+        if names != expected:
+            failures.append(f"imported barbers are {names}, expected {expected}")
+        stats = session.query(ShopStats).filter(ShopStats.shop_id == shop_id).one()
+        if stats.active_employees != 4:
+            failures.append(f"shop counters have {stats.active_employees} active barbers, expected 4")
+        checkpoint.clear()
+    finally:
+        session.close()
+    return failures
+
+
+def check_phone_merges(client: TestClient, ids: dict) -> List[str]:
+    """Fail when merging customers who share a phone leaves them counted twice or dangling"""
+    day = date.today() + timedelta(days=1)
+    session = get_session(main.engine)
+    try:
+        booking_manager = BookingManager(session)
+        shop_id = booking_manager.create_shop("Merge Cuts", "Owner", "09:00", "18:00").id
+        employee_id = booking_manager.add_employee(shop_id, "Merge Barber", "555-9180",
+                                                   "Mon,Tue,Wed,Thu,Fri,Sat,Sun", "09:00", "18:00").id
+        # Stored before phones were normalized: the first two are one person
+        customers = [Customer(name="Merge A", phone="555-919-0000"),
+                     Customer(name="Merge B", phone="(555) 919 0000"),
+                     Customer(name="Merge C", phone="5559190001")]
+        session.add_all(customers)
+        session.flush()
+        for hour, customer in enumerate(customers, start=10):
+            session.add(Appointment(shop_id=shop_id, employee_id=employee_id, customer_id=customer.id,
+                                    appointment_date=day, start_time=time(hour, 0),
+                                    end_time=time(hour, 30), status='scheduled'))
+            session.flush()
+            adjust_scheduled(session, {(shop_id, day): 1}, [(shop_id, customer.id)])
+        session.commit()
+
+        failures = []
+        total = client.get(f"/api/dashboard/{shop_id}").json()['stats']['total_customers']
+        if total != 3:
+            return [f"dashboard counts {total} customers before the merge, expected 3"]
+        normalize_phones(session)
+
+        total = client.get(f"/api/dashboard/{shop_id}").json()['stats']['total_customers']
+        if total != 2:
+            failures.append(f"dashboard counts {total} customers after the merge, expected 2")
+        members = session.query(ShopCustomer.customer_id, Customer.id).outerjoin(
+            Customer, Customer.id == ShopCustomer.customer_id
+        ).filter(ShopCustomer.shop_id == shop_id).all()
+        if len(members) != 2 or any(customer_id is None for _, customer_id in members):
+            failures.append(f"shop customers after the merge are {members}, expected 2 existing customers")
+        booked = {customer_id for customer_id, in session.query(Appointment.customer_id).filter(
+            Appointment.shop_id == shop_id)}
+        if len(booked) != 2:
+            failures.append(f"appointments belong to customers {sorted(booked)}, expected 2")
+    finally:
+        session.close()
+    return failures
+
+
+def check_export_output(client: TestClient, ids: dict) -> List[str]:
+    """Fail when a streamed export drops or repeats rows across batches, skips a status or
+    leaves out the service price of appointments booked without one"""
+    day = date.today() + timedelta(days=1)
+    session = get_session(main.engine)
+    try:
+        booking_manager = BookingManager(session)
+        shop_id = booking_manager.create_shop("Export Cuts", "Owner", "09:00", "18:00").id
+        employee_id = booking_manager.add_employee(shop_id, "Export Barber", "555-9190",
+                                                   "Mon,Tue,Wed,Thu,Fri,Sat,Sun", "09:00", "18:00").id
+        service = Service(shop_id=shop_id, name="Export Trim", duration_minutes=30, price=25.0)
+        customer = Customer(name="Export Customer", phone="5559191000")
+        session.add_all([service, customer])
+        session.flush()
+        # (status, price charged): no charged price falls back to the service's
+        booked = [('scheduled', None), ('completed', 30.0), ('cancelled', None),
+                  ('no-show', 20.0), ('scheduled', 35.0)]
+        for hour, (status, price) in enumerate(booked, start=10):
+            session.add(Appointment(shop_id=shop_id, employee_id=employee_id, customer_id=customer.id,
+                                    service_id=service.id, appointment_date=day,
+                                    start_time=time(hour, 0), end_time=time(hour, 30),
+                                    status=status, price=price))
+        session.commit()
+    finally:
+        session.close()
+    expected = [(status, 25.0 if price is None else price) for status, price in booked]
+
+    async def export(fmt: str) -> List[str]:
+        # An engine of this event loop's own; batches of two split the rows 2 + 2 + 1
+        engine = init_async_db(os.environ["DATABASE_URL"])
+        engine.echo = False
+        try:
+            async with get_async_session(engine) as export_session:
+                return [chunk async for chunk in stream_appointments(
+                    export_session, shop_id, fmt, batch_size=2)]
+        finally:
+            await engine.dispose()
+
+    failures = []
+    chunks = asyncio.run(export('csv'))
+    if len(chunks) != 3:
+        failures.append(f"CSV export came in {len(chunks)} chunks, expected 3 batches")
+    rows = list(csv.DictReader(io.StringIO("".join(chunks))))
+    got = [(row['status'], row['price']) for row in rows]
+    if got != [(status, str(price)) for status, price in expected]:
+        failures.append(f"CSV export rows are {got}, expected {expected}")
+
+    records = [json.loads(line) for line in "".join(asyncio.run(export('ndjson'))).splitlines()]
+    got = [(record['status'], record['price']) for record in records]
+    if got != expected:
+        failures.append(f"NDJSON export rows are {got}, expected {expected}")
+
+    response = client.get(f"/api/shops/{shop_id}/appointments/export", params={"format": "csv"})
+    if response.text != "".join(chunks):
+        failures.append("the export endpoint differs from the export streamed in batches of two")
+    return failures
+
+
+CHECKS = [
+    ("query plans", check_query_plans),
+    ("booking statements", check_booking_statements),
+    ("listing statements", check_listing_statements),
+    ("listing pages", check_listing_pages),
+    ("conditional gets", check_conditional_gets),
+    ("read cache", check_read_cache),
+    ("cached pages", check_cached_pages),
+    ("availability expiry", check_availability_expiry),
+    ("dashboard statements", check_dashboard_statements),
+    ("recurring series", check_recurring_series),
+    ("imported shops", check_imported_shops),
+    ("reference refresh", check_reference_refresh),
+    ("failed statements", check_failed_statements),
+    ("availability range", check_availability_range),
+    ("shop matrix", check_shop_matrix),
+    ("availability tables", check_availability_tables),
+    ("schedule overrides", check_schedule_overrides),
+    ("import resume", check_import_resume),
+    ("phone merges", check_phone_merges),
+    ("export output", check_export_output),
+]
+
+
+if __name__ == "__main__":
+    main.engine.echo = False
+    main.async_engine.echo = False
+    main.logger.setLevel("WARNING")
+    session = get_session(main.engine)
+    try:
+        ids = seed(session)
+    finally:
+        session.close()
+    failed = False
+    with TestClient(main.app) as client:
+        for name, check in CHECKS:
+            failures = check(client, ids)
+            print(f"{'❌' if failures else '✅'} {name}")
+            for failure in failures:
+                print(f"   {failure}")
+            failed = failed or bool(failures)
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,342 @@
+"""
+Data Import - Stream shops, employees, services and customers from CSV or NDJSON
+Run: python importer.py <entity> <file> [--shop-id ID] [--chunk-size N] [--restart]
+"""
+
+import argparse
+import csv
+import json
+import os
+from datetime import datetime
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from models import Shop, Employee, Customer, Service, ShopStats
+from cache import SHOP_LISTINGS, SHOPS_KEY, read_cache, reference_cache, shop_key
+from phones import normalize_phone
+from shop_stats import adjust_employees, touch_shops
+
+# Rows written per transaction
+DEFAULT_CHUNK_SIZE = 1000
+# Row errors kept in the returned report; the rest are only counted
+MAX_REPORTED_ERRORS = 1000
+
+# A parsed record: (line number in the source, field values, parse error)
+Record = Tuple[int, Optional[Dict], Optional[str]]
+
+
+def _text(value: str) -> str:
+    return value
+
+
+def _time(value: str):
+    try:
+        return datetime.strptime(value, "%H:%M").time()
+    except ValueError:
+        raise ValueError("expected HH:MM")
+
+
+def _int(value: str) -> int:
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError("expected a whole number")
+
+
+def _float(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError("expected a number")
+
+
+def _bool(value: str) -> bool:
+    if value.lower() in ("1", "true", "yes", "y"):
+        return True
+    if value.lower() in ("0", "false", "no", "n"):
+        return False
+    raise ValueError("expected true or false")
+
+
+# Per entity: model and {field: (converter, required, default)}
+ENTITIES: Dict[str, Tuple[type, Dict[str, Tuple[Callable, bool, object]]]] = {
+    'shops': (Shop, {
+        'name': (_text, True, None),
+        'owner_name': (_text, True, None),
+        'address': (_text, False, None),
+        'phone': (_text, False, None),
+        'email': (_text, False, None),
+        'opening_time': (_time, False, "09:00"),
+        'closing_time': (_time, False, "20:00"),
+    }),
+    'employees': (Employee, {
+        'shop_id': (_int, True, None),
+        'name': (_text, True, None),
+        'phone': (_text, True, None),
+        'email': (_text, False, None),
+        'specialization': (_text, False, None),
+        'working_days': (_text, False, "Mon,Tue,Wed,Thu,Fri"),
+        'start_time': (_time, False, "09:00"),
+        'end_time': (_time, False, "18:00"),
+        'is_active': (_bool, False, "true"),
+    }),
+    'services': (Service, {
+        'shop_id': (_int, True, None),
+        'name': (_text, True, None),
+        'description': (_text, False, None),
+        'duration_minutes': (_int, False, "30"),
+        'price': (_float, True, None),
+    }),
+    'customers': (Customer, {
+        'name': (_text, True, None),
+        'phone': (normalize_phone, True, None),
+        'email': (_text, False, None),
+        'preferred_barber_id': (_int, False, None),
+        'notes': (_text, False, None),
+    }),
+}
+
+
+def read_records(stream: Iterable[str], fmt: str) -> Iterator[Record]:
+    """Parse a text stream of CSV (with a header row) or NDJSON one record at a time"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row, None
+    elif fmt == 'ndjson':
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError as e:
+                yield line_number, None, f"invalid JSON: {e}"
+                continue
+            if not isinstance(data, dict):
+                yield line_number, None, "expected a JSON object"
+                continue
+            yield line_number, data, None
+    else:
+        raise ValueError("Format must be csv or ndjson")
+
+
+def detect_format(filename: str) -> str:
+    """Guess the format of a file from its extension"""
+    return 'ndjson' if filename.lower().endswith(('.ndjson', '.jsonl', '.json')) else 'csv'
+
+
+def convert(entity: str, data: Dict, defaults: Optional[Dict] = None) -> Dict:
+    """Turn raw field values into column values, raising ValueError on bad input"""
+    _, fields = ENTITIES[entity]
+    values = {}
+    for field, (converter, required, default) in fields.items():
+        raw = data.get(field)
+        if raw is None or str(raw).strip() == "":
+            raw = (defaults or {}).get(field, default)
+        if raw is None or str(raw).strip() == "":
+            if required:
+                raise ValueError(f"{field}: required")
+            values[field] = None
+            continue
+        try:
+            values[field] = converter(str(raw).strip())
+        except ValueError as e:
+            raise ValueError(f"{field}: {e}")
+    return values
+
+
+class Checkpoint:
+    """Number of source records already committed, kept in a small JSON file"""
+
+    def __init__(self, path: str, entity: str):
+        self.path = path
+        self.entity = entity
+
+    def load(self) -> int:
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path) as f:
+            state = json.load(f)
+        if state.get('entity') != self.entity:
+            raise ValueError(f"Checkpoint {self.path} belongs to a {state.get('entity')} import")
+        return state['records']
+
+    def save(self, records: int):
+        # Write then rename, so a crash never leaves a half-written checkpoint
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump({'entity': self.entity, 'records': records}, f)
+        os.replace(temp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _existing(session: Session, column, values: set) -> set:
+    """Get which of the given values are already stored in a column"""
+    if not values:
+        return set()
+    return {value for value, in session.query(column).filter(column.in_(values))}
+
+
+def _insert_chunk(session: Session, entity: str, chunk: List[Tuple[int, Dict]],
+                  report: Dict, on_error: Callable[[int, str], None]):
+    """Validate references of a chunk against the database and bulk insert the rest"""
+    model, _ = ENTITIES[entity]
+
+    shop_ids = _existing(session, Shop.id, {v['shop_id'] for _, v in chunk if v.get('shop_id')})
+    barber_ids = _existing(session, Employee.id, {v['preferred_barber_id'] for _, v in chunk
+                                                  if v.get('preferred_barber_id')})
+    phones = _existing(session, Customer.phone, {v['phone'] for _, v in chunk}) \
+        if entity == 'customers' else set()
+
+    mappings = []
+    for line_number, values in chunk:
+        if 'shop_id' in values and values['shop_id'] not in shop_ids:
+            on_error(line_number, f"shop_id: shop {values['shop_id']} not found")
+            continue
+        if values.get('preferred_barber_id') and values['preferred_barber_id'] not in barber_ids:
+            on_error(line_number, f"preferred_barber_id: employee {values['preferred_barber_id']} not found")
+            continue
+        if entity == 'customers':
+            # Known phone numbers are skipped, so re-running an import is harmless
+            if values['phone'] in phones:
+                report['skipped'] += 1
+                continue
+            phones.add(values['phone'])
+        mappings.append(values)
+
+    if entity == 'shops' and mappings:
+        # New shops start with zeroed counters, as create_shop gives them, so they have
+        # ETags and a cheap dashboard from the start
+        new_ids = session.scalars(insert(Shop).returning(Shop.id), mappings).all()
+        session.bulk_insert_mappings(ShopStats, [
+            {'shop_id': shop_id, 'scheduled_appointments': 0, 'total_customers': 0,
+             'active_employees': 0, 'version': 0} for shop_id in new_ids
+        ])
+    else:
+        session.bulk_insert_mappings(model, mappings)
+    if entity == 'employees':
+        active: Dict[int, int] = {}
+        for values in mappings:
+            active[values['shop_id']] = active.get(values['shop_id'], 0) + bool(values['is_active'])
+        adjust_employees(session, active)
+    elif entity == 'services':
+        touch_shops(session, (values['shop_id'] for values in mappings))
+    session.commit()
+    if entity == 'shops':
+        read_cache.invalidate(SHOPS_KEY)
+    elif entity in ('employees', 'services'):
+        changed_shops = {values['shop_id'] for values in mappings}
+        for shop_id in changed_shops:
+            reference_cache.invalidate(shop_id)
+        read_cache.invalidate(*(shop_key(listing, shop_id) for listing in SHOP_LISTINGS
+                                for shop_id in changed_shops))
+    report['imported'] += len(mappings)
+
+
+def import_records(session: Session, entity: str, records: Iterable[Record],
+                   defaults: Optional[Dict] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                   resume_from: int = 0, checkpoint: Optional[Checkpoint] = None,
+                   on_error: Optional[Callable[[int, str], None]] = None) -> Dict:
+    """Insert records chunk by chunk, committing and checkpointing after every chunk.
+
+    The first resume_from records are skipped. The report's 'records' is the number
+    of source records committed so far, which is where an interrupted import resumes;
+    a database failure stops the import and is reported under 'error'.
+    """
+    if entity not in ENTITIES:
+        raise ValueError(f"Entity must be one of: {', '.join(ENTITIES)}")
+
+    report = {'entity': entity, 'records': resume_from, 'imported': 0, 'skipped': 0,
+              'failed': 0, 'errors': []}
+
+    def record_error(line_number: int, message: str):
+        report['failed'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'line': line_number, 'error': message})
+        if on_error:
+            on_error(line_number, message)
+
+    records = islice(iter(records), resume_from, None)
+    while True:
+        batch = list(islice(records, chunk_size))
+        if not batch:
+            break
+
+        chunk = []
+        for line_number, data, error in batch:
+            if error:
+                record_error(line_number, error)
+                continue
+            try:
+                chunk.append((line_number, convert(entity, data, defaults)))
+            except ValueError as e:
+                record_error(line_number, str(e))
+
+        if chunk:
+            try:
+                _insert_chunk(session, entity, chunk, report, record_error)
+            except SQLAlchemyError as e:
+                # Stop at the last committed chunk; 'records' says where to resume
+                session.rollback()
+                report['error'] = str(e.orig if hasattr(e, 'orig') else e)
+                break
+        report['records'] += len(batch)
+        if checkpoint:
+            checkpoint.save(report['records'])
+
+    return report
+
+
+if __name__ == "__main__":
+    from models import init_db, get_session
+
+    parser = argparse.ArgumentParser(description="Import shops, employees, services or customers")
+    parser.add_argument("entity", choices=list(ENTITIES))
+    parser.add_argument("file")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="default: from the file extension")
+    parser.add_argument("--shop-id", type=int, help="shop for rows without a shop_id column")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    parser.add_argument("--database-url", default="sqlite:///barber_shop.db")
+    args = parser.parse_args()
+
+    engine = init_db(args.database_url)
+    engine.echo = False
+    session = get_session(engine)
+    checkpoint = Checkpoint(args.file + ".checkpoint", args.entity)
+    if args.restart:
+        checkpoint.clear()
+    resume_from = checkpoint.load()
+    if resume_from:
+        print(f"↪️  Resuming after record {resume_from}")
+
+    errors_path = args.file + ".errors.csv"
+    try:
+        with open(args.file, newline="", encoding="utf-8-sig") as source, \
+                open(errors_path, "a" if resume_from else "w", newline="") as errors_file:
+            errors = csv.writer(errors_file)
+            report = import_records(
+                session, args.entity, read_records(source, args.format or detect_format(args.file)),
+                defaults={'shop_id': args.shop_id}, chunk_size=args.chunk_size,
+                resume_from=resume_from, checkpoint=checkpoint,
+                on_error=lambda line, message: errors.writerow([line, message])
+            )
+    finally:
+        session.close()
+
+    print(f"{'❌' if 'error' in report else '✅'} {args.entity}: {report['imported']} imported, "
+          f"{report['skipped']} skipped, {report['failed']} failed ({report['records']} records read)")
+    if 'error' in report:
+        print(f"   Stopped: {report['error']}")
+        print("   Run the same command again to resume after the last committed chunk")
+    else:
+        checkpoint.clear()
+    if report['failed']:
+        print(f"   Row errors written to {errors_path}")
+    elif os.path.exists(errors_path) and not os.path.getsize(errors_path):
+        os.remove(errors_path)
@@ -0,0 +1,108 @@
+"""
+SQL Instrumentation - Per-request statement counts, database time and a slow-query log
+Hooked into SQLAlchemy engine events; cheap enough to stay on in production
+"""
+
+import contextvars
+import logging
+import os
+import time as timer
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+from sqlalchemy import event
+
+# Statements taking at least this many milliseconds are logged with their query plan
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "100"))
+
+logger = logging.getLogger("barber.sql")
+slow_query_logger = logging.getLogger("barber.sql.slow")
+
+
+class RequestStats:
+    """Statements run and database time spent while serving one request"""
+
+    def __init__(self):
+        self.statements = 0
+        self.db_time = 0.0
+
+    @property
+    def db_time_ms(self) -> float:
+        return self.db_time * 1000
+
+
+# Stats of the request being served; None outside of track()
+_current: contextvars.ContextVar[Optional[RequestStats]] = \
+    contextvars.ContextVar("sql_request_stats", default=None)
+
+
+@contextmanager
+def track() -> Iterator[RequestStats]:
+    """Count the statements every instrumented engine runs inside the block"""
+    stats = RequestStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+def explain(conn, statement: str, parameters) -> List[str]:
+    """Get the query plan of a statement from the connection that ran it"""
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        return [str(row[-1]) for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the statement's own context, so one that raises leaves nothing behind
+    if context is not None:
+        context._query_start = timer.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_query_start", None)
+    if started is None:
+        return
+    elapsed = timer.perf_counter() - started
+    stats = _current.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_time += elapsed
+
+    if elapsed * 1000 < SLOW_QUERY_MS:
+        return
+    if executemany:
+        plan = ["(batch statement, not explained)"]
+    else:
+        try:
+            plan = explain(conn, statement, parameters)
+        except Exception as e:
+            # A plan is a nice-to-have; the request must not fail over it
+            plan = [f"(no plan: {e})"]
+    slow_query_logger.warning("%.1f ms: %s\n    parameters: %r\n    plan: %s",
+                              elapsed * 1000, " ".join(statement.split()), parameters,
+                              "\n          ".join(plan))
+
+
+def instrument(engine):
+    """Time every statement of an engine (for an async engine, pass its sync_engine)"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def configure_logging(slow_query_log: Optional[str] = None):
+    """Print per-request stats to stderr and write slow queries to a file, if given"""
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+    if slow_query_log:
+        handler = logging.FileHandler(slow_query_log)
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        slow_query_logger.addHandler(handler)
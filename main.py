@@ -3,18 +3,35 @@ FastAPI Server for Barber Shop Scheduling System
 RESTful API with endpoints for all operations
 """
 
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, File, Header, Query, Request, Response, UploadFile, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Awaitable, List, Optional, Tuple
 from datetime import datetime, date, time
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from models import init_db, get_session, Shop, Employee, Customer, Appointment, Service
-from booking_manager import BookingManager
+from models import (
+    init_db, init_async_db, get_async_session, Shop, Employee, Customer, Appointment, Service,
+    ShopStats
+)
+from booking_manager import AsyncBookingManager
+from cache import availability_cache, customer_cache, read_cache, reference_cache
 from ai_assistant import AIAssistant
+from importer import ENTITIES, detect_format, import_records, read_records
+from exporter import MEDIA_TYPES, stream_appointments
+from instrumentation import configure_logging, instrument, logger, track
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+import io
 import os
 database_url = os.environ.get("DATABASE_URL", "sqlite:///barber_shop.db")
+
+# Longest date range served by a single availability request
+MAX_AVAILABILITY_RANGE_DAYS = 62
+# Largest batch accepted by the bulk booking endpoint
+MAX_BULK_BOOKINGS = 5000
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Barber Shop Scheduling API",
@@ -29,18 +46,87 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-DB-Statements", "X-DB-Time-Ms", "X-Next-Cursor", "ETag"],
 )
 
-# Initialize database
-engine = init_db()
+# Initialize database; endpoints talk to it through the async engine
+engine = init_db(database_url)
+async_engine = init_async_db(database_url)
+
+# Count and time every statement; SLOW_QUERY_LOG names a file for the slow ones
+instrument(engine)
+instrument(async_engine.sync_engine)
+configure_logging(os.environ.get("SLOW_QUERY_LOG"))
+
+
+@app.middleware("http")
+async def sql_stats(request: Request, call_next):
+    """Report each request's statement count and database time in headers and the log"""
+    with track() as stats:
+        response = await call_next(request)
+    response.headers["X-DB-Statements"] = str(stats.statements)
+    response.headers["X-DB-Time-Ms"] = f"{stats.db_time_ms:.1f}"
+    logger.info("%s %s %d: %d statements, %.1f ms in database", request.method,
+                request.url.path, response.status_code, stats.statements, stats.db_time_ms)
+    return response
 
 # Dependency to get database session
-def get_db():
-    db = get_session(engine)
-    try:
+async def get_db():
+    async with get_async_session(async_engine) as db:
         yield db
-    finally:
-        db.close()
+
+
+@app.on_event("shutdown")
+async def close_db():
+    # Pooled connections keep their driver threads alive until closed
+    await async_engine.dispose()
+
+
+def set_next_cursor(response: Response, cursor: Optional[str]):
+    """Tell the client where the next page starts; the last page has no X-Next-Cursor"""
+    if cursor:
+        response.headers["X-Next-Cursor"] = cursor
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header names the given ETag (weakly, as RFC 9110 asks)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+
+
+async def check_shop_etag(
+    shop_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db)
+) -> Optional[int]:
+    """Tag a shop read with the shop's data version, answering 304 before any other query.
+    
+    Returns the version, so cached listings older than it are reloaded.
+    """
+    # Read before the endpoint's query: a write in between only makes the tag older than the body
+    version = await db.scalar(select(ShopStats.version).where(ShopStats.shop_id == shop_id))
+    if version is None:
+        # A shop without counters yet (or no such shop) has nothing to validate against
+        return None
+    headers = {"ETag": f'"{shop_id}-{version}"', "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, headers["ETag"]):
+        raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return version
+
+
+async def serve_page(listing: Awaitable[Tuple[list, Optional[str]]], response: Response) -> list:
+    """Await a (page, next cursor) listing and set the next page's cursor header"""
+    try:
+        page, next_cursor = await listing
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    set_next_cursor(response, next_cursor)
+    return page
 
 
 # Pydantic models for request/response
@@ -71,6 +157,13 @@ class ServiceCreate(BaseModel):
     price: float
 
 
+class ScheduleOverride(BaseModel):
+    date: date
+    start_time: Optional[str] = None
+    end_time: Optional[str] = None
+    is_available: bool = True
+
+
 class BookingCreate(BaseModel):
     employee_id: int
     customer_name: str
@@ -81,6 +174,28 @@ class BookingCreate(BaseModel):
     notes: Optional[str] = ""
 
 
+class BulkBookingCreate(BaseModel):
+    bookings: List[BookingCreate]
+
+
+class SeriesCreate(BaseModel):
+    employee_id: int
+    customer_name: str
+    customer_phone: str
+    start_date: date
+    start_time: str
+    frequency: str  # weekly, biweekly, monthly
+    until: Optional[date] = None
+    count: Optional[int] = None
+    service_id: Optional[int] = None
+    notes: Optional[str] = ""
+
+
+class SeriesUpdate(BaseModel):
+    start_time: str
+    from_date: Optional[date] = None
+
+
 class AIBookingRequest(BaseModel):
     message: str
     customer_phone: Optional[str] = None
@@ -112,10 +227,10 @@ async def root():
 # Shop Management Endpoints
 
 @app.post("/api/shops", response_model=dict)
-async def create_shop(shop: ShopCreate, db: Session = Depends(get_db)):
+async def create_shop(shop: ShopCreate, db: AsyncSession = Depends(get_db)):
     """Create a new barber shop"""
-    booking_manager = BookingManager(db)
-    new_shop = booking_manager.create_shop(
+    booking_manager = AsyncBookingManager(db)
+    new_shop = await booking_manager.create_shop(
         name=shop.name,
         owner_name=shop.owner_name,
         opening_time=shop.opening_time,
@@ -133,52 +248,45 @@ async def create_shop(shop: ShopCreate, db: Session = Depends(get_db)):
 
 
 @app.get("/api/shops")
-async def get_shops(db: Session = Depends(get_db)):
-    """Get all shops"""
-    shops = db.query(Shop).all()
-    return [{
-        "id": s.id,
-        "name": s.name,
-        "owner_name": s.owner_name,
-        "address": s.address,
-        "phone": s.phone,
-        "opening_time": s.opening_time.strftime("%H:%M"),
-        "closing_time": s.closing_time.strftime("%H:%M")
-    } for s in shops]
+async def get_shops(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get a page of shops"""
+    return await serve_page(AsyncBookingManager(db).list_shops(cursor, limit), response)
 
 
 @app.get("/api/shops/{shop_id}")
-async def get_shop(shop_id: int, db: Session = Depends(get_db)):
+async def get_shop(
+    shop_id: int,
+    version: Optional[int] = Depends(check_shop_etag),
+    db: AsyncSession = Depends(get_db)
+):
     """Get shop details"""
-    shop = db.query(Shop).filter(Shop.id == shop_id).first()
-    if not shop:
+    booking_manager = AsyncBookingManager(db)
+    summary = await booking_manager.get_shop_summary(shop_id, version)
+    if not summary:
         raise HTTPException(status_code=404, detail="Shop not found")
     
-    return {
-        "id": shop.id,
-        "name": shop.name,
-        "owner_name": shop.owner_name,
-        "address": shop.address,
-        "phone": shop.phone,
-        "opening_time": shop.opening_time.strftime("%H:%M"),
-        "closing_time": shop.closing_time.strftime("%H:%M"),
-        "employees": len(shop.employees),
-        "active_appointments": len([a for a in shop.appointments if a.status == 'scheduled'])
-    }
+    details = dict(summary)
+    details['active_appointments'] = details.pop('scheduled_appointments')
+    return details
 
 
 # Employee Management Endpoints
 
 @app.post("/api/shops/{shop_id}/employees")
-async def add_employee(shop_id: int, employee: EmployeeCreate, db: Session = Depends(get_db)):
+async def add_employee(shop_id: int, employee: EmployeeCreate, db: AsyncSession = Depends(get_db)):
     """Add employee to shop"""
     # Check if shop exists
-    shop = db.query(Shop).filter(Shop.id == shop_id).first()
+    shop = await db.get(Shop, shop_id)
     if not shop:
         raise HTTPException(status_code=404, detail="Shop not found")
     
-    booking_manager = BookingManager(db)
-    new_employee = booking_manager.add_employee(
+    booking_manager = AsyncBookingManager(db)
+    new_employee = await booking_manager.add_employee(
         shop_id=shop_id,
         name=employee.name,
         phone=employee.phone,
@@ -197,35 +305,57 @@ async def add_employee(shop_id: int, employee: EmployeeCreate, db: Session = Dep
 
 
 @app.get("/api/shops/{shop_id}/employees")
-async def get_employees(shop_id: int, db: Session = Depends(get_db)):
-    """Get all employees for a shop"""
-    employees = db.query(Employee).filter(
-        Employee.shop_id == shop_id,
-        Employee.is_active == True
-    ).all()
+async def get_employees(
+    shop_id: int,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    version: Optional[int] = Depends(check_shop_etag),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get a page of a shop's employees"""
+    return await serve_page(AsyncBookingManager(db).list_employees(shop_id, cursor, limit, version),
+                            response)
+
+
+@app.put("/api/employees/{employee_id}/schedule")
+async def set_employee_schedule(employee_id: int, override: ScheduleOverride,
+                                db: AsyncSession = Depends(get_db)):
+    """Set special working hours or a day off for an employee"""
+    employee = await db.get(Employee, employee_id)
+    if not employee:
+        raise HTTPException(status_code=404, detail="Employee not found")
     
-    return [{
-        "id": e.id,
-        "name": e.name,
-        "phone": e.phone,
-        "specialization": e.specialization,
-        "working_days": e.working_days,
-        "start_time": e.start_time.strftime("%H:%M"),
-        "end_time": e.end_time.strftime("%H:%M")
-    } for e in employees]
+    booking_manager = AsyncBookingManager(db)
+    schedule = await booking_manager.set_employee_schedule(
+        employee_id=employee_id,
+        date=override.date,
+        start_time=override.start_time,
+        end_time=override.end_time,
+        is_available=override.is_available
+    )
+    
+    return {
+        "employee_id": employee_id,
+        "date": schedule.date,
+        "start_time": schedule.start_time.strftime("%H:%M") if schedule.start_time else None,
+        "end_time": schedule.end_time.strftime("%H:%M") if schedule.end_time else None,
+        "is_available": schedule.is_available,
+        "message": "Schedule updated successfully"
+    }
 
 
 # Service Management Endpoints
 
 @app.post("/api/shops/{shop_id}/services")
-async def add_service(shop_id: int, service: ServiceCreate, db: Session = Depends(get_db)):
+async def add_service(shop_id: int, service: ServiceCreate, db: AsyncSession = Depends(get_db)):
     """Add service to shop"""
-    shop = db.query(Shop).filter(Shop.id == shop_id).first()
+    shop = await db.get(Shop, shop_id)
     if not shop:
         raise HTTPException(status_code=404, detail="Shop not found")
     
-    booking_manager = BookingManager(db)
-    new_service = booking_manager.add_service(
+    booking_manager = AsyncBookingManager(db)
+    new_service = await booking_manager.add_service(
         shop_id=shop_id,
         name=service.name,
         description=service.description,
@@ -242,28 +372,28 @@ async def add_service(shop_id: int, service: ServiceCreate, db: Session = Depend
 
 
 @app.get("/api/shops/{shop_id}/services")
-async def get_services(shop_id: int, db: Session = Depends(get_db)):
-    """Get all services for a shop"""
-    services = db.query(Service).filter(Service.shop_id == shop_id).all()
-    
-    return [{
-        "id": s.id,
-        "name": s.name,
-        "description": s.description,
-        "duration_minutes": s.duration_minutes,
-        "price": s.price
-    } for s in services]
+async def get_services(
+    shop_id: int,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    version: Optional[int] = Depends(check_shop_etag),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get a page of a shop's services"""
+    return await serve_page(AsyncBookingManager(db).list_services(shop_id, cursor, limit, version),
+                            response)
 
 
 # Booking Endpoints
 
 @app.post("/api/bookings")
-async def create_booking(booking: BookingCreate, db: Session = Depends(get_db)):
+async def create_booking(booking: BookingCreate, db: AsyncSession = Depends(get_db)):
     """Create a new booking"""
-    booking_manager = BookingManager(db)
+    booking_manager = AsyncBookingManager(db)
     
     try:
-        appointment = booking_manager.book_appointment(
+        appointment = await booking_manager.book_appointment(
             employee_id=booking.employee_id,
             customer_phone=booking.customer_phone,
             customer_name=booking.customer_name,
@@ -285,46 +415,215 @@ async def create_booking(booking: BookingCreate, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@app.post("/api/bookings/bulk")
+async def create_bookings(bulk: BulkBookingCreate, db: AsyncSession = Depends(get_db)):
+    """Create many bookings in one transaction, reporting each one's outcome"""
+    if len(bulk.bookings) > MAX_BULK_BOOKINGS:
+        raise HTTPException(status_code=400,
+                            detail=f"At most {MAX_BULK_BOOKINGS} bookings per request")
+    
+    booking_manager = AsyncBookingManager(db)
+    try:
+        results = await booking_manager.book_many([b.dict() for b in bulk.bookings])
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    items = []
+    for index, result in enumerate(results):
+        if result['status'] == 'booked':
+            items.append({
+                "index": index,
+                "status": "booked",
+                "id": result['id'],
+                "appointment_date": result['appointment_date'],
+                "start_time": result['start_time'].strftime("%H:%M"),
+                "end_time": result['end_time'].strftime("%H:%M")
+            })
+        else:
+            items.append({"index": index, "status": result['status'], "error": result['error']})
+    
+    booked = sum(1 for item in items if item["status"] == "booked")
+    return {
+        "booked": booked,
+        "failed": len(items) - booked,
+        "results": items
+    }
+
+
+@app.post("/api/series")
+async def create_series(series: SeriesCreate, db: AsyncSession = Depends(get_db)):
+    """Book a recurring appointment series"""
+    booking_manager = AsyncBookingManager(db)
+    
+    try:
+        new_series = await booking_manager.book_series(
+            employee_id=series.employee_id,
+            customer_phone=series.customer_phone,
+            customer_name=series.customer_name,
+            start_date=series.start_date,
+            start_time=series.start_time,
+            frequency=series.frequency,
+            until=series.until,
+            count=series.count,
+            service_id=series.service_id,
+            notes=series.notes
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    dates = (await db.execute(select(Appointment.appointment_date).where(
+        Appointment.series_id == new_series.id
+    ).order_by(Appointment.appointment_date))).all()
+    return {
+        "id": new_series.id,
+        "frequency": new_series.frequency,
+        "start_time": new_series.start_time.strftime("%H:%M"),
+        "end_time": new_series.end_time.strftime("%H:%M"),
+        "dates": [d for d, in dates],
+        "message": "Series booked successfully"
+    }
+
+
+@app.patch("/api/series/{series_id}")
+async def reschedule_series(series_id: int, update: SeriesUpdate, db: AsyncSession = Depends(get_db)):
+    """Move the remaining occurrences of a series to a new time"""
+    booking_manager = AsyncBookingManager(db)
+    try:
+        moved = await booking_manager.reschedule_series(series_id, update.start_time, update.from_date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if moved is None:
+        raise HTTPException(status_code=404, detail="Series not found")
+    return {"rescheduled": moved, "message": "Series rescheduled successfully"}
+
+
+@app.delete("/api/series/{series_id}")
+async def cancel_series(series_id: int, from_date: Optional[date] = Query(None, alias="from"),
+                        db: AsyncSession = Depends(get_db)):
+    """Cancel the remaining occurrences of a series"""
+    booking_manager = AsyncBookingManager(db)
+    try:
+        cancelled = await booking_manager.cancel_series(series_id, from_date)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if cancelled is None:
+        raise HTTPException(status_code=404, detail="Series not found")
+    return {"cancelled": cancelled, "message": "Series cancelled successfully"}
+
+
 @app.get("/api/employees/{employee_id}/availability")
 async def get_availability(
     employee_id: int,
+    date: Optional[date] = None,
+    from_date: Optional[date] = Query(None, alias="from"),
+    to_date: Optional[date] = Query(None, alias="to"),
+    service_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """Get available time slots for an employee on a date or a range of dates.
+    With service_id, only start times where the whole service fits are returned."""
+    booking_manager = AsyncBookingManager(db)
+    
+    if date:
+        return await booking_manager.get_employee_availability(employee_id, date, service_id)
+    
+    if not from_date or not to_date:
+        raise HTTPException(status_code=400, detail="Provide either 'date' or both 'from' and 'to'")
+    if to_date < from_date:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+    if (to_date - from_date).days >= MAX_AVAILABILITY_RANGE_DAYS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Date range is limited to {MAX_AVAILABILITY_RANGE_DAYS} days"
+        )
+    
+    availability = await booking_manager.get_availability_range(employee_id, from_date, to_date, service_id)
+    return [{"date": day, "slots": slots} for day, slots in availability.items()]
+
+
+@app.get("/api/shops/{shop_id}/availability")
+async def get_shop_availability(
+    shop_id: int,
     date: date,
-    db: Session = Depends(get_db)
+    service_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get available time slots for an employee"""
-    booking_manager = BookingManager(db)
-    slots = booking_manager.get_employee_availability(employee_id, date)
+    """Get free slots of every active barber in a shop as an employee x slot matrix"""
+    booking_manager = AsyncBookingManager(db)
+    matrix = await booking_manager.get_shop_availability(shop_id, date, service_id)
     
-    return slots
+    # One row per barber, one character per slot: "1" free, "0" booked or off
+    return {
+        "date": date,
+        "slots": [t.strftime("%H:%M") for t in matrix['slots']],
+        "employees": [{
+            "id": e['id'],
+            "name": e['name'],
+            "availability": "".join("1" if free else "0" for free in e['available'])
+        } for e in matrix['employees']]
+    }
 
 
-@app.get("/api/shops/{shop_id}/appointments")
+@app.get("/api/shops/{shop_id}/appointments", dependencies=[Depends(check_shop_etag)])
 async def get_shop_appointments(
     shop_id: int,
+    response: Response,
     date: Optional[date] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get all appointments for a shop"""
-    booking_manager = BookingManager(db)
-    appointments = booking_manager.get_shop_appointments(shop_id, date)
+    """Get a page of a shop's appointments in date and time order"""
+    booking_manager = AsyncBookingManager(db)
+    try:
+        appointments, next_cursor = await booking_manager.list_shop_appointments(
+            shop_id, date, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    set_next_cursor(response, next_cursor)
     
     return [{
-        "id": a.id,
-        "employee_name": a.employee.name,
-        "customer_name": a.customer.name,
-        "date": a.appointment_date,
-        "start_time": a.start_time.strftime("%H:%M"),
-        "end_time": a.end_time.strftime("%H:%M"),
-        "service": a.service.name if a.service else "Standard",
-        "status": a.status
+        "id": a['id'],
+        "employee_name": a['employee_name'],
+        "customer_name": a['customer_name'],
+        "date": a['appointment_date'],
+        "start_time": a['start_time'].strftime("%H:%M"),
+        "end_time": a['end_time'].strftime("%H:%M"),
+        "service": a['service_name'] or "Standard",
+        "status": a['status']
     } for a in appointments]
 
 
+@app.get("/api/shops/{shop_id}/appointments/export")
+async def export_shop_appointments(
+    shop_id: int,
+    format: str = "csv",
+    from_date: Optional[date] = Query(None, alias="from"),
+    to_date: Optional[date] = Query(None, alias="to"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Stream a shop's appointments over a date range as CSV or NDJSON"""
+    if format not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="Format must be csv or ndjson")
+    if not await db.get(Shop, shop_id):
+        raise HTTPException(status_code=404, detail="Shop not found")
+    
+    async def rows():
+        # A session of its own, held only while the download runs
+        async with get_async_session(async_engine) as session:
+            async for chunk in stream_appointments(session, shop_id, format, from_date, to_date):
+                yield chunk
+    
+    return StreamingResponse(rows(), media_type=MEDIA_TYPES[format], headers={
+        "Content-Disposition": f'attachment; filename="shop-{shop_id}-appointments.{format}"'
+    })
+
+
 @app.delete("/api/bookings/{appointment_id}")
-async def cancel_appointment(appointment_id: int, db: Session = Depends(get_db)):
+async def cancel_appointment(appointment_id: int, db: AsyncSession = Depends(get_db)):
     """Cancel an appointment"""
-    booking_manager = BookingManager(db)
-    success = booking_manager.cancel_appointment(appointment_id)
+    booking_manager = AsyncBookingManager(db)
+    success = await booking_manager.cancel_appointment(appointment_id)
     
     if not success:
         raise HTTPException(status_code=404, detail="Appointment not found")
@@ -335,74 +634,90 @@ async def cancel_appointment(appointment_id: int, db: Session = Depends(get_db))
 # AI Assistant Endpoint
 
 @app.post("/api/ai/chat")
-async def ai_chat(request: AIBookingRequest, db: Session = Depends(get_db)):
+async def ai_chat(request: AIBookingRequest, db: AsyncSession = Depends(get_db)):
     """Chat with AI assistant for booking"""
-    booking_manager = BookingManager(db)
-    ai_assistant = AIAssistant(booking_manager, use_openai=False)
+    booking_manager = AsyncBookingManager(db)
     
-    response = ai_assistant.process_request(
-        request.message,
-        request.customer_phone
-    )
+    def chat(manager):
+        ai_assistant = AIAssistant(manager, use_openai=False)
+        return ai_assistant.process_request(
+            request.message,
+            request.customer_phone
+        )
     
-    return response
+    return await booking_manager.run(chat)
 
 
 # Dashboard Endpoint
 
 @app.get("/api/dashboard/{shop_id}")
-async def get_dashboard(shop_id: int, db: Session = Depends(get_db)):
+async def get_dashboard(shop_id: int, db: AsyncSession = Depends(get_db)):
     """Get dashboard data for shop owner"""
-    shop = db.query(Shop).filter(Shop.id == shop_id).first()
-    if not shop:
+    booking_manager = AsyncBookingManager(db)
+    dashboard = await booking_manager.get_dashboard(shop_id)
+    if not dashboard:
         raise HTTPException(status_code=404, detail="Shop not found")
     
-    today = date.today()
-    
-    # Today's appointments
-    todays_appointments = db.query(Appointment).filter(
-        Appointment.shop_id == shop_id,
-        Appointment.appointment_date == today,
-        Appointment.status == 'scheduled'
-    ).count()
-    
-    # This week's appointments
-    from datetime import timedelta
-    week_start = today - timedelta(days=today.weekday())
-    week_end = week_start + timedelta(days=6)
-    
-    week_appointments = db.query(Appointment).filter(
-        Appointment.shop_id == shop_id,
-        Appointment.appointment_date >= week_start,
-        Appointment.appointment_date <= week_end,
-        Appointment.status == 'scheduled'
-    ).count()
-    
-    # Active employees
-    active_employees = db.query(Employee).filter(
-        Employee.shop_id == shop_id,
-        Employee.is_active == True
-    ).count()
-    
-    # Total customers
-    total_customers = db.query(Customer).join(Appointment).filter(
-        Appointment.shop_id == shop_id
-    ).distinct().count()
-    
+    shop = dashboard['shop']
     return {
         "shop_name": shop.name,
-        "today": today,
+        "today": dashboard['today'],
         "stats": {
-            "todays_appointments": todays_appointments,
-            "week_appointments": week_appointments,
-            "active_employees": active_employees,
-            "total_customers": total_customers
+            "todays_appointments": dashboard['todays_appointments'],
+            "week_appointments": dashboard['week_appointments'],
+            "active_employees": dashboard['active_employees'],
+            "total_customers": dashboard['total_customers']
         },
         "opening_time": shop.opening_time.strftime("%H:%M"),
         "closing_time": shop.closing_time.strftime("%H:%M")
     }
 
 
+# Cache Statistics
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """Get hit/miss counters of the caches"""
+    return {
+        "availability": availability_cache.stats(),
+        "customers": customer_cache.stats(),
+        "reference": reference_cache.stats(),
+        "reads": read_cache.stats()
+    }
+
+
+# Import Endpoints
+
+@app.post("/api/import/{entity}")
+async def import_data(
+    entity: str,
+    file: UploadFile = File(...),
+    format: Optional[str] = None,
+    shop_id: Optional[int] = None,
+    resume_from: int = 0,
+    db: AsyncSession = Depends(get_db)
+):
+    """Import shops, employees, services or customers from a CSV or NDJSON upload.
+    
+    Rows are committed in chunks; after a failure, send the file again with
+    resume_from set to the reported 'records' to continue where it stopped.
+    """
+    if entity not in ENTITIES:
+        raise HTTPException(status_code=404, detail=f"Unknown entity '{entity}'")
+    
+    # The upload is spooled to disk by the server, so it is read back one line at a time
+    stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    try:
+        records = read_records(stream, format or detect_format(file.filename or ""))
+        return await db.run_sync(lambda session: import_records(
+            session, entity, records, defaults={'shop_id': shop_id}, resume_from=resume_from
+        ))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        stream.detach()
+
+
 # Health Check
 @app.get("/health")
 async def health_check():
@@ -0,0 +1,162 @@
+"""
+Maintenance Commands - Rebuild derived data from the appointments table
+Run: python maintenance.py <command> [--database-url URL]
+"""
+
+import argparse
+from itertools import groupby
+from sqlalchemy import distinct, func, select
+from sqlalchemy.orm import Session
+from models import (
+    Appointment, AppointmentSeries, Customer, Employee, EmployeeDayOccupancy, Shop, ShopCustomer,
+    ShopDayStats, ShopStats
+)
+from availability import to_minutes
+from occupancy import encode_busy
+from phones import plan_backfill
+
+
+def rebuild_occupancy(session: Session, batch_size: int = 1000) -> int:
+    """Recompute every employee-day occupancy row from the appointments"""
+    session.query(EmployeeDayOccupancy).delete()
+
+    appointments = session.query(
+        Appointment.id,
+        Appointment.employee_id,
+        Appointment.appointment_date,
+        Appointment.start_time,
+        Appointment.end_time
+    ).filter(
+        Appointment.status != 'cancelled'
+    ).order_by(
+        Appointment.employee_id, Appointment.appointment_date
+    ).yield_per(batch_size)
+
+    rows = []
+    count = 0
+    for (employee_id, day), group in groupby(appointments,
+                                             key=lambda a: (a.employee_id, a.appointment_date)):
+        busy = encode_busy((to_minutes(a.start_time), to_minutes(a.end_time), a.id)
+                           for a in group)
+        rows.append({'employee_id': employee_id, 'date': day, 'busy': busy})
+        if len(rows) >= batch_size:
+            session.bulk_insert_mappings(EmployeeDayOccupancy, rows)
+            count += len(rows)
+            rows = []
+
+    if rows:
+        session.bulk_insert_mappings(EmployeeDayOccupancy, rows)
+        count += len(rows)
+
+    session.commit()
+    return count
+
+
+def rebuild_shop_stats(session: Session) -> int:
+    """Recount every shop's counters, daily rollups and customer set from the appointments"""
+    # Versions carry over (and go up), so ETags handed out before the rebuild stop matching
+    versions = dict(session.query(ShopStats.shop_id, ShopStats.version).all())
+    for model in (ShopDayStats, ShopCustomer, ShopStats):
+        session.query(model).delete()
+    
+    scheduled = dict(session.query(Appointment.shop_id, func.count(Appointment.id)).filter(
+        Appointment.status == 'scheduled'
+    ).group_by(Appointment.shop_id).all())
+    customers = dict(session.query(
+        Appointment.shop_id, func.count(distinct(Appointment.customer_id))
+    ).group_by(Appointment.shop_id).all())
+    employees = dict(session.query(Employee.shop_id, func.count(Employee.id)).filter(
+        Employee.is_active == True
+    ).group_by(Employee.shop_id).all())
+    shop_ids = [shop_id for shop_id, in session.query(Shop.id)]
+    session.bulk_insert_mappings(ShopStats, [{
+        'shop_id': shop_id,
+        'scheduled_appointments': scheduled.get(shop_id, 0),
+        'total_customers': customers.get(shop_id, 0),
+        'active_employees': employees.get(shop_id, 0),
+        'version': versions.get(shop_id, -1) + 1
+    } for shop_id in shop_ids])
+    
+    days = session.query(
+        Appointment.shop_id, Appointment.appointment_date, func.count(Appointment.id)
+    ).filter(
+        Appointment.status == 'scheduled'
+    ).group_by(Appointment.shop_id, Appointment.appointment_date).all()
+    session.bulk_insert_mappings(ShopDayStats, [
+        {'shop_id': shop_id, 'date': day, 'scheduled_appointments': count}
+        for shop_id, day, count in days
+    ])
+    pairs = session.query(Appointment.shop_id, Appointment.customer_id).distinct().all()
+    session.bulk_insert_mappings(ShopCustomer, [
+        {'shop_id': shop_id, 'customer_id': customer_id} for shop_id, customer_id in pairs
+    ])
+    session.commit()
+    return len(shop_ids) + len(days) + len(pairs)
+
+
+def normalize_phones(session: Session, batch_size: int = 1000) -> int:
+    """Rewrite customer phones to canonical form, merging customers that turn out to be the same"""
+    changes, merges = plan_backfill(
+        session.query(Customer.id, Customer.phone).order_by(Customer.id).yield_per(batch_size)
+    )
+    
+    # Move the duplicates' bookings over before the duplicates (and their phones) go away
+    duplicates_of = {}
+    for duplicate_id, kept_id in merges.items():
+        duplicates_of.setdefault(kept_id, []).append(duplicate_id)
+    merged_shops = set()
+    for kept_id, duplicate_ids in duplicates_of.items():
+        for model in (Appointment, AppointmentSeries):
+            session.query(model).filter(model.customer_id.in_(duplicate_ids)).update(
+                {'customer_id': kept_id}, synchronize_session=False)
+        
+        # The kept customer joins the duplicates' shops; a shop lists each customer once
+        shop_ids = {shop_id for shop_id, in session.query(ShopCustomer.shop_id).filter(
+            ShopCustomer.customer_id.in_(duplicate_ids))}
+        kept_shops = {shop_id for shop_id, in session.query(ShopCustomer.shop_id).filter(
+            ShopCustomer.customer_id == kept_id)}
+        session.query(ShopCustomer).filter(ShopCustomer.customer_id.in_(duplicate_ids)).delete(
+            synchronize_session=False)
+        session.bulk_insert_mappings(ShopCustomer, [{'shop_id': shop_id, 'customer_id': kept_id}
+                                                    for shop_id in shop_ids - kept_shops])
+        merged_shops |= shop_ids
+    if merges:
+        session.query(Customer).filter(Customer.id.in_(list(merges))).delete(
+            synchronize_session=False)
+        # Shops that knew a customer twice now count them once
+        session.query(ShopStats).filter(ShopStats.shop_id.in_(merged_shops)).update(
+            {ShopStats.total_customers: select(func.count()).where(
+                ShopCustomer.shop_id == ShopStats.shop_id).scalar_subquery()},
+            synchronize_session=False)
+        # Appointment listings now name the kept customers
+        session.query(ShopStats).update({ShopStats.version: ShopStats.version + 1},
+                                        synchronize_session=False)
+    
+    session.bulk_update_mappings(Customer, [{'id': customer_id, 'phone': phone}
+                                            for customer_id, phone in changes.items()])
+    session.commit()
+    return len(changes) + len(merges)
+
+
+COMMANDS = {
+    'rebuild-occupancy': rebuild_occupancy,
+    'rebuild-shop-stats': rebuild_shop_stats,
+    'normalize-phones': normalize_phones,
+}
+
+
+if __name__ == "__main__":
+    from models import init_db, get_session
+
+    parser = argparse.ArgumentParser(description="Rebuild derived scheduling data")
+    parser.add_argument("command", choices=list(COMMANDS))
+    parser.add_argument("--database-url", default="sqlite:///barber_shop.db")
+    args = parser.parse_args()
+
+    engine = init_db(args.database_url)
+    session = get_session(engine)
+    try:
+        rows = COMMANDS[args.command](session)
+        print(f"✅ {args.command}: {rows} rows written")
+    finally:
+        session.close()
@@ -0,0 +1,107 @@
+"""Initial schema: shops, employees, customers, services, appointments, schedules
+
+Revision ID: 0001
+Revises:
+Create Date: 2024-01-01 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Databases created before migrations existed already have some or all of these tables
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    def create_table(name, *columns):
+        if name not in existing:
+            op.create_table(name, *columns)
+
+    create_table(
+        'shops',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('name', sa.String(100), nullable=False),
+        sa.Column('owner_name', sa.String(100)),
+        sa.Column('address', sa.String(200)),
+        sa.Column('phone', sa.String(20)),
+        sa.Column('email', sa.String(100)),
+        sa.Column('opening_time', sa.Time()),
+        sa.Column('closing_time', sa.Time()),
+        sa.Column('created_at', sa.DateTime()),
+    )
+    create_table(
+        'employees',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('shop_id', sa.Integer(), sa.ForeignKey('shops.id'), nullable=False),
+        sa.Column('name', sa.String(100), nullable=False),
+        sa.Column('phone', sa.String(20)),
+        sa.Column('email', sa.String(100)),
+        sa.Column('specialization', sa.String(200)),
+        sa.Column('is_active', sa.Boolean()),
+        sa.Column('working_days', sa.String(50)),
+        sa.Column('start_time', sa.Time()),
+        sa.Column('end_time', sa.Time()),
+        sa.Column('created_at', sa.DateTime()),
+    )
+    create_table(
+        'services',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('shop_id', sa.Integer(), sa.ForeignKey('shops.id'), nullable=False),
+        sa.Column('name', sa.String(100), nullable=False),
+        sa.Column('description', sa.String(200)),
+        sa.Column('duration_minutes', sa.Integer()),
+        sa.Column('price', sa.Float()),
+    )
+    create_table(
+        'customers',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('name', sa.String(100), nullable=False),
+        sa.Column('phone', sa.String(20), nullable=False, unique=True),
+        sa.Column('email', sa.String(100)),
+        sa.Column('preferred_barber_id', sa.Integer(), sa.ForeignKey('employees.id')),
+        sa.Column('notes', sa.String(500)),
+        sa.Column('created_at', sa.DateTime()),
+    )
+    create_table(
+        'employee_schedules',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('employee_id', sa.Integer(), sa.ForeignKey('employees.id'), nullable=False),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('start_time', sa.Time()),
+        sa.Column('end_time', sa.Time()),
+        sa.Column('is_available', sa.Boolean()),
+    )
+    create_table(
+        'appointments',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('shop_id', sa.Integer(), sa.ForeignKey('shops.id'), nullable=False),
+        sa.Column('employee_id', sa.Integer(), sa.ForeignKey('employees.id'), nullable=False),
+        sa.Column('customer_id', sa.Integer(), sa.ForeignKey('customers.id'), nullable=False),
+        sa.Column('service_id', sa.Integer(), sa.ForeignKey('services.id')),
+        sa.Column('appointment_date', sa.Date(), nullable=False),
+        sa.Column('start_time', sa.Time(), nullable=False),
+        sa.Column('end_time', sa.Time(), nullable=False),
+        sa.Column('status', sa.String(20)),
+        sa.Column('notes', sa.String(500)),
+        sa.Column('price', sa.Float()),
+        sa.Column('created_at', sa.DateTime()),
+        sa.Column('updated_at', sa.DateTime()),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('appointments')
+    op.drop_table('employee_schedules')
+    op.drop_table('customers')
+    op.drop_table('services')
+    op.drop_table('employees')
+    op.drop_table('shops')
@@ -0,0 +1,66 @@
+"""Add employee_day_occupancy and fill it from existing appointments
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2024-01-02 00:00:00
+
+"""
+from datetime import date
+from itertools import groupby
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _minutes(value) -> int:
+    # SQLite hands TIME columns back as "HH:MM:SS[.ffffff]" strings in raw SQL
+    if isinstance(value, str):
+        hours, minutes = value.split(":")[:2]
+        return int(hours) * 60 + int(minutes)
+    return value.hour * 60 + value.minute
+
+
+def _date(value) -> date:
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def upgrade() -> None:
+    if sa.inspect(op.get_bind()).has_table('employee_day_occupancy'):
+        # Created and filled by init_db before migrations managed the schema
+        return
+
+    occupancy = op.create_table(
+        'employee_day_occupancy',
+        sa.Column('employee_id', sa.Integer(), sa.ForeignKey('employees.id'), primary_key=True),
+        sa.Column('date', sa.Date(), primary_key=True),
+        sa.Column('busy', sa.Text(), nullable=False, server_default=''),
+    )
+
+    appointments = op.get_bind().execute(sa.text(
+        "SELECT id, employee_id, appointment_date, start_time, end_time FROM appointments "
+        "WHERE status IS NULL OR status != 'cancelled' "
+        "ORDER BY employee_id, appointment_date"
+    )).fetchall()
+
+    rows = []
+    for (employee_id, day), group in groupby(appointments, key=lambda a: (a[1], a[2])):
+        entries = sorted((_minutes(a[3]), _minutes(a[4]), a[0]) for a in group)
+        rows.append({
+            'employee_id': employee_id,
+            'date': _date(day),
+            'busy': ",".join(f"{start}-{end}:{appointment_id}" for start, end, appointment_id in entries),
+        })
+    if rows:
+        op.bulk_insert(occupancy, rows)
+
+
+def downgrade() -> None:
+    op.drop_table('employee_day_occupancy')
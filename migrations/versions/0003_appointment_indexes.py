@@ -0,0 +1,43 @@
+"""Add composite indexes for the booking and dashboard queries
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2024-01-03 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (index, table, columns)
+INDEXES = [
+    ('ix_appointments_employee_date_status', 'appointments',
+     ['employee_id', 'appointment_date', 'status']),
+    ('ix_appointments_shop_date_status', 'appointments', ['shop_id', 'appointment_date', 'status']),
+    ('ix_appointments_customer_id', 'appointments', ['customer_id']),
+    ('ix_employees_shop_active', 'employees', ['shop_id', 'is_active']),
+    ('ix_services_shop_id', 'services', ['shop_id']),
+    ('ix_employee_schedules_employee_date', 'employee_schedules', ['employee_id', 'date']),
+]
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    for name, table, columns in INDEXES:
+        # Tables created by init_db before migrations came with their indexes
+        if name not in {index['name'] for index in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table)
@@ -0,0 +1,30 @@
+"""Add a version counter to employee_day_occupancy for optimistic booking locks
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2024-01-04 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('employee_day_occupancy')}
+    if 'version' not in columns:
+        op.add_column('employee_day_occupancy',
+                      sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('employee_day_occupancy') as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,60 @@
+"""Add recurring appointment series
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2024-01-05 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Databases set up by init_db before migrations managed the schema may have either already
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('appointment_series'):
+        op.create_table(
+            'appointment_series',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('shop_id', sa.Integer(), nullable=False),
+            sa.Column('employee_id', sa.Integer(), nullable=False),
+            sa.Column('customer_id', sa.Integer(), nullable=False),
+            sa.Column('service_id', sa.Integer(), nullable=True),
+            sa.Column('frequency', sa.String(length=20), nullable=False),
+            sa.Column('start_date', sa.Date(), nullable=False),
+            sa.Column('until_date', sa.Date(), nullable=True),
+            sa.Column('occurrence_count', sa.Integer(), nullable=True),
+            sa.Column('start_time', sa.Time(), nullable=False),
+            sa.Column('end_time', sa.Time(), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=True),
+            sa.Column('notes', sa.String(length=500), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['customer_id'], ['customers.id']),
+            sa.ForeignKeyConstraint(['employee_id'], ['employees.id']),
+            sa.ForeignKeyConstraint(['service_id'], ['services.id']),
+            sa.ForeignKeyConstraint(['shop_id'], ['shops.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+    if 'series_id' not in {c['name'] for c in inspector.get_columns('appointments')}:
+        with op.batch_alter_table('appointments') as batch_op:
+            batch_op.add_column(sa.Column('series_id', sa.Integer(), nullable=True))
+            batch_op.create_foreign_key('fk_appointments_series_id', 'appointment_series',
+                                        ['series_id'], ['id'])
+            batch_op.create_index('ix_appointments_series_date', ['series_id', 'appointment_date'])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('appointments') as batch_op:
+        batch_op.drop_index('ix_appointments_series_date')
+        batch_op.drop_constraint('fk_appointments_series_id', type_='foreignkey')
+        batch_op.drop_column('series_id')
+    op.drop_table('appointment_series')
@@ -0,0 +1,44 @@
+"""Store customer phone numbers in canonical form, merging duplicates
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2024-01-06 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from phones import plan_backfill
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    changes, merges = plan_backfill(
+        bind.execute(sa.text("SELECT id, phone FROM customers ORDER BY id")).fetchall()
+    )
+
+    merged = [{'duplicate': duplicate_id, 'kept': kept_id}
+              for duplicate_id, kept_id in merges.items()]
+    if merged:
+        for table in ('appointments', 'appointment_series'):
+            bind.execute(sa.text(f"UPDATE {table} SET customer_id = :kept "
+                                 f"WHERE customer_id = :duplicate"), merged)
+        bind.execute(sa.text("DELETE FROM customers WHERE id = :duplicate"), merged)
+
+    if changes:
+        bind.execute(sa.text("UPDATE customers SET phone = :phone WHERE id = :id"),
+                     [{'id': customer_id, 'phone': phone} for customer_id, phone in changes.items()])
+
+
+def downgrade() -> None:
+    # Canonical numbers are valid input for the old code; merged customers stay merged
+    pass
@@ -0,0 +1,40 @@
+"""Add shop_stats running counters and count existing appointments into them
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2024-01-07 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if sa.inspect(op.get_bind()).has_table('shop_stats'):
+        # Created and filled by init_db before migrations managed the schema
+        return
+
+    op.create_table(
+        'shop_stats',
+        sa.Column('shop_id', sa.Integer(), sa.ForeignKey('shops.id'), primary_key=True),
+        sa.Column('scheduled_appointments', sa.Integer(), nullable=False, server_default='0'),
+    )
+    op.execute(
+        "INSERT INTO shop_stats (shop_id, scheduled_appointments) "
+        "SELECT shops.id, (SELECT COUNT(*) FROM appointments "
+        "WHERE appointments.shop_id = shops.id AND appointments.status = 'scheduled') "
+        "FROM shops"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('shop_stats')
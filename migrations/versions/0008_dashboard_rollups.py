@@ -0,0 +1,69 @@
+"""Add dashboard rollups: per-day scheduled counts, shop customer sets and two more counters
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2024-01-08 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Databases set up by init_db before migrations managed the schema may have some of these
+    inspector = sa.inspect(op.get_bind())
+    add_counters = 'total_customers' not in {c['name'] for c in inspector.get_columns('shop_stats')}
+    if add_counters:
+        op.add_column('shop_stats', sa.Column('total_customers', sa.Integer(), nullable=False,
+                                              server_default='0'))
+        op.add_column('shop_stats', sa.Column('active_employees', sa.Integer(), nullable=False,
+                                              server_default='0'))
+
+    if not inspector.has_table('shop_day_stats'):
+        op.create_table(
+            'shop_day_stats',
+            sa.Column('shop_id', sa.Integer(), sa.ForeignKey('shops.id'), primary_key=True),
+            sa.Column('date', sa.Date(), primary_key=True),
+            sa.Column('scheduled_appointments', sa.Integer(), nullable=False, server_default='0'),
+        )
+        op.execute(
+            "INSERT INTO shop_day_stats (shop_id, date, scheduled_appointments) "
+            "SELECT shop_id, appointment_date, COUNT(*) FROM appointments "
+            "WHERE status = 'scheduled' GROUP BY shop_id, appointment_date"
+        )
+    if not inspector.has_table('shop_customers'):
+        op.create_table(
+            'shop_customers',
+            sa.Column('shop_id', sa.Integer(), sa.ForeignKey('shops.id'), primary_key=True),
+            sa.Column('customer_id', sa.Integer(), sa.ForeignKey('customers.id'), primary_key=True),
+        )
+        op.execute(
+            "INSERT INTO shop_customers (shop_id, customer_id) "
+            "SELECT DISTINCT shop_id, customer_id FROM appointments"
+        )
+
+    if add_counters:
+        op.execute(
+            "UPDATE shop_stats SET "
+            "total_customers = (SELECT COUNT(*) FROM shop_customers "
+            "WHERE shop_customers.shop_id = shop_stats.shop_id), "
+            "active_employees = (SELECT COUNT(*) FROM employees "
+            "WHERE employees.shop_id = shop_stats.shop_id AND employees.is_active)"
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('shop_customers')
+    op.drop_table('shop_day_stats')
+    with op.batch_alter_table('shop_stats') as batch_op:
+        batch_op.drop_column('active_employees')
+        batch_op.drop_column('total_customers')
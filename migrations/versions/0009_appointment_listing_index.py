@@ -0,0 +1,31 @@
+"""Add an index for paging through a shop's appointments in date and time order
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2024-01-09 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    indexes = {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('appointments')}
+    if 'ix_appointments_shop_date_time' in indexes:
+        # Created with the table by init_db before migrations managed the schema
+        return
+    op.create_index('ix_appointments_shop_date_time', 'appointments',
+                    ['shop_id', 'appointment_date', 'start_time'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_appointments_shop_date_time', 'appointments')
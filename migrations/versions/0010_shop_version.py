@@ -0,0 +1,29 @@
+"""Add a per-shop data version to shop_stats for ETags
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2024-01-10 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0010'
+down_revision: Union[str, None] = '0009'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if 'version' not in {c['name'] for c in sa.inspect(op.get_bind()).get_columns('shop_stats')}:
+        op.add_column('shop_stats', sa.Column('version', sa.Integer(), nullable=False,
+                                              server_default='0'))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('shop_stats') as batch_op:
+        batch_op.drop_column('version')
@@ -4,10 +4,14 @@ Author: Your Name
 Date: 2024
 """
 
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Float, Boolean, ForeignKey, Date, Time
+from sqlalchemy import create_engine, event, inspect, Column, Integer, String, Text, DateTime, Float, Boolean, ForeignKey, Date, Time, Index
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from datetime import datetime
+from typing import Dict
 import os
 
 # Create base class for all models
@@ -48,6 +52,10 @@ class Employee(Base):
     end_time = Column(Time)    # Daily end time
     created_at = Column(DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        Index('ix_employees_shop_active', 'shop_id', 'is_active'),
+    )
+    
     # Relationships
     shop = relationship("Shop", back_populates="employees")
     appointments = relationship("Appointment", back_populates="employee", cascade="all, delete-orphan")
@@ -82,6 +90,10 @@ class Service(Base):
     duration_minutes = Column(Integer, default=30)
     price = Column(Float)
     
+    __table_args__ = (
+        Index('ix_services_shop_id', 'shop_id'),
+    )
+    
     # Relationships
     appointments = relationship("Appointment", back_populates="service")
 
@@ -95,6 +107,7 @@ class Appointment(Base):
     employee_id = Column(Integer, ForeignKey('employees.id'), nullable=False)
     customer_id = Column(Integer, ForeignKey('customers.id'), nullable=False)
     service_id = Column(Integer, ForeignKey('services.id'), nullable=True)
+    series_id = Column(Integer, ForeignKey('appointment_series.id'), nullable=True)
     
     appointment_date = Column(Date, nullable=False)
     start_time = Column(Time, nullable=False)
@@ -107,11 +120,48 @@ class Appointment(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Hot paths filter by barber or shop, then day, then status
+    __table_args__ = (
+        Index('ix_appointments_employee_date_status', 'employee_id', 'appointment_date', 'status'),
+        Index('ix_appointments_shop_date_status', 'shop_id', 'appointment_date', 'status'),
+        Index('ix_appointments_customer_id', 'customer_id'),
+        Index('ix_appointments_series_date', 'series_id', 'appointment_date'),
+        # The shop listing pages through appointments in (date, start time, id) order
+        Index('ix_appointments_shop_date_time', 'shop_id', 'appointment_date', 'start_time'),
+    )
+    
     # Relationships
     shop = relationship("Shop", back_populates="appointments")
     employee = relationship("Employee", back_populates="appointments")
     customer = relationship("Customer", back_populates="appointments")
     service = relationship("Service", back_populates="appointments")
+    series = relationship("AppointmentSeries", back_populates="appointments")
+
+
+class AppointmentSeries(Base):
+    """Recurring booking rule; its occurrences are stored as appointments linked by series_id"""
+    __tablename__ = 'appointment_series'
+    
+    id = Column(Integer, primary_key=True)
+    shop_id = Column(Integer, ForeignKey('shops.id'), nullable=False)
+    employee_id = Column(Integer, ForeignKey('employees.id'), nullable=False)
+    customer_id = Column(Integer, ForeignKey('customers.id'), nullable=False)
+    service_id = Column(Integer, ForeignKey('services.id'), nullable=True)
+    
+    frequency = Column(String(20), nullable=False)  # weekly, biweekly, monthly
+    start_date = Column(Date, nullable=False)
+    until_date = Column(Date)  # last possible date, or None when bounded by a count
+    occurrence_count = Column(Integer)
+    start_time = Column(Time, nullable=False)
+    end_time = Column(Time, nullable=False)
+    
+    status = Column(String(20), default='active')  # active, cancelled
+    notes = Column(String(500))
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    appointments = relationship("Appointment", back_populates="series")
 
 
 class EmployeeSchedule(Base):
@@ -125,15 +175,173 @@ class EmployeeSchedule(Base):
     end_time = Column(Time)
     is_available = Column(Boolean, default=True)  # False for days off
     
+    __table_args__ = (
+        Index('ix_employee_schedules_employee_date', 'employee_id', 'date'),
+    )
+    
     # Relationships
     employee = relationship("Employee", back_populates="schedules")
 
 
+class EmployeeDayOccupancy(Base):
+    """Busy intervals of one employee-day, maintained alongside every booking write"""
+    __tablename__ = 'employee_day_occupancy'
+    
+    employee_id = Column(Integer, ForeignKey('employees.id'), primary_key=True)
+    date = Column(Date, primary_key=True)
+    # "start-end:appointment_id" entries in minutes since midnight, e.g. "600-630:12,660-705:15"
+    busy = Column(Text, nullable=False, default='')
+    # Bumped on every write; a concurrent writer of the same day fails its UPDATE and retries
+    version = Column(Integer, nullable=False, server_default='1')
+    
+    __mapper_args__ = {"version_id_col": version}
+
+
+class ShopStats(Base):
+    """Running counts of one shop, maintained alongside every booking write.
+    
+    While a shop has this row, its day rows and customer set are complete too.
+    """
+    __tablename__ = 'shop_stats'
+    
+    shop_id = Column(Integer, ForeignKey('shops.id'), primary_key=True)
+    # Appointments with status 'scheduled'
+    scheduled_appointments = Column(Integer, nullable=False, server_default='0')
+    # Customers who ever booked at the shop, i.e. rows in shop_customers
+    total_customers = Column(Integer, nullable=False, server_default='0')
+    active_employees = Column(Integer, nullable=False, server_default='0')
+    # Goes up with every write to the shop's data; read endpoints derive their ETags from it
+    version = Column(Integer, nullable=False, server_default='0')
+
+
+class ShopDayStats(Base):
+    """Scheduled appointments of one shop on one day; days without a row have none"""
+    __tablename__ = 'shop_day_stats'
+    
+    shop_id = Column(Integer, ForeignKey('shops.id'), primary_key=True)
+    date = Column(Date, primary_key=True)
+    scheduled_appointments = Column(Integer, nullable=False, server_default='0')
+
+
+class ShopCustomer(Base):
+    """A customer who has booked at a shop at least once"""
+    __tablename__ = 'shop_customers'
+    
+    shop_id = Column(Integer, ForeignKey('shops.id'), primary_key=True)
+    customer_id = Column(Integer, ForeignKey('customers.id'), primary_key=True)
+
+
+# Connection settings for SQLite, chosen with the DB_PROFILE environment variable
+SQLITE_PROFILES = {
+    # SQLite and driver defaults: rollback journal, fsync on every commit, small cache
+    "default": {
+        "pragmas": {},
+        "pool": {},
+    },
+    "tuned": {
+        "pragmas": {
+            "journal_mode": "WAL",      # readers and the writer no longer block each other
+            "synchronous": "NORMAL",    # fsync at checkpoints only; safe with WAL
+            "busy_timeout": 5000,       # wait up to 5 s for the write lock instead of failing
+            "cache_size": -65536,       # 64 MB page cache per connection
+            "mmap_size": 268435456,     # read pages through a 256 MB memory map
+            "temp_store": "MEMORY",
+        },
+        "pool": {"pool_size": 10, "max_overflow": 20, "pool_timeout": 30},
+    },
+}
+DEFAULT_DB_PROFILE = "tuned"
+# Log every statement (SQL_ECHO=1); per-request counts and slow queries come from instrumentation.py
+SQL_ECHO = os.environ.get("SQL_ECHO", "0") == "1"
+
+
+def db_profile(profile=None) -> Dict:
+    """Get the settings of a named SQLite profile (DB_PROFILE or "tuned" by default)"""
+    name = profile or os.environ.get("DB_PROFILE", DEFAULT_DB_PROFILE)
+    if name not in SQLITE_PROFILES:
+        raise ValueError(f"DB_PROFILE must be one of: {', '.join(SQLITE_PROFILES)}")
+    return SQLITE_PROFILES[name]
+
+
+def _is_sqlite_file(database_url: str) -> bool:
+    return database_url.startswith("sqlite") and database_url.split("://", 1)[1] not in ("", "/", "/:memory:")
+
+
+def engine_options(database_url: str, profile=None, is_async: bool = False) -> Dict:
+    """Get the create_engine pool arguments of a profile; only SQLite files are pooled here"""
+    pool = db_profile(profile)["pool"]
+    if not pool or not _is_sqlite_file(database_url):
+        return {}
+    return dict(pool, poolclass=AsyncAdaptedQueuePool if is_async else QueuePool)
+
+
+def apply_pragmas(engine, database_url: str, profile=None):
+    """Run a profile's PRAGMAs on every new connection of an SQLite engine"""
+    pragmas = db_profile(profile)["pragmas"]
+    if not pragmas or not database_url.startswith("sqlite"):
+        return
+    
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def is_lock_contention(error: OperationalError) -> bool:
+    """Whether a database error only means another connection held the lock"""
+    message = str(error.orig).lower()
+    return "locked" in message or "busy" in message
+
+
+# Alembic's configuration and migration scripts, next to this file
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini")
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+
+def upgrade_schema(engine):
+    """Apply the Alembic migrations a database has not had yet; only migrations change the schema.
+    
+    A new database gets every migration. One created before migrations existed has no
+    version yet, and the migrations skip the tables, columns and indexes it already has.
+    """
+    from alembic import command
+    from alembic.config import Config
+    
+    config = Config(ALEMBIC_INI)
+    config.set_main_option("script_location", MIGRATIONS_DIR)
+    with engine.begin() as connection:
+        config.attributes["connection"] = connection
+        command.upgrade(config, "head")
+
+
+def check_schema(engine):
+    """Fail at startup, rather than on every request, when a table or column the models use is missing"""
+    inspector = inspect(engine)
+    missing = []
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            missing.append(table.name)
+            continue
+        columns = {column['name'] for column in inspector.get_columns(table.name)}
+        missing += [f"{table.name}.{column.name}" for column in table.columns
+                    if column.name not in columns]
+    if missing:
+        # The migrations are all applied, so the recorded version is wrong
+        raise RuntimeError(
+            f"Database is missing {', '.join(missing)} although its migration version is current. "
+            f"Stamp the revision it really has (alembic stamp <revision>), then run alembic upgrade head."
+        )
+
+
 # Database setup function
-def init_db(database_url="sqlite:///barber_shop.db"):
-    """Initialize the database"""
-    engine = create_engine(database_url, echo=True)
-    Base.metadata.create_all(engine)
+def init_db(database_url="sqlite:///barber_shop.db", profile=None):
+    """Initialize the database, migrating its schema to the current version"""
+    engine = create_engine(database_url, echo=SQL_ECHO, **engine_options(database_url, profile))
+    apply_pragmas(engine, database_url, profile)
+    upgrade_schema(engine)
+    check_schema(engine)
     return engine
 
 
@@ -143,6 +351,34 @@ def get_session(engine):
     return Session()
 
 
+# Async drivers for the synchronous URL schemes
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+
+def async_database_url(database_url: str) -> str:
+    """Turn a database URL into its async-driver form, e.g. sqlite:// -> sqlite+aiosqlite://"""
+    scheme, rest = database_url.split("://", 1)
+    return f"{ASYNC_DRIVERS.get(scheme.split('+')[0], scheme)}://{rest}"
+
+
+def init_async_db(database_url="sqlite:///barber_shop.db", profile=None):
+    """Create an async engine for a database already set up by init_db"""
+    engine = create_async_engine(async_database_url(database_url), echo=SQL_ECHO,
+                                 **engine_options(database_url, profile, is_async=True))
+    apply_pragmas(engine.sync_engine, database_url, profile)
+    return engine
+
+
+def get_async_session(engine) -> AsyncSession:
+    """Get async database session; objects stay loaded after commit, as lazy loads cannot run"""
+    Session = async_sessionmaker(bind=engine, expire_on_commit=False)
+    return Session()
+
+
 if __name__ == "__main__":
     # Create database tables
     engine = init_db()
@@ -0,0 +1,121 @@
+"""
+Employee-Day Occupancy
+Materialized busy intervals per employee-day, updated in the same transaction as bookings
+"""
+
+from datetime import date, time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy.orm import Session
+from models import Appointment, EmployeeDayOccupancy
+from availability import Interval, to_minutes
+
+# One booked interval: (start minute, end minute, appointment id)
+BusyEntry = Tuple[int, int, int]
+
+
+def encode_busy(entries: Iterable[BusyEntry]) -> str:
+    """Serialize busy entries to the compact column format"""
+    return ",".join(f"{start}-{end}:{appointment_id}"
+                    for start, end, appointment_id in sorted(entries))
+
+
+def decode_busy(busy: str) -> List[BusyEntry]:
+    """Parse the compact column format back into busy entries"""
+    entries = []
+    for item in busy.split(",") if busy else []:
+        span, appointment_id = item.split(":")
+        start, end = span.split("-")
+        entries.append((int(start), int(end), int(appointment_id)))
+    return entries
+
+
+def entries_of(row: Optional[EmployeeDayOccupancy]) -> List[BusyEntry]:
+    """Get the busy entries stored in an occupancy row, none for a missing row"""
+    return decode_busy(row.busy) if row else []
+
+
+def intervals_of(row: Optional[EmployeeDayOccupancy]) -> List[Interval]:
+    """Get the (start, end) intervals stored in an occupancy row"""
+    return [(start, end) for start, end, _ in entries_of(row)]
+
+
+def busy_for_day(session: Session, employee_id: int, day: date) -> List[Interval]:
+    """Get an employee-day's busy intervals with a single primary-key lookup"""
+    row = session.query(EmployeeDayOccupancy).get((employee_id, day))
+    return intervals_of(row)
+
+
+def busy_for_range(session: Session, employee_ids: List[int], start_date: date,
+                   end_date: date) -> Dict[Tuple[int, date], List[Interval]]:
+    """Get the busy intervals of several employees over a date range with one query"""
+    rows = session.query(EmployeeDayOccupancy).filter(
+        EmployeeDayOccupancy.employee_id.in_(employee_ids),
+        EmployeeDayOccupancy.date >= start_date,
+        EmployeeDayOccupancy.date <= end_date
+    ).all()
+    return {(row.employee_id, row.date): intervals_of(row) for row in rows}
+
+
+def occupancy_row(session: Session, employee_id: int, day: date) -> Optional[EmployeeDayOccupancy]:
+    """Read an employee-day's row (and its version) fresh from the database"""
+    return session.query(EmployeeDayOccupancy).populate_existing().get((employee_id, day))
+
+
+def occupancy_rows(session: Session, employee_ids: Iterable[int], start_date: date,
+                   end_date: date) -> Dict[Tuple[int, date], EmployeeDayOccupancy]:
+    """Read the rows of several employees over a date range fresh, with one query"""
+    rows = session.query(EmployeeDayOccupancy).populate_existing().filter(
+        EmployeeDayOccupancy.employee_id.in_(set(employee_ids)),
+        EmployeeDayOccupancy.date >= start_date,
+        EmployeeDayOccupancy.date <= end_date
+    ).all()
+    return {(row.employee_id, row.date): row for row in rows}
+
+
+def find_conflict(entries: Iterable[BusyEntry], start_time: time,
+                  end_time: time) -> Optional[int]:
+    """Get the id of a booked appointment overlapping the given times, if any"""
+    start, end = to_minutes(start_time), to_minutes(end_time)
+    for busy_start, busy_end, appointment_id in entries:
+        if busy_start < end and start < busy_end:
+            return appointment_id
+    return None
+
+
+def record_bookings(session: Session, appointments: List[Appointment],
+                    row: Optional[EmployeeDayOccupancy]):
+    """Add flushed appointments of one employee-day to the row they were checked against.
+
+    The caller commits. The row's versioned UPDATE fails if another booking changed
+    the day in between, and with no row yet a concurrent first booking collides on
+    the primary key.
+    """
+    if row is None:
+        row = EmployeeDayOccupancy(employee_id=appointments[0].employee_id,
+                                   date=appointments[0].appointment_date, busy='')
+        session.add(row)
+
+    entries = decode_busy(row.busy)
+    entries.extend((to_minutes(a.start_time), to_minutes(a.end_time), a.id)
+                   for a in appointments)
+    row.busy = encode_busy(entries)
+
+
+def record_booking(session: Session, appointment: Appointment,
+                   row: Optional[EmployeeDayOccupancy]):
+    """Add a flushed appointment to the employee-day row it was checked against"""
+    record_bookings(session, [appointment], row)
+
+
+def release_booking(session: Session, appointment: Appointment):
+    """Remove an appointment from its employee-day row; the caller commits"""
+    row = occupancy_row(session, appointment.employee_id, appointment.appointment_date)
+    if row is None:
+        return
+    release_bookings(row, {appointment.id})
+
+
+def release_bookings(row: EmployeeDayOccupancy, appointment_ids: Set[int]):
+    """Remove several appointments from a freshly read employee-day row; the caller commits"""
+    row.busy = encode_busy(entry for entry in decode_busy(row.busy)
+                           if entry[2] not in appointment_ids)
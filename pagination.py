@@ -0,0 +1,67 @@
+"""
+Pagination - Keyset (cursor) pagination for list endpoints
+A page continues strictly after the last row of the previous one, so every page is a
+single index range read however deep it is
+"""
+
+import base64
+import json
+from typing import Callable, List, Optional, Sequence, Tuple, TypeVar
+
+from sqlalchemy import literal, tuple_
+
+# Rows per page when the client does not ask for a size, and the most it may ask for
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+T = TypeVar("T")
+
+
+def encode_cursor(values: Sequence) -> str:
+    """Pack the sort key of a page's last row into an opaque, URL-safe cursor"""
+    raw = json.dumps([v.isoformat() if hasattr(v, "isoformat") else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, columns: Sequence) -> List:
+    """Unpack a cursor into values typed like the columns it was made for"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError
+        typed = []
+        for column, value in zip(columns, values):
+            python_type = column.type.python_type
+            if hasattr(python_type, "fromisoformat"):
+                typed.append(python_type.fromisoformat(value))
+            elif isinstance(value, python_type):
+                typed.append(value)
+            else:
+                raise ValueError
+        return typed
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor") from None
+
+
+def keyset(query, columns: Sequence, cursor: Optional[str], limit: int):
+    """Order a query (or select) by unique columns and keep limit + 1 rows after the cursor.
+
+    The extra row only tells whether another page follows; see next_page.
+    """
+    if cursor:
+        values = decode_cursor(cursor, columns)
+        if len(columns) == 1:
+            query = query.filter(columns[0] > values[0])
+        else:
+            query = query.filter(tuple_(*columns) > tuple_(*[
+                literal(value, column.type) for column, value in zip(columns, values)]))
+    return query.order_by(*columns).limit(limit + 1)
+
+
+def next_page(rows: List[T], limit: int, key: Callable[[T], Tuple]) -> Tuple[List[T], Optional[str]]:
+    """Split a keyset result into the page and the cursor of the next one (None on the last page)"""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(key(rows[-1]))
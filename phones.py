@@ -0,0 +1,46 @@
+"""
+Phone Numbers
+Canonical form used to store and look up customer phone numbers
+"""
+
+import re
+from typing import Dict, Iterable, List, Tuple
+
+_NON_DIGITS = re.compile(r"\D")
+
+
+def normalize_phone(phone: str) -> str:
+    """Reduce a phone number to its digits, keeping a leading + of international numbers.
+
+    "555-2001", "(555) 2001" and "555 2001" all become "5552001".
+    """
+    digits = _NON_DIGITS.sub("", phone or "")
+    if not digits:
+        raise ValueError("Invalid phone number")
+    return ("+" if phone.strip().startswith("+") else "") + digits
+
+
+def plan_backfill(customers: Iterable[Tuple[int, str]]) -> Tuple[Dict[int, str], Dict[int, int]]:
+    """Work out how to bring stored (id, phone) customers to canonical phone numbers.
+
+    Returns the phone rewrites {id: canonical phone} and the duplicate merges
+    {duplicate id: id it merges into}. Of the customers sharing a canonical number,
+    the one already stored in canonical form is kept, so cached ids stay valid;
+    otherwise the oldest. Numbers without any digits are left as they are.
+    """
+    groups: Dict[str, List[Tuple[int, str]]] = {}
+    for customer_id, phone in customers:
+        try:
+            groups.setdefault(normalize_phone(phone), []).append((customer_id, phone))
+        except ValueError:
+            continue
+
+    changes, merges = {}, {}
+    for canonical, members in groups.items():
+        kept_id, kept_phone = next(((i, p) for i, p in members if p == canonical), min(members))
+        if kept_phone != canonical:
+            changes[kept_id] = canonical
+        for customer_id, _ in members:
+            if customer_id != kept_id:
+                merges[customer_id] = kept_id
+    return changes, merges
@@ -0,0 +1,46 @@
+"""
+Recurrence Rules
+Lazy expansion of weekly, bi-weekly and monthly appointment series
+"""
+
+from datetime import date, timedelta
+from typing import Iterator, Optional
+
+# Step between occurrences, in days, of the fixed-interval rules
+FREQUENCY_DAYS = {
+    'weekly': 7,
+    'biweekly': 14,
+}
+FREQUENCIES = ('weekly', 'biweekly', 'monthly')
+
+
+def _nth_date(start_date: date, frequency: str, n: int) -> Optional[date]:
+    """Get the n-th candidate date of a rule, or None for a month without that day"""
+    if frequency in FREQUENCY_DAYS:
+        return start_date + timedelta(days=FREQUENCY_DAYS[frequency] * n)
+
+    month = start_date.month - 1 + n
+    try:
+        return start_date.replace(year=start_date.year + month // 12, month=month % 12 + 1)
+    except ValueError:
+        return None  # e.g. the 31st in a 30-day month is skipped
+
+
+def occurrences(start_date: date, frequency: str, until: Optional[date] = None,
+                count: Optional[int] = None) -> Iterator[date]:
+    """Yield the dates of a series in order, up to an end date and/or a count"""
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"Frequency must be one of: {', '.join(FREQUENCIES)}")
+    if until is None and count is None:
+        raise ValueError("A series needs an end date or a number of occurrences")
+
+    n = produced = 0
+    while count is None or produced < count:
+        day = _nth_date(start_date, frequency, n)
+        n += 1
+        if day is None:
+            continue
+        if until is not None and day > until:
+            return
+        yield day
+        produced += 1
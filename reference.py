@@ -0,0 +1,87 @@
+"""
+Shop Reference Data
+Read-only snapshots of a shop's employees, services and upcoming schedule overrides,
+shared across requests
+"""
+
+from datetime import date, time
+from typing import Dict, NamedTuple, Optional
+from sqlalchemy.orm import Session
+from models import Employee, EmployeeSchedule, Service
+
+
+class EmployeeRef(NamedTuple):
+    """The employee fields scheduling needs, detached from any session"""
+    id: int
+    shop_id: int
+    name: str
+    is_active: bool
+    working_days: str
+    start_time: time
+    end_time: time
+
+
+class ServiceRef(NamedTuple):
+    """The service fields scheduling needs, detached from any session"""
+    id: int
+    shop_id: int
+    name: str
+    duration_minutes: int
+    price: Optional[float]
+
+
+class ScheduleRef(NamedTuple):
+    """A schedule override (special hours or a day off), detached from any session"""
+    id: int
+    employee_id: int
+    date: date
+    start_time: Optional[time]
+    end_time: Optional[time]
+    is_available: bool
+
+
+# Columns selected for the snapshots, in field order
+EMPLOYEE_COLUMNS = (Employee.id, Employee.shop_id, Employee.name, Employee.is_active,
+                    Employee.working_days, Employee.start_time, Employee.end_time)
+SERVICE_COLUMNS = (Service.id, Service.shop_id, Service.name, Service.duration_minutes,
+                   Service.price)
+SCHEDULE_COLUMNS = (EmployeeSchedule.id, EmployeeSchedule.employee_id, EmployeeSchedule.date,
+                    EmployeeSchedule.start_time, EmployeeSchedule.end_time,
+                    EmployeeSchedule.is_available)
+
+
+class ShopReference(NamedTuple):
+    """A shop's employees and services by id, and its overrides from overrides_from on"""
+    shop_id: int
+    employees: Dict[int, EmployeeRef]
+    services: Dict[int, ServiceRef]
+    # Employee id -> {date: override}, complete for every date from overrides_from on
+    overrides: Dict[int, Dict[date, ScheduleRef]]
+    overrides_from: date
+
+
+def load_shop_reference(session: Session, shop_id: int) -> ShopReference:
+    """Read a shop's employees, services and overrides from today on with one query each"""
+    employees = session.query(*EMPLOYEE_COLUMNS).filter(
+        Employee.shop_id == shop_id).order_by(Employee.id)
+    services = session.query(*SERVICE_COLUMNS).filter(
+        Service.shop_id == shop_id).order_by(Service.id)
+    today = date.today()
+    schedules = session.query(*SCHEDULE_COLUMNS).join(
+        Employee, Employee.id == EmployeeSchedule.employee_id
+    ).filter(
+        Employee.shop_id == shop_id,
+        EmployeeSchedule.date >= today
+    ).order_by(EmployeeSchedule.id)
+
+    # Later rows win when a date has more than one override
+    overrides: Dict[int, Dict[date, ScheduleRef]] = {}
+    for row in schedules:
+        overrides.setdefault(row.employee_id, {})[row.date] = ScheduleRef(*row)
+    return ShopReference(
+        shop_id=shop_id,
+        employees={row.id: EmployeeRef(*row) for row in employees},
+        services={row.id: ServiceRef(*row) for row in services},
+        overrides=overrides,
+        overrides_from=today
+    )
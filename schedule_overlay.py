@@ -0,0 +1,71 @@
+"""
+Schedule Overlay
+Per-employee cache of EmployeeSchedule overrides (special hours and days off)
+"""
+
+from collections import defaultdict
+from datetime import date
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from models import EmployeeSchedule
+
+
+# An employee's overrides from a shared snapshot: (first date covered, {date: override})
+Snapshot = Tuple[date, Dict[date, EmployeeSchedule]]
+
+
+class ScheduleOverlay:
+    """Loads schedule overrides in bulk per date range and answers per-day lookups from memory.
+
+    With a snapshot source, ranges the snapshot covers are taken from it without a query.
+    """
+
+    def __init__(self, session: Session,
+                 snapshot: Optional[Callable[[int], Optional[Snapshot]]] = None):
+        self.session = session
+        self.snapshot = snapshot
+        self._overrides: Dict[int, Dict[date, EmployeeSchedule]] = defaultdict(dict)
+        self._loaded: Dict[int, List[Tuple[date, date]]] = defaultdict(list)
+
+    def _covers(self, employee_id: int, start_date: date, end_date: date) -> bool:
+        """Check whether a date range was already loaded for an employee"""
+        return any(start <= start_date and end_date <= end
+                   for start, end in self._loaded[employee_id])
+
+    def load(self, employee_ids: Iterable[int], start_date: date, end_date: date):
+        """Load the overrides of several employees for a date range with one query"""
+        missing = [employee_id for employee_id in set(employee_ids)
+                   if not self._covers(employee_id, start_date, end_date)]
+        if self.snapshot:
+            for employee_id in list(missing):
+                known = self.snapshot(employee_id)
+                if known and known[0] <= start_date:
+                    first_date, overrides = known
+                    self._overrides[employee_id].update(overrides)
+                    self._loaded[employee_id].append((first_date, date.max))
+                    missing.remove(employee_id)
+        if not missing:
+            return
+
+        overrides = self.session.query(EmployeeSchedule).filter(
+            EmployeeSchedule.employee_id.in_(missing),
+            EmployeeSchedule.date >= start_date,
+            EmployeeSchedule.date <= end_date
+        ).order_by(EmployeeSchedule.id).all()
+
+        # Later rows win when a date has more than one override
+        for override in overrides:
+            self._overrides[override.employee_id][override.date] = override
+        for employee_id in missing:
+            self._loaded[employee_id].append((start_date, end_date))
+
+    def get(self, employee_id: int, day: date) -> Optional[EmployeeSchedule]:
+        """Get an employee's override for a date, if there is one"""
+        if not self._covers(employee_id, day, day):
+            self.load([employee_id], day, day)
+        return self._overrides[employee_id].get(day)
+
+    def invalidate(self, employee_id: int):
+        """Forget everything loaded for an employee"""
+        self._overrides.pop(employee_id, None)
+        self._loaded.pop(employee_id, None)
@@ -0,0 +1,174 @@
+"""
+Shop Stats
+Running per-shop and per-shop-day counters for the shop page and the owner dashboard,
+updated in the same transaction as bookings
+"""
+
+from datetime import date
+from typing import Dict, Iterable, Set, Tuple
+from sqlalchemy import distinct, func
+from sqlalchemy.orm import Session
+from models import Appointment, Employee, ShopCustomer, ShopDayStats, ShopStats
+
+
+def count_scheduled(session: Session, shop_id: int) -> int:
+    """Count a shop's scheduled appointments the slow way, from the appointments table"""
+    return session.query(func.count(Appointment.id)).filter(
+        Appointment.shop_id == shop_id,
+        Appointment.status == 'scheduled'
+    ).scalar()
+
+
+def compute_shop_stats(session: Session, shop_id: int) -> ShopStats:
+    """Count a shop's totals from its appointments and employees, without saving them"""
+    return ShopStats(
+        shop_id=shop_id,
+        scheduled_appointments=count_scheduled(session, shop_id),
+        total_customers=session.query(func.count(distinct(Appointment.customer_id))).filter(
+            Appointment.shop_id == shop_id
+        ).scalar(),
+        active_employees=session.query(func.count(Employee.id)).filter(
+            Employee.shop_id == shop_id,
+            Employee.is_active == True
+        ).scalar()
+    )
+
+
+def rebuild_shop(session: Session, shop_id: int) -> ShopStats:
+    """Rewrite one shop's counters, day rows and customer set from scratch; the caller commits"""
+    # The version only ever goes up, so no ETag handed out before matches again
+    version = session.query(ShopStats.version).filter(ShopStats.shop_id == shop_id).scalar()
+    session.query(ShopDayStats).filter(ShopDayStats.shop_id == shop_id).delete(
+        synchronize_session=False)
+    session.query(ShopCustomer).filter(ShopCustomer.shop_id == shop_id).delete(
+        synchronize_session=False)
+    session.query(ShopStats).filter(ShopStats.shop_id == shop_id).delete(
+        synchronize_session=False)
+
+    days = session.query(Appointment.appointment_date, func.count(Appointment.id)).filter(
+        Appointment.shop_id == shop_id,
+        Appointment.status == 'scheduled'
+    ).group_by(Appointment.appointment_date).all()
+    session.bulk_insert_mappings(ShopDayStats, [
+        {'shop_id': shop_id, 'date': day, 'scheduled_appointments': count} for day, count in days
+    ])
+    customers = session.query(distinct(Appointment.customer_id)).filter(
+        Appointment.shop_id == shop_id
+    ).all()
+    session.bulk_insert_mappings(ShopCustomer, [
+        {'shop_id': shop_id, 'customer_id': customer_id} for customer_id, in customers
+    ])
+    stats = compute_shop_stats(session, shop_id)
+    stats.version = 0 if version is None else version + 1
+    session.add(stats)
+    return stats
+
+
+def shop_stats(session: Session, shop_id: int) -> ShopStats:
+    """Get a shop's counters with a primary-key lookup, counting them for a shop without a row"""
+    return session.query(ShopStats).populate_existing().get(shop_id) or \
+        compute_shop_stats(session, shop_id)
+
+
+def scheduled_appointments(session: Session, shop_id: int) -> int:
+    """Get a shop's number of scheduled appointments"""
+    return shop_stats(session, shop_id).scheduled_appointments
+
+
+def dashboard_counts(session: Session, shop_id: int, start_date: date,
+                     end_date: date) -> Tuple[ShopStats, Dict[date, int]]:
+    """Get a shop's counters and its scheduled appointments per day over a date range.
+
+    A shop with counters is served from its row and at most one day row per date;
+    one without them is counted from the appointments.
+    """
+    stats = session.query(ShopStats).populate_existing().get(shop_id)
+    if stats:
+        days = session.query(ShopDayStats.date, ShopDayStats.scheduled_appointments).filter(
+            ShopDayStats.shop_id == shop_id,
+            ShopDayStats.date >= start_date,
+            ShopDayStats.date <= end_date
+        )
+    else:
+        stats = compute_shop_stats(session, shop_id)
+        days = session.query(Appointment.appointment_date, func.count(Appointment.id)).filter(
+            Appointment.shop_id == shop_id,
+            Appointment.appointment_date >= start_date,
+            Appointment.appointment_date <= end_date,
+            Appointment.status == 'scheduled'
+        ).group_by(Appointment.appointment_date)
+    return stats, dict(days.all())
+
+
+def _bump(session: Session, shop_id: int, **deltas: int) -> bool:
+    """Add to a shop's counters and its version in place; False when the shop has no row yet"""
+    deltas['version'] = 1
+    return bool(session.query(ShopStats).filter(ShopStats.shop_id == shop_id).update(
+        {getattr(ShopStats, column): getattr(ShopStats, column) + delta
+         for column, delta in deltas.items()},
+        synchronize_session=False
+    ))
+
+
+def adjust_scheduled(session: Session, changes: Dict[Tuple[int, date], int],
+                     customers: Iterable[Tuple[int, int]] = ()):
+    """Apply {(shop_id, day): delta} and the (shop_id, customer_id) of new bookings.
+
+    Call after the appointments are written (flushed); the caller commits. Counters
+    are bumped in place, so concurrent bookings never overwrite each other. A shop
+    without counters yet is rebuilt from its appointments instead, and concurrent
+    first inserts of the same row collide on its primary key and retry.
+    """
+    day_deltas: Dict[int, Dict[date, int]] = {}
+    for (shop_id, day), delta in changes.items():
+        if delta:
+            day_deltas.setdefault(shop_id, {})[day] = delta
+    shop_customers: Dict[int, Set[int]] = {}
+    for shop_id, customer_id in customers:
+        shop_customers.setdefault(shop_id, set()).add(customer_id)
+
+    for shop_id in day_deltas.keys() | shop_customers.keys():
+        days = day_deltas.get(shop_id, {})
+        if not _bump(session, shop_id, scheduled_appointments=sum(days.values())):
+            rebuild_shop(session, shop_id)
+            continue
+
+        for day, day_delta in days.items():
+            updated = session.query(ShopDayStats).filter(
+                ShopDayStats.shop_id == shop_id,
+                ShopDayStats.date == day
+            ).update({ShopDayStats.scheduled_appointments:
+                      ShopDayStats.scheduled_appointments + day_delta},
+                     synchronize_session=False)
+            if not updated:
+                session.add(ShopDayStats(shop_id=shop_id, date=day,
+                                         scheduled_appointments=day_delta))
+
+        customer_ids = shop_customers.get(shop_id)
+        if customer_ids:
+            known = {customer_id for customer_id, in session.query(ShopCustomer.customer_id).filter(
+                ShopCustomer.shop_id == shop_id,
+                ShopCustomer.customer_id.in_(customer_ids)
+            )}
+            new_ids = customer_ids - known
+            if new_ids:
+                session.add_all(ShopCustomer(shop_id=shop_id, customer_id=customer_id)
+                                for customer_id in new_ids)
+                _bump(session, shop_id, total_customers=len(new_ids))
+
+
+def adjust_employees(session: Session, changes: Dict[int, int]):
+    """Apply {shop_id: delta} to the active employee counters after the employees are flushed.
+
+    Shops with a zero delta still had employees added, so their version goes up too.
+    """
+    for shop_id, delta in changes.items():
+        if not _bump(session, shop_id, active_employees=delta):
+            rebuild_shop(session, shop_id)
+
+
+def touch_shops(session: Session, shop_ids: Iterable[int]):
+    """Bump the version of shops whose data changed without moving any counter"""
+    for shop_id in set(shop_ids):
+        if not _bump(session, shop_id):
+            rebuild_shop(session, shop_id)